@@ -0,0 +1,3 @@
+# ==============================
+# ⏱️ أدوات القياس والاختبار التحميلي (تعمل محلياً دون تلغرام)
+# ==============================
@@ -0,0 +1,120 @@
+# ==============================
+# 🌐 قياس معدل الإرسال إلى Bot API مع محادثات متزامنة كثيرة
+# ==============================
+#
+# التشغيل:  python -m benchmarks.bot_api_transport --conversations 500 --messages 10 --rtt 0.02 --output results.json
+# كل محادثة ترسل رسائلها بالتتابع مع فاصل عشوائي قصير (كمستخدم يرد على الأسئلة)، بينما
+# يعمل استطلاع getUpdates طويل في الخلفية. يُقارن الإعداد السابق (مجمع 256 اتصالاً
+# بإعدادات httpx الافتراضية: 20 اتصالاً خاملاً لمدة 5 ثوانٍ) بطبقة transport المضبوطة.
+# الخادم المحاكي (aiohttp) لا يدعم HTTP/2، فيُقاس BOT_API_HTTP2 على تلغرام الحقيقي فقط.
+
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter
+
+from telegram import Bot
+from telegram.error import TelegramError
+
+import transport
+from benchmarks.common import percentiles, save_results
+from benchmarks.fake_telegram import FakeTelegramServer, FAKE_TOKEN
+from metrics import BOT_API_RETRIES
+
+
+def build_requests(mode: str):
+    """طلبات الإرسال والاستطلاع لكل إعداد"""
+    if mode == 'default':
+        return (transport.InstrumentedRequest(connection_pool_size=256),
+                transport.InstrumentedRequest(connection_pool_size=1, pool='poll'))
+    return transport.build_request('send'), transport.build_request('poll')
+
+
+def retries_total() -> float:
+    return sum(sample.value for metric in BOT_API_RETRIES.collect() for sample in metric.samples
+               if sample.name.endswith('_total'))
+
+
+async def bench_mode(mode: str, args) -> dict:
+    fake = FakeTelegramServer(latency=args.rtt)
+    await fake.start()
+    request, poll_request = build_requests(mode)
+    bot = Bot(FAKE_TOKEN, base_url=fake.base_url, request=request, get_updates_request=poll_request)
+    rng = random.Random(args.seed)
+    samples, errors = [], Counter()
+    retries_before = retries_total()
+
+    async def poll(stop: asyncio.Event):
+        offset = 0
+        while not stop.is_set():
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=1)
+            except TelegramError as e:
+                errors[f'getUpdates:{type(e).__name__}'] += 1
+                continue
+            for update in updates:
+                offset = update.update_id + 1
+
+    async def conversation(chat_id: int):
+        for _ in range(args.messages):
+            await asyncio.sleep(rng.uniform(0, args.think))
+            started = time.perf_counter()
+            try:
+                await bot.send_message(chat_id, 'رسالة اختبار')
+            except TelegramError as e:
+                errors[type(e).__name__] += 1
+                continue
+            samples.append(time.perf_counter() - started)
+
+    async with bot:
+        stop = asyncio.Event()
+        poller = asyncio.create_task(poll(stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(conversation(1000 + i) for i in range(args.conversations)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await poller
+    await fake.stop()
+
+    return {
+        'sends': len(samples),
+        'elapsed_s': round(elapsed, 3),
+        'sends_per_s': round(len(samples) / elapsed, 1),
+        'send': percentiles(samples),
+        'errors': dict(errors),
+        'connections_opened': len(fake.connections),
+        'retries': int(retries_total() - retries_before),
+    }
+
+
+async def run(args) -> dict:
+    results = {}
+    for mode in args.modes.split(','):
+        results[mode] = await bench_mode(mode, args)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='معدل الإرسال عبر طبقة النقل')
+    parser.add_argument('--conversations', type=int, default=500)
+    parser.add_argument('--messages', type=int, default=10, help='رسائل كل محادثة')
+    parser.add_argument('--rtt', type=float, default=0.02, help='زمن محاكى لكل استدعاء API (ثوانٍ)')
+    parser.add_argument('--think', type=float, default=0.05, help='أقصى فاصل بين رسائل المحادثة (ثوانٍ)')
+    parser.add_argument('--modes', default='default,tuned')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='ملف JSON لحفظ النتائج')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    for mode, result in results.items():
+        send = result['send']
+        print(f"🌐 {mode:8s} {result['sends_per_s']} رسالة/ث، p50={send['p50']}ms p95={send['p95']}ms "
+              f"p99={send['p99']}ms، اتصالات مفتوحة: {result['connections_opened']}، إعادات: {result['retries']}، "
+              f"أخطاء: {sum(result['errors'].values())}")
+    if args.output:
+        save_results(args.output, 'bot_api_transport', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,169 @@
+# ==============================
+# 🧩 قياس توسع وضع العنقود من عامل واحد إلى N عامل
+# ==============================
+#
+# التشغيل:  python -m benchmarks.cluster_scaling --users 2000 --max-workers 4 --output results.json
+# لكل عدد عمال: تُشغَّل عمليات عاملة حقيقية (نفس معالجات main.py مع SQLite مدمج لكل
+# عامل)، وتوزع UpdateRouter تحديثات التسجيل الكامل عليها، ويُقاس الزمن حتى يرد
+# خادم Bot API المحاكي على كل التحديثات. التوسع محدود بعدد الأنوية المتاحة.
+
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+import subprocess
+
+from benchmarks.common import save_results
+from benchmarks.fake_telegram import FakeTelegramServer, FAKE_TOKEN, make_update
+
+# عدم رفض رسائل المستخدمين الاصطناعيين بسبب حدود الإغراق
+BENCH_ENV = {
+    'FLOOD_BUDGETS': 'start:1000:1000,message:1000:1000', 'SHED_QUEUE_THRESHOLD': str(10 ** 9),
+    'STORAGE_BACKEND': 'sqlite',
+}
+
+
+# ==============================
+# 👷 دور العامل (عملية فرعية)
+# ==============================
+async def run_worker(args):
+    import main as bot
+    from telegram.ext import Application
+    from cluster import worker_config
+    from scheduler import UserOrderedUpdateProcessor
+    from webhook import serve_webhook
+    from sqlite_database import init_sqlite_pool
+
+    logging.getLogger().setLevel(logging.WARNING)
+    workdir = tempfile.TemporaryDirectory()
+    init_sqlite_pool(os.path.join(workdir.name, f'worker-{args.worker}.sqlite3'))
+    application = (
+        Application.builder()
+        .token(FAKE_TOKEN)
+        .base_url(args.api_url)
+        .updater(None)
+        .concurrent_updates(UserOrderedUpdateProcessor(args.concurrency))
+        .build()
+    )
+    bot.register_handlers(application)
+    await serve_webhook(application, worker_config(args.worker, args.secret))
+
+
+# ==============================
+# 📊 دور المنسق
+# ==============================
+def build_updates(users: int, invalid_rate: float, seed: int) -> list:
+    """تحديثات JSON خام لتسجيل كامل، متداخلة بين المستخدمين مع الحفاظ على ترتيب كل مستخدم"""
+    from benchmarks.registration_flow import FIRST_USER_ID, user_script
+
+    rng = random.Random(seed)
+    scripts = [user_script(rng, i, invalid_rate) for i in range(users)]
+    updates = []
+    for step in range(max(len(script) for script in scripts)):
+        for i, script in enumerate(scripts):
+            if step < len(script):
+                updates.append(make_update(len(updates) + 1, FIRST_USER_ID + i, script[step]))
+    return updates
+
+
+async def bench_workers(workers: int, updates: list, args) -> dict:
+    from cluster import UpdateRouter, WORKER_PATH, wait_workers_ready
+
+    fake = FakeTelegramServer(latency=args.api_latency)
+    await fake.start()
+    secret = 'bench-secret'
+    base_port = args.base_port
+    env = dict(os.environ, CLUSTER_BASE_PORT=str(base_port), **BENCH_ENV)
+    processes = [
+        subprocess.Popen([
+            sys.executable, '-m', 'benchmarks.cluster_scaling', '--worker', str(i),
+            '--api-url', fake.base_url, '--secret', secret, '--concurrency', str(args.concurrency),
+        ], env=env)
+        for i in range(workers)
+    ]
+    router = UpdateRouter([f"http://127.0.0.1:{base_port + i}{WORKER_PATH}" for i in range(workers)], secret)
+    try:
+        await wait_workers_ready(workers, base_port)
+        await router.start()
+
+        done = asyncio.get_running_loop().create_future()
+        replies = 0
+
+        def on_send(params):
+            nonlocal replies
+            replies += 1
+            if replies >= len(updates) and not done.done():
+                done.set_result(time.perf_counter())
+
+        fake.on_send = on_send
+        started = time.perf_counter()
+        for data in updates:
+            router.route(data)
+        finished = await asyncio.wait_for(done, timeout=args.timeout)
+        elapsed = finished - started
+        await router.stop()
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+        await fake.stop()
+
+    return {
+        'workers': workers,
+        'elapsed_s': round(elapsed, 3),
+        'updates_per_s': round(len(updates) / elapsed, 1),
+        'routed': router.routed,
+    }
+
+
+async def run(args) -> dict:
+    updates = build_updates(args.users, args.invalid_rate, args.seed)
+    runs = []
+    workers = 1
+    while workers <= args.max_workers:
+        result = await bench_workers(workers, updates, args)
+        runs.append(result)
+        print(f"🧩 {workers} عامل: {result['updates_per_s']} تحديث/ث ({result['elapsed_s']}s)")
+        workers *= 2
+    base = runs[0]['updates_per_s']
+    for result in runs:
+        result['speedup'] = round(result['updates_per_s'] / base, 2)
+    return {'users': args.users, 'updates': len(updates), 'cpu_count': os.cpu_count(), 'runs': runs}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='قياس توسع وضع العنقود')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--invalid-rate', type=float, default=0.2)
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--api-latency', type=float, default=0.0)
+    parser.add_argument('--base-port', type=int, default=8700)
+    parser.add_argument('--timeout', type=float, default=600)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='ملف JSON لحفظ النتائج')
+    # خيارات داخلية لتشغيل العملية العاملة
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--api-url', help=argparse.SUPPRESS)
+    parser.add_argument('--secret', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    if args.worker is not None:
+        asyncio.run(run_worker(args))
+        return
+
+    results = asyncio.run(run(args))
+    for result in results['runs']:
+        print(f"   {result['workers']} عامل: x{result['speedup']}")
+    if args.output:
+        save_results(args.output, 'cluster_scaling', results)
+
+
+if __name__ == '__main__':
+    main()
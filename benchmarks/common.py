@@ -0,0 +1,42 @@
+# ==============================
+# 📐 دوال مساعدة مشتركة بين ملفات القياس
+# ==============================
+
+import json
+import platform
+import subprocess
+from datetime import datetime
+
+
+def percentiles(samples, points=(50, 95, 99)) -> dict:
+    """حساب المئينات (بالمللي ثانية) من قائمة أزمنة بالثواني"""
+    if not samples:
+        return {f'p{p}': None for p in points}
+    ordered = sorted(samples)
+    result = {}
+    for p in points:
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        result[f'p{p}'] = round(ordered[index] * 1000, 3)
+    return result
+
+
+def git_revision() -> str:
+    """رقم الـ commit الحالي لمقارنة النتائج بين الإصدارات"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except Exception:
+        return 'unknown'
+
+
+def save_results(path: str, name: str, results: dict):
+    """حفظ النتائج بصيغة JSON مع بيانات البيئة"""
+    payload = {
+        'benchmark': name,
+        'commit': git_revision(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'results': results,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    print(f"💾 تم حفظ النتائج في {path}")
@@ -0,0 +1,127 @@
+# ==============================
+# 🧪 خادم محلي يحاكي Telegram Bot API لأغراض القياس
+# ==============================
+
+import json
+import time
+import asyncio
+from collections import defaultdict
+
+from aiohttp import web
+
+FAKE_TOKEN = '123456:FAKE-TOKEN-FOR-BENCHMARKS'
+BOT_USER = {'id': 123456, 'is_bot': True, 'first_name': 'BenchBot', 'username': 'bench_bot'}
+
+
+def make_update(update_id: int, user_id: int, text: str) -> dict:
+    """إنشاء تحديث رسالة نصية من مستخدم في محادثة خاصة"""
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private', 'first_name': f'User{user_id}'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f'User{user_id}', 'username': f'user{user_id}'},
+        'text': text,
+    }
+    if text.startswith('/'):
+        command = text.split()[0]
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+    return {'update_id': update_id, 'message': message}
+
+
+class FakeTelegramServer:
+    """محاكي بسيط لـ Bot API يسجل الرسائل المرسلة ويخدم getUpdates
+
+    يدعم getMe و getUpdates (استطلاع طويل) و sendMessage و sendDocument
+    و setWebhook/deleteWebhook، ويستدعي on_send عند كل رسالة صادرة.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0):
+        # latency: زمن ذهاب وإياب محاكى لكل استدعاء API
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.on_send = None
+        self.calls = defaultdict(int)
+        # عناوين المنافذ المصدر: عدد اتصالات TCP التي فتحها العميل
+        self.connections = set()
+        self.sent = []
+        self._updates = asyncio.Queue()
+        self._message_id = 0
+        self._runner = None
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self.host}:{self.port}/bot'
+
+    def push_update(self, update: dict):
+        """إضافة تحديث ليستلمه البوت عبر getUpdates"""
+        self._updates.put_nowait(update)
+
+    async def _params(self, request: web.Request) -> dict:
+        if request.content_type == 'application/json':
+            return await request.json()
+        form = await request.post()
+        params = {}
+        for key, value in form.items():
+            try:
+                params[key] = json.loads(value) if isinstance(value, str) else value
+            except ValueError:
+                params[key] = value
+        return params
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        params = await self._params(request)
+        self.calls[method] += 1
+        self.connections.add(request.transport.get_extra_info('peername'))
+
+        if method == 'getUpdates':
+            # زمن وصول الطلب ثم زمن عودة الرد بعد توفر التحديث
+            await asyncio.sleep(self.latency / 2)
+            result = await self._get_updates(params)
+            await asyncio.sleep(self.latency / 2)
+            return web.json_response({'ok': True, 'result': result})
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method == 'getMe':
+            result = BOT_USER
+        elif method in ('sendMessage', 'sendDocument'):
+            self._message_id += 1
+            result = {
+                'message_id': self._message_id,
+                'date': int(time.time()),
+                'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+                'text': params.get('text', ''),
+            }
+            self.sent.append((time.perf_counter(), params))
+            if self.on_send:
+                self.on_send(params)
+        else:
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def _get_updates(self, params: dict) -> list:
+        timeout = float(params.get('timeout') or 0)
+        updates = []
+        try:
+            updates.append(await asyncio.wait_for(self._updates.get(), timeout=max(timeout, 0.01)))
+        except asyncio.TimeoutError:
+            return []
+        while not self._updates.empty() and len(updates) < 100:
+            updates.append(self._updates.get_nowait())
+        return updates
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
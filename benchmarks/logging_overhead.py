@@ -0,0 +1,109 @@
+# ==============================
+# 📝 قياس كلفة التسجيل لكل تحديث في خيط حلقة الأحداث
+# ==============================
+#
+# التشغيل:  python -m benchmarks.logging_overhead --records 20000 --sink-latency 0.2 --output results.json
+# يقيس الزمن الذي يقضيه المعالج نفسه في كل استدعاء تسجيل (سجل "update" الذي يكتبه
+# instrument_handler لكل تحديث) مع: الإعداد القديم (basicConfig بكتابة متزامنة ونص
+# f-string)، وطابور QueueHandler بنص أو JSON، ومع العينة الافتراضية. المخرج مجرى
+# يحاكي منصة استضافة بطيئة بتأخير ثابت لكل سطر.
+
+import time
+import logging
+import argparse
+
+from benchmarks.common import percentiles, save_results
+from logging_setup import configure_logging, stop_logging, keep_event, TEXT_FORMAT
+
+USER_ID = 123456789
+
+
+class SlowSink:
+    """مجرى كتابة يتجاهل النص بعد تأخير ثابت (مثل أنبوب سجلات المنصة)"""
+
+    def __init__(self, latency_ms: float):
+        self.latency = latency_ms / 1000
+        self.lines = 0
+
+    def write(self, text: str):
+        if self.latency:
+            time.sleep(self.latency)
+        self.lines += text.count('\n')
+
+    def flush(self):
+        pass
+
+
+def configure_sync(sink: SlowSink):
+    """الإعداد قبل الطابور: StreamHandler على الجذر يكتب في خيط المستدعي"""
+    stop_logging()
+    handler = logging.StreamHandler(sink)
+    handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(logging.INFO)
+
+
+def log_eager(logger, name: str, elapsed: float):
+    logger.info(f"✅ {name}: {elapsed * 1000:.1f}ms (المستخدم: {USER_ID})")
+
+
+def log_lazy(logger, name: str, elapsed: float):
+    """نفس سجل instrument_handler: قرار العينة قبل إنشاء السجل"""
+    if not keep_event('update'):
+        return
+    logger.info(
+        "✅ %s: %.1fms (المستخدم: %s)", name, elapsed * 1000, USER_ID,
+        extra={'event': 'update', 'sampled': True, 'handler': name, 'user_id': USER_ID,
+               'state': 2, 'duration_ms': round(elapsed * 1000, 3)}
+    )
+
+
+def bench_mode(mode: str, args) -> dict:
+    sink = SlowSink(args.sink_latency)
+    if mode == 'sync_fstring':
+        configure_sync(sink)
+        emit = log_eager
+    else:
+        fmt = 'json' if mode == 'queue_json' else 'text'
+        configure_logging('INFO', fmt, stream=sink, sample_rates=None if mode == 'queue_sampled' else {})
+        emit = log_lazy
+
+    logger = logging.getLogger('bench.handler')
+    samples = []
+    started = time.perf_counter()
+    for i in range(args.records):
+        call_started = time.perf_counter()
+        emit(logger, 'get_phone', 0.0004)
+        samples.append(time.perf_counter() - call_started)
+    caller_elapsed = time.perf_counter() - started
+    # انتظار خيط الكتابة حتى يفرغ الطابور (لا يحسب على حلقة الأحداث)
+    stop_logging()
+    return {
+        'records': args.records,
+        'written_lines': sink.lines,
+        'per_update_us': round(caller_elapsed / args.records * 1e6, 2),
+        'call': percentiles(samples),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='كلفة التسجيل لكل تحديث')
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--sink-latency', type=float, default=0.0, help='تأخير كل سطر في المخرج (مللي ثانية)')
+    parser.add_argument('--modes', default='sync_fstring,queue_text,queue_json,queue_sampled')
+    parser.add_argument('--output', help='ملف JSON لحفظ النتائج')
+    args = parser.parse_args()
+
+    results = {}
+    for mode in args.modes.split(','):
+        results[mode] = bench_mode(mode, args)
+        result = results[mode]
+        print(f"📝 {mode:14s} {result['per_update_us']}µs/تحديث "
+              f"p99={result['call']['p99']}ms ({result['written_lines']} سطر مكتوب)")
+    if args.output:
+        save_results(args.output, 'logging_overhead', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+# ==============================
+# ⏱️ قياس مصغر: التحقق من الهاتف قبل وبعد المناطق المحددة وذاكرة LRU
+# ==============================
+#
+# التشغيل:  python -m benchmarks.phone_validation --inputs 20000
+# كل وضع يعمل في عملية مستقلة حتى يبدأ من بيانات phonenumbers غير محمّلة.
+
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import importlib
+import subprocess
+import tracemalloc
+
+from benchmarks.common import save_results
+
+COUNTRY_CODES = ['+966', '+20', '+963', '+962', '+971', '+965', '+974', '+968']
+
+
+def baseline_validate(phone_number, country_code):
+    """نسخة من التحقق الأصلي قبل التحسين (للمقارنة فقط)"""
+    import phonenumbers
+    try:
+        phone_number = re.sub(r'[\s\-\(\)]', '', phone_number)
+        if not phone_number.startswith('+'):
+            phone_number = country_code + phone_number
+        parsed_number = phonenumbers.parse(phone_number, None)
+        if phonenumbers.is_valid_number(parsed_number):
+            formatted_number = phonenumbers.format_number(parsed_number, phonenumbers.PhoneNumberFormat.E164)
+            return True, formatted_number, "✅ رقم الهاتف صحيح"
+        return False, phone_number, "❌ رقم الهاتف غير صحيح"
+    except Exception as e:
+        return False, phone_number, f"❌ رقم الهاتف غير صحيح: {str(e)}"
+
+
+def generate_inputs(count: int, distinct: int, seed: int) -> list:
+    """مدخلات واقعية: أرقام محلية، أرقام دولية من دول أخرى، ومدخلات خاطئة متكررة"""
+    rng = random.Random(seed)
+    pool = []
+    for _ in range(distinct):
+        kind = rng.random()
+        code = rng.choice(COUNTRY_CODES)
+        if kind < 0.7:
+            number = '5' + ''.join(rng.choices('0123456789', k=8))
+        elif kind < 0.85:
+            number = '+' + rng.choice(['1', '44', '33', '49', '91', '86']) + ''.join(rng.choices('0123456789', k=9))
+        else:
+            number = rng.choice(['12', 'abc', '0000', '5-12 34'])
+        pool.append((number, code))
+    return [rng.choice(pool) for _ in range(count)]
+
+
+def run_mode(mode: str, count: int, distinct: int, seed: int, trace: bool) -> dict:
+    """الزمن يُقاس دون tracemalloc (يبطئ الاستيراد عدة أضعاف)، والذاكرة في تشغيل منفصل بـ trace"""
+    inputs = generate_inputs(count, distinct, seed)
+    if trace:
+        tracemalloc.start()
+
+    started = time.perf_counter()
+    if mode == 'baseline':
+        # زمن استيراد المكتبة هو كلفة بدء المسار الأصلي
+        importlib.import_module('phonenumbers')
+        validate = baseline_validate
+    else:
+        from phone_validation import PhoneValidator
+        validator = PhoneValidator(COUNTRY_CODES)
+        validator.preload()
+        validate = validator.validate
+    startup = time.perf_counter() - started
+    after_startup = tracemalloc.get_traced_memory()[0] if trace else 0
+
+    # الأصلي يحمّل بيانات كل منطقة عند أول رقم منها، فأول مرور يتضمن هذه الكلفة
+    started = time.perf_counter()
+    for number, code in inputs[:distinct]:
+        validate(number, code)
+    first_pass = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for number, code in inputs:
+        validate(number, code)
+    elapsed = time.perf_counter() - started
+
+    from phonenumbers.phonemetadata import PhoneMetadata
+    result = {
+        'startup_ms': round(startup * 1000, 2),
+        'first_pass_ms': round(first_pass * 1000, 2),
+        'per_call_us': round(elapsed / count * 1e6, 2),
+        'calls_per_s': round(count / elapsed),
+        'regions_loaded': len(PhoneMetadata._region_metadata),
+    }
+    if trace:
+        current, peak = tracemalloc.get_traced_memory()
+        result.update({
+            'startup_memory_kb': round(after_startup / 1024),
+            'retained_memory_kb': round(current / 1024),
+            'peak_memory_kb': round(peak / 1024),
+        })
+        if mode != 'baseline':
+            result['cache_entries'] = validator.cache_info().currsize
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='قياس أداء التحقق من أرقام الهواتف')
+    parser.add_argument('--inputs', type=int, default=20000)
+    parser.add_argument('--distinct', type=int, default=2000, help='عدد المدخلات المختلفة (الباقي تكرار)')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--mode', choices=['baseline', 'optimized'], help=argparse.SUPPRESS)
+    parser.add_argument('--trace', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help='ملف JSON لحفظ النتائج')
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.inputs, args.distinct, args.seed, args.trace)))
+        return
+
+    def run_child(mode: str, *flags) -> dict:
+        return json.loads(subprocess.check_output([
+            sys.executable, '-m', 'benchmarks.phone_validation', '--mode', mode,
+            '--inputs', str(args.inputs), '--distinct', str(args.distinct), '--seed', str(args.seed), *flags
+        ], text=True))
+
+    results = {}
+    for mode in ('baseline', 'optimized'):
+        memory = run_child(mode, '--trace')
+        results[mode] = r = {**run_child(mode), **{k: v for k, v in memory.items() if k.endswith(('_kb', '_entries'))}}
+        print(f"📊 {mode:9s} startup={r['startup_ms']}ms first_pass={r['first_pass_ms']}ms "
+              f"per_call={r['per_call_us']}µs regions={r['regions_loaded']} "
+              f"mem startup/retained/peak={r['startup_memory_kb']}/{r['retained_memory_kb']}/{r['peak_memory_kb']}KB")
+
+    speedup = results['baseline']['per_call_us'] / results['optimized']['per_call_us']
+    results['speedup'] = round(speedup, 1)
+    print(f"🚀 تسريع: {results['speedup']}x")
+    if args.output:
+        save_results(args.output, 'phone_validation', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+# ==============================
+# 🌳 قياس أسئلة شجرة الإحالات: استعلام تعاودي مقابل جدول السلالة
+# ==============================
+#
+# التشغيل:  python -m benchmarks.referral_tree --sizes 1000,10000,100000 --output results.json
+# لكل حجم تُبنى شجرة عميقة في SQLite بالذاكرة (نفس جداول referral_closure و referral_levels)،
+# ثم يُقاس زمن عدد الأحفاد وسلسلة المُحيلين ولوحة المتصدرين بالطريقتين.
+# مع جدول السلالة يبقى الزمن ثابتاً تقريباً مهما كبرت الشجرة.
+
+import time
+import random
+import sqlite3
+import argparse
+from collections import Counter
+
+from benchmarks.common import percentiles, save_results
+
+SCHEMA = '''
+CREATE TABLE user_profiles (user_id INTEGER PRIMARY KEY, referral_code TEXT UNIQUE, invited_by TEXT);
+CREATE INDEX user_profiles_invited_by ON user_profiles (invited_by);
+CREATE TABLE referral_closure (
+    ancestor INTEGER NOT NULL, descendant INTEGER NOT NULL, depth INTEGER NOT NULL,
+    PRIMARY KEY (ancestor, depth, descendant)
+);
+CREATE INDEX referral_closure_descendant ON referral_closure (descendant, depth);
+CREATE TABLE referral_levels (
+    ancestor INTEGER NOT NULL, depth INTEGER NOT NULL, count INTEGER NOT NULL,
+    PRIMARY KEY (ancestor, depth)
+);
+CREATE INDEX referral_levels_leaderboard ON referral_levels (depth, count DESC);
+'''
+
+RECURSIVE_DOWNLINE = '''
+WITH RECURSIVE tree(code, depth) AS (
+    SELECT referral_code, 0 FROM user_profiles WHERE user_id = ?
+    UNION ALL
+    SELECT u.referral_code, tree.depth + 1
+    FROM user_profiles u JOIN tree ON u.invited_by = tree.code
+    WHERE tree.depth < ?
+)
+SELECT depth, COUNT(*) FROM tree WHERE depth > 0 GROUP BY depth
+'''
+RECURSIVE_UPLINE = '''
+WITH RECURSIVE chain(user_id, invited_by, depth) AS (
+    SELECT user_id, invited_by, 0 FROM user_profiles WHERE user_id = ?
+    UNION ALL
+    SELECT p.user_id, p.invited_by, chain.depth + 1
+    FROM user_profiles p JOIN chain ON p.referral_code = chain.invited_by
+    WHERE chain.depth < ?
+)
+SELECT depth, user_id FROM chain WHERE depth > 0 ORDER BY depth
+'''
+CLOSURE_DOWNLINE = 'SELECT depth, count FROM referral_levels WHERE ancestor = ? AND depth <= ?'
+CLOSURE_UPLINE = '''
+SELECT c.depth, p.user_id FROM referral_closure c JOIN user_profiles p ON p.user_id = c.ancestor
+WHERE c.descendant = ? ORDER BY c.depth
+'''
+CLOSURE_LEADERBOARD = '''
+SELECT l.ancestor, p.referral_code, l.count
+FROM referral_levels l JOIN user_profiles p ON p.user_id = l.ancestor
+WHERE l.depth = 0 ORDER BY l.count DESC LIMIT 10
+'''
+
+
+def build_tree(conn, size: int, max_depth: int, seed: int):
+    """شجرة عميقة: كل مستخدم جديد يدعوه غالباً أحد المسجلين حديثاً"""
+    rng = random.Random(seed)
+    parents = [None]
+    for user_id in range(1, size):
+        # 80٪ من آخر 50 مسجلاً (سلاسل طويلة)، والباقي من أي مكان (فروع عريضة)
+        low = max(0, user_id - 50) if rng.random() < 0.8 else 0
+        parents.append(rng.randrange(low, user_id))
+
+    conn.executemany(
+        'INSERT INTO user_profiles VALUES (?, ?, ?)',
+        ((user_id, f'C{user_id}', None if parent is None else f'C{parent}') for user_id, parent in enumerate(parents))
+    )
+
+    # صفوف السلالة كما يضيفها link_referrals: أجداد المُحيل + المُحيل نفسه
+    ancestors = {0: []}
+    levels = Counter()
+    rows = []
+    for user_id in range(1, size):
+        parent = parents[user_id]
+        chain = [(parent, 1)] + [(ancestor, depth + 1) for ancestor, depth in ancestors[parent] if depth < max_depth]
+        ancestors[user_id] = chain
+        for ancestor, depth in chain:
+            rows.append((ancestor, user_id, depth))
+            levels[ancestor, depth] += 1
+            levels[ancestor, 0] += 1
+    conn.executemany('INSERT INTO referral_closure VALUES (?, ?, ?)', rows)
+    conn.executemany('INSERT INTO referral_levels VALUES (?, ?, ?)',
+                     ((ancestor, depth, count) for (ancestor, depth), count in levels.items()))
+    conn.commit()
+    deepest = max(ancestors, key=lambda user_id: len(ancestors[user_id]))
+    return len(rows), deepest
+
+
+def measure(conn, query: str, params_list: list) -> dict:
+    samples = []
+    for params in params_list:
+        started = time.perf_counter()
+        conn.execute(query, params).fetchall()
+        samples.append(time.perf_counter() - started)
+    return percentiles(samples)
+
+
+def bench_size(size: int, args) -> dict:
+    conn = sqlite3.connect(':memory:')
+    conn.executescript(SCHEMA)
+    started = time.perf_counter()
+    closure_rows, deepest = build_tree(conn, size, args.max_depth, args.seed)
+    build_s = time.perf_counter() - started
+
+    rng = random.Random(args.seed + 1)
+    # أكبر الشبكات أسوأ حالة للاستعلام التعاودي (وهي ما يُسأل عنه في لوحة المتصدرين)
+    heaviest = conn.execute(
+        'SELECT ancestor FROM referral_levels WHERE depth = 0 ORDER BY count DESC LIMIT ?', (args.queries,)
+    ).fetchall()
+    downline_params = [(user_id, args.max_depth) for (user_id,) in heaviest]
+    upline_params = [(deepest, args.max_depth)] + [(rng.randrange(size), args.max_depth) for _ in range(args.queries - 1)]
+
+    result = {
+        'users': size,
+        'closure_rows': closure_rows,
+        'build_s': round(build_s, 3),
+        'downline': {
+            'recursive': measure(conn, RECURSIVE_DOWNLINE, downline_params),
+            'closure': measure(conn, CLOSURE_DOWNLINE, downline_params),
+        },
+        'upline': {
+            'recursive': measure(conn, RECURSIVE_UPLINE, upline_params),
+            'closure': measure(conn, CLOSURE_UPLINE, [params[:1] for params in upline_params]),
+        },
+        'leaderboard': {'closure': measure(conn, CLOSURE_LEADERBOARD, [()] * args.queries)},
+    }
+    conn.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='قياس أسئلة شجرة الإحالات')
+    parser.add_argument('--sizes', default='1000,10000,100000')
+    parser.add_argument('--max-depth', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='ملف JSON لحفظ النتائج')
+    args = parser.parse_args()
+
+    runs = []
+    for size in (int(s) for s in args.sizes.split(',')):
+        result = bench_size(size, args)
+        runs.append(result)
+        print(f"🌳 {size} مستخدم ({result['closure_rows']} صف سلالة):")
+        for question in ('downline', 'upline', 'leaderboard'):
+            for method, stats in result[question].items():
+                print(f"   {question:<11} {method:<9} p50={stats['p50']}ms p99={stats['p99']}ms")
+
+    if args.output:
+        save_results(args.output, 'referral_tree', {'max_depth': args.max_depth, 'runs': runs})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+# ==============================
+# ⏱️ اختبار تحميلي لمسار التسجيل الكامل دون تلغرام
+# ==============================
+#
+# التشغيل:  python -m benchmarks.registration_flow --users 2000 --output results.json
+# يولد تحديثات آلاف المستخدمين (مع مدخلات خاطئة تسبب إعادة السؤال)، ويمررها عبر
+# ConversationHandler الحقيقي مع بوت وهمي، ويخزن البيانات في ملف SQLite مؤقت (مستودع
+# sqlite_repository الحقيقي) أو في PostgreSQL محلي عند استخدام --postgres مع
+# STORAGE_BACKEND=postgres (يقرأ DATABASE_URL).
+
+import os
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+from collections import defaultdict
+
+import phonenumbers
+from telegram import Update
+from telegram.ext import Application, ConversationHandler
+
+# يجب تعيينه قبل استيراد main حتى تختار storage المستودع
+os.environ.setdefault('STORAGE_BACKEND', 'sqlite')
+
+import main as bot
+import database
+from migrations import apply_migrations
+from storage import STORAGE_BACKEND
+from sqlite_database import init_sqlite_pool
+from scheduler import UserOrderedUpdateProcessor
+from benchmarks.common import percentiles, save_results
+from benchmarks.fake_telegram import FAKE_TOKEN, make_update
+from benchmarks.stub_bot import StubRequest
+
+FIRST_USER_ID = 9_000_000_000_000
+
+
+# ==============================
+# 🧬 توليد المستخدمين الاصطناعيين
+# ==============================
+def _valid_national_number(rng: random.Random, country_code: str, index: int = 0) -> str:
+    """توليد رقم هاتف صالح للبلد (بدون رمز الدولة)، مختلف لكل مستخدم ما أمكن"""
+    region = phonenumbers.region_code_for_country_code(int(country_code[1:]))
+    example = phonenumbers.example_number_for_type(region, phonenumbers.PhoneNumberType.MOBILE)
+    national = phonenumbers.national_significant_number(example)
+    for attempt in range(100):
+        # المحاولة الأولى مشتقة من رقم المستخدم حتى لا يُرفض كهاتف مكرر
+        suffix = f'{index % 10000:04d}' if attempt == 0 else ''.join(rng.choices('0123456789', k=4))
+        candidate = national[:-4] + suffix
+        if phonenumbers.is_valid_number(phonenumbers.parse(country_code + candidate, None)):
+            return candidate
+    return national
+
+
+def user_script(rng: random.Random, index: int, invalid_rate: float) -> list:
+    """قائمة الرسائل التي يرسلها مستخدم واحد من /start حتى البريد الإلكتروني"""
+    country = rng.choice(list(bot.COUNTRIES))
+    steps = [
+        ('علي', f'علي محمد حسن{index}'),
+        ('نارنيا', country),
+        ('غير محدد', rng.choice(['ذكر', 'أنثى'])),
+        ('abcd', str(rng.randint(1950, 2005))),
+        ('12', _valid_national_number(rng, bot.COUNTRIES[country], index)),
+        ('user@invalid', f'user{index}@example.com'),
+    ]
+    messages = ['/start']
+    for invalid, valid in steps:
+        if rng.random() < invalid_rate:
+            messages.append(invalid)
+        messages.append(valid)
+    return messages
+
+
+def build_updates(application: Application, users: int, invalid_rate: float, seed: int) -> list:
+    """تحديثات جميع المستخدمين متداخلة بالتناوب مع الحفاظ على ترتيب كل مستخدم"""
+    rng = random.Random(seed)
+    scripts = [user_script(rng, i, invalid_rate) for i in range(users)]
+    updates = []
+    update_id = 0
+    step = 0
+    while True:
+        active = False
+        for i, script in enumerate(scripts):
+            if step < len(script):
+                active = True
+                update_id += 1
+                data = make_update(update_id, FIRST_USER_ID + i, script[step])
+                updates.append(Update.de_json(data, application.bot))
+        if not active:
+            return updates
+        step += 1
+
+
+# ==============================
+# ⏲️ قياس زمن كل معالج
+# ==============================
+def instrument_conversation(application: Application) -> dict:
+    """تغليف كل معالج في ConversationHandler لتسجيل زمن تنفيذه"""
+    timings = defaultdict(list)
+
+    def timed(callback):
+        async def wrapper(update, context):
+            started = time.perf_counter()
+            try:
+                return await callback(update, context)
+            finally:
+                timings[callback.__name__].append(time.perf_counter() - started)
+        return wrapper
+
+    for handler in application.handlers[0]:
+        if isinstance(handler, ConversationHandler):
+            children = list(handler.entry_points) + list(handler.fallbacks)
+            for state_handlers in handler.states.values():
+                children.extend(state_handlers)
+            for child in children:
+                child.callback = timed(child.callback)
+    return timings
+
+
+# ==============================
+# 🚀 التشغيل
+# ==============================
+async def run(args, workdir: str) -> dict:
+    if args.postgres != (STORAGE_BACKEND == 'postgres'):
+        raise SystemExit("❌ استخدم --postgres مع STORAGE_BACKEND=postgres معاً")
+    if args.postgres:
+        pool = database.init_pool(bot.get_database_config())
+        # نفس مخطط الإقلاع (الفهارس الفريدة وجداول الإحالات والإحصائيات) حتى تطابق الاستعلامات الإنتاج
+        await pool.run(apply_migrations)
+        await pool.execute('DELETE FROM referral_closure WHERE descendant >= %s', (FIRST_USER_ID,))
+        await pool.execute('DELETE FROM conversation_state WHERE user_id >= %s', (FIRST_USER_ID,))
+        await pool.execute('DELETE FROM user_profiles WHERE user_id >= %s', (FIRST_USER_ID,))
+    else:
+        pool = init_sqlite_pool(os.path.join(workdir, 'bench.sqlite3'))
+    await bot.contact_registry.load()
+
+    # كل التحديثات تُدفع دفعة واحدة، فنرفع حد تخفيف الحمل حتى لا تُرفض
+    bot.SHED_QUEUE_THRESHOLD = args.shed_threshold
+
+    request = StubRequest(latency=args.api_latency)
+    application = (
+        Application.builder()
+        .token(FAKE_TOKEN)
+        .request(request)
+        .updater(None)
+        .concurrent_updates(UserOrderedUpdateProcessor(args.concurrency))
+        .build()
+    )
+    bot.register_handlers(application)
+    timings = instrument_conversation(application)
+    updates = build_updates(application, args.users, args.invalid_rate, args.seed)
+
+    queries_before = pool.stats()['queries']
+    async with application:
+        await application.start()
+        started = time.perf_counter()
+        for update in updates:
+            application.update_queue.put_nowait(update)
+        await application.update_queue.join()
+        elapsed = time.perf_counter() - started
+        await application.stop()
+
+    placeholder = '%s' if args.postgres else '?'
+    registered = (await pool.fetchone(
+        f'SELECT COUNT(*) FROM user_profiles WHERE user_id >= {placeholder}', (FIRST_USER_ID,)
+    ))[0]
+    queries = pool.stats()['queries'] - queries_before - 1
+
+    if args.postgres:
+        await pool.execute('DELETE FROM user_profiles WHERE user_id >= %s', (FIRST_USER_ID,))
+    database.close_pool()
+
+    return {
+        'backend': STORAGE_BACKEND,
+        'registration_batches': bot.registration_writer.batches,
+        'users': args.users,
+        'updates': len(updates),
+        'registered': registered,
+        'elapsed_s': round(elapsed, 3),
+        'registrations_per_s': round(registered / elapsed, 1),
+        'updates_per_s': round(len(updates) / elapsed, 1),
+        'db_queries_per_registration': round(queries / registered, 2) if registered else None,
+        'bot_api_calls': dict(request.calls),
+        'handlers': {
+            name: {'calls': len(samples), **percentiles(samples)}
+            for name, samples in sorted(timings.items())
+        },
+    }
+
+
+def print_report(results: dict):
+    print(f"📊 {results['registered']}/{results['users']} تسجيل في {results['elapsed_s']}s "
+          f"({results['registrations_per_s']} تسجيل/ث، {results['updates_per_s']} تحديث/ث)")
+    print(f"🗄️ استعلامات لكل تسجيل: {results['db_queries_per_registration']} ({results['backend']}، "
+          f"{results['registration_batches']} دفعة كتابة)")
+    for name, stats in results['handlers'].items():
+        print(f"   {name:16s} calls={stats['calls']:6d} p50={stats['p50']}ms p95={stats['p95']}ms p99={stats['p99']}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='اختبار تحميلي لمسار التسجيل')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--invalid-rate', type=float, default=0.2, help='نسبة المدخلات الخاطئة لكل خطوة')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--api-latency', type=float, default=0.0, help='زمن محاكى لكل استدعاء Bot API (ثوانٍ)')
+    parser.add_argument('--shed-threshold', type=int, default=10 ** 9, help='حد تخفيف الحمل (SHED_QUEUE_THRESHOLD)')
+    parser.add_argument('--postgres', action='store_true', help='استخدام PostgreSQL المحلي بدلاً من SQLite')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='ملف JSON لحفظ النتائج')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as workdir:
+        results = asyncio.run(run(args, workdir))
+    print_report(results)
+    if args.output:
+        save_results(args.output, 'registration_flow', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# ==============================
+# 🗄️ مقارنة زمن التسجيل الواحد بين PostgreSQL و SQLite المدمج (WAL)
+# ==============================
+#
+# التشغيل:  python -m benchmarks.storage_backends --users 2000 --backends sqlite,postgres --output results.json
+# لكل واجهة تخزين يُنفذ مسار التسجيل كما يجريه البوت: فحص التسجيل عند /start،
+# ثم إدراج المستخدم، ثم قراءة الملف الشخصي عند /profile، بعدة مستخدمين متزامنين.
+# PostgreSQL يُقاس فقط عند وجود DATABASE_URL.
+
+import os
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+
+import psycopg2
+
+import database
+import repository
+import sqlite_repository
+from migrations import apply_migrations
+from sqlite_database import init_sqlite_pool
+from benchmarks.common import percentiles, save_results
+
+FIRST_USER_ID = 9_100_000_000_000
+
+
+def open_backend(name: str, workdir: str):
+    """تجهيز المجمع المشترك ومستودع الواجهة، أو None إذا لم تكن متاحة"""
+    if name == 'sqlite':
+        init_sqlite_pool(os.path.join(workdir, 'bench.sqlite3'))
+        return sqlite_repository
+    if not os.environ.get('DATABASE_URL'):
+        print("⚠️ DATABASE_URL غير معرّف، تخطي PostgreSQL")
+        return None
+    from main import get_database_config
+
+    config = get_database_config()
+    conn = psycopg2.connect(
+        dbname=config['dbname'], user=config['user'], password=config['password'],
+        host=config['host'], port=config['port']
+    )
+    try:
+        apply_migrations(conn)
+        with conn.cursor() as cursor:
+            cursor.execute('DELETE FROM user_profiles WHERE user_id >= %s', (FIRST_USER_ID,))
+        conn.commit()
+    finally:
+        conn.close()
+    database.init_pool(config)
+    return repository
+
+
+async def bench_backend(repo, args) -> dict:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    totals, steps = [], {'is_user_registered': [], 'insert_user': [], 'get_profile': []}
+
+    async def register(index: int):
+        user_id = FIRST_USER_ID + index
+        user_data = {
+            'full_name': f'مستخدم {index}', 'country': 'السعودية', 'gender': 'ذكر', 'birth_year': 1990,
+            'phone_number': f'+9665{index:08d}', 'email': f'user{index}@example.com',
+        }
+        async with semaphore:
+            started = time.perf_counter()
+            for name, call in (
+                ('is_user_registered', lambda: repo.is_user_registered(user_id)),
+                ('insert_user', lambda: repo.insert_user(user_id, user_data)),
+                ('get_profile', lambda: repo.get_profile(user_id)),
+            ):
+                step_started = time.perf_counter()
+                await call()
+                steps[name].append(time.perf_counter() - step_started)
+            totals.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(register(i) for i in range(args.users)))
+    elapsed = time.perf_counter() - started
+    return {
+        'users': args.users,
+        'elapsed_s': round(elapsed, 3),
+        'registrations_per_s': round(args.users / elapsed, 1),
+        'registration': percentiles(totals),
+        'steps': {name: percentiles(samples) for name, samples in steps.items()},
+    }
+
+
+async def run(args) -> dict:
+    results = {}
+    for name in args.backends.split(','):
+        with tempfile.TemporaryDirectory() as workdir:
+            repo = open_backend(name, workdir)
+            if repo is None:
+                continue
+            try:
+                results[name] = await bench_backend(repo, args)
+                if name == 'postgres':
+                    await database.get_pool().execute(
+                        'DELETE FROM user_profiles WHERE user_id >= %s', (FIRST_USER_ID,)
+                    )
+            finally:
+                database.close_pool()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='مقارنة واجهات التخزين')
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--backends', default='sqlite,postgres')
+    parser.add_argument('--output', help='ملف JSON لحفظ النتائج')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    results = asyncio.run(run(args))
+    for name, result in results.items():
+        registration = result['registration']
+        print(f"🗄️ {name}: {result['registrations_per_s']} تسجيل/ث، "
+              f"زمن التسجيل p50={registration['p50']}ms p95={registration['p95']}ms p99={registration['p99']}ms")
+        for step, stats in result['steps'].items():
+            print(f"   {step:20s} p50={stats['p50']}ms p99={stats['p99']}ms")
+    if args.output:
+        save_results(args.output, 'storage_backends', results)
+
+
+if __name__ == '__main__':
+    main()
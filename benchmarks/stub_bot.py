@@ -0,0 +1,59 @@
+# ==============================
+# 🤖 طبقة طلبات وهمية للبوت: ترد محلياً دون أي اتصال شبكي
+# ==============================
+
+import json
+import time
+import asyncio
+from collections import defaultdict
+
+from telegram.request import BaseRequest
+
+from benchmarks.fake_telegram import BOT_USER
+
+
+class StubRequest(BaseRequest):
+    """تنفيذ BaseRequest يرد على استدعاءات Bot API محلياً
+
+    يمر كل استدعاء عبر التسلسل الحقيقي في مكتبة python-telegram-bot
+    (تحويل المعاملات وتحليل الرد)، لكن دون شبكة. latency تحاكي زمن الرد.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = defaultdict(int)
+        self._message_id = 0
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data else {}
+        self.calls[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if endpoint == 'getMe':
+            result = BOT_USER
+        elif endpoint in ('sendMessage', 'sendDocument'):
+            self._message_id += 1
+            result = {
+                'message_id': self._message_id,
+                'date': int(time.time()),
+                'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+                'text': params.get('text', ''),
+            }
+        elif endpoint == 'getUpdates':
+            result = []
+        else:
+            result = True
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
@@ -0,0 +1,140 @@
+# ==============================
+# ⏱️ قياس زمن "التحديث ← الرد" في وضعي Polling و Webhook
+# ==============================
+#
+# التشغيل:  python -m benchmarks.webhook_latency --updates 500 --rtt 0.02
+# يستخدم خادماً محلياً يحاكي Bot API، و --rtt يضيف تأخيراً لكل استدعاء API
+# لمحاكاة زمن الشبكة إلى خوادم تلغرام.
+
+import time
+import socket
+import asyncio
+import argparse
+
+from aiohttp import ClientSession
+from telegram import Update
+from telegram.ext import Application, CommandHandler
+
+from benchmarks.common import percentiles, save_results
+from benchmarks.fake_telegram import FakeTelegramServer, FAKE_TOKEN, make_update
+from webhook import serve_webhook, SECRET_HEADER
+
+
+async def ping(update: Update, context):
+    await update.message.reply_text('pong')
+
+
+def build_application(fake: FakeTelegramServer, polling: bool) -> Application:
+    builder = Application.builder().token(FAKE_TOKEN).base_url(fake.base_url)
+    if not polling:
+        builder = builder.updater(None)
+    application = builder.build()
+    application.add_handler(CommandHandler('ping', ping))
+    return application
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def _measure(fake: FakeTelegramServer, deliver, count: int) -> list:
+    """إرسال التحديثات واحداً تلو الآخر وقياس الزمن حتى وصول الرد"""
+    loop = asyncio.get_running_loop()
+    samples = []
+    for i in range(1, count + 1):
+        replied = loop.create_future()
+        fake.on_send = lambda params, f=replied: f.done() or f.set_result(time.perf_counter())
+        started = time.perf_counter()
+        await deliver(make_update(i, 1000 + i % 50, '/ping'))
+        samples.append(await replied - started)
+    return samples
+
+
+async def bench_polling(count: int, rtt: float) -> list:
+    fake = FakeTelegramServer(latency=rtt)
+    await fake.start()
+    application = build_application(fake, polling=True)
+    try:
+        async with application:
+            await application.start()
+            await application.updater.start_polling(poll_interval=0, timeout=10)
+
+            async def deliver(update):
+                fake.push_update(update)
+
+            samples = await _measure(fake, deliver, count)
+            await application.updater.stop()
+            await application.stop()
+    finally:
+        await fake.stop()
+    return samples
+
+
+async def bench_webhook(count: int, rtt: float) -> list:
+    fake = FakeTelegramServer(latency=rtt)
+    await fake.start()
+    application = build_application(fake, polling=False)
+    stop_event = asyncio.Event()
+    config = {
+        'listen': '127.0.0.1',
+        'port': _free_port(),
+        'path': '/telegram',
+        'url': None,
+        'secret_token': 'bench-secret',
+        'keepalive_timeout': 75,
+        'max_connections': 40,
+    }
+    server = asyncio.create_task(serve_webhook(application, config, stop_event))
+    url = f"http://127.0.0.1:{config['port']}{config['path']}"
+    try:
+        async with ClientSession() as session:
+            # انتظار جاهزية الخادم
+            for _ in range(100):
+                try:
+                    async with session.get(f"http://127.0.0.1:{config['port']}/health") as res:
+                        if (await res.json())['status'] == 'ok':
+                            break
+                except OSError:
+                    pass
+                await asyncio.sleep(0.05)
+
+            async def deliver(update):
+                # تلغرام يرسل التحديث عبر الشبكة أيضاً: نحاكي نصف زمن الذهاب والإياب
+                if rtt:
+                    await asyncio.sleep(rtt / 2)
+                async with session.post(url, json=update, headers={SECRET_HEADER: 'bench-secret'}) as res:
+                    res.raise_for_status()
+
+            samples = await _measure(fake, deliver, count)
+    finally:
+        stop_event.set()
+        await server
+        await fake.stop()
+    return samples
+
+
+async def run(args):
+    results = {}
+    for mode, bench in (('polling', bench_polling), ('webhook', bench_webhook)):
+        samples = await bench(args.updates, args.rtt)
+        results[mode] = {'updates': len(samples), **percentiles(samples)}
+        print(f"📊 {mode:8s} p50={results[mode]['p50']}ms p95={results[mode]['p95']}ms p99={results[mode]['p99']}ms")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='مقارنة زمن الرد بين Polling و Webhook')
+    parser.add_argument('--updates', type=int, default=300)
+    parser.add_argument('--rtt', type=float, default=0.0, help='تأخير محاكى لكل استدعاء API (ثوانٍ)')
+    parser.add_argument('--output', help='ملف JSON لحفظ النتائج')
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.output:
+        save_results(args.output, 'webhook_latency', results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+# ==============================
+# 📣 البث الجماعي: إرسال محدود المعدل مع حفظ التقدم والاستئناف
+# ==============================
+
+import os
+import time
+import asyncio
+import logging
+from datetime import timedelta
+
+from telegram.error import RetryAfter, Forbidden, TelegramError
+
+from storage import repository
+from database import DatabaseUnavailable
+from ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# تلغرام يسمح بنحو 30 رسالة/ث إجمالاً ورسالة/ث لكل محادثة؛ نترك هامشاً لردود المحادثات
+BROADCAST_RATE = float(os.environ.get('BROADCAST_RATE', '25'))
+BROADCAST_PER_CHAT_INTERVAL = float(os.environ.get('BROADCAST_PER_CHAT_INTERVAL', '1'))
+BROADCAST_BATCH_SIZE = int(os.environ.get('BROADCAST_BATCH_SIZE', '500'))
+BROADCAST_CHECKPOINT_EVERY = int(os.environ.get('BROADCAST_CHECKPOINT_EVERY', '50'))
+BROADCAST_YIELD_DELAY = 0.05
+# انقطاع قاعدة البيانات أثناء البث يُعاد من آخر مستخدم في الذاكرة، بمهلة تتضاعف حتى الحد الأقصى
+BROADCAST_RETRY_ATTEMPTS = int(os.environ.get('BROADCAST_RETRY_ATTEMPTS', '8'))
+BROADCAST_RETRY_BACKOFF = float(os.environ.get('BROADCAST_RETRY_BACKOFF', '1'))
+BROADCAST_RETRY_MAX = float(os.environ.get('BROADCAST_RETRY_MAX', '60'))
+
+
+def _retry_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+class BroadcastEngine:
+    """محرك البث: يقرأ المستلمين على دفعات ويرسل عبر دلو رموز عام
+
+    - يتوقف مؤقتاً عند RetryAfter لكامل المدة التي يطلبها تلغرام.
+    - يحفظ آخر user_id تم الوصول إليه كل BROADCAST_CHECKPOINT_EVERY رسالة،
+      فيُستأنف البث المنقطع من حيث توقف عند إعادة التشغيل.
+    - يتنحى عندما يوجد طابور تحديثات منتظرة، فردود المحادثات لها الأولوية.
+    """
+
+    def __init__(self, bot, processor=None, rate: float = BROADCAST_RATE):
+        self.bot = bot
+        self.processor = processor
+        self.bucket = TokenBucket(rate, capacity=rate)
+        self._last_sent = {}
+        self._tasks = {}
+
+    @property
+    def active_jobs(self) -> list:
+        return list(self._tasks)
+
+    async def start_broadcast(self, message_text: str, notify_chat_id: int = None) -> int:
+        """إنشاء مهمة بث جديدة وتشغيلها في الخلفية"""
+        job_id = await repository.create_broadcast(message_text)
+        self._spawn(job_id, message_text, 0, 0, 0, notify_chat_id)
+        return job_id
+
+    async def resume_pending(self, notify_chat_id: int = None) -> int:
+        """استئناف مهام البث التي لم تكتمل قبل إيقاف البوت"""
+        jobs = await repository.get_running_broadcasts()
+        for job_id, message_text, last_user_id, sent, failed in jobs:
+            logger.info("📣 استئناف البث #%s بعد المستخدم %s", job_id, last_user_id)
+            self._spawn(job_id, message_text, last_user_id, sent, failed, notify_chat_id)
+        return len(jobs)
+
+    async def cancel(self, job_id: int) -> bool:
+        """إلغاء مهمة بث جارية نهائياً"""
+        task = self._tasks.get(job_id)
+        if not task:
+            return False
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await repository.set_broadcast_status(job_id, 'cancelled')
+        return True
+
+    async def stop(self):
+        """إيقاف جميع المهام (تبقى بحالة running لتُستأنف لاحقاً)"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _spawn(self, job_id, message_text, last_user_id, sent, failed, notify_chat_id):
+        task = asyncio.create_task(self._run(job_id, message_text, last_user_id, sent, failed, notify_chat_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    # ==============================
+    # ⏳ التحكم في المعدل والأولوية
+    # ==============================
+    async def _wait_turn(self, chat_id: int):
+        """انتظار دور الإرسال: لا طابور محادثات، ورمز عام متاح، ومهلة المحادثة منقضية"""
+        while self.processor is not None and self.processor.pending_updates > 0:
+            await asyncio.sleep(BROADCAST_YIELD_DELAY)
+
+        last = self._last_sent.get(chat_id)
+        if last is not None:
+            remaining = last + BROADCAST_PER_CHAT_INTERVAL - time.monotonic()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+
+        while True:
+            delay = self.bucket.wait_time()
+            if delay <= 0 and self.bucket.consume():
+                return
+            await asyncio.sleep(max(delay, 0.001))
+
+    async def _send(self, chat_id: int, message_text: str) -> bool:
+        """إرسال رسالة واحدة مع إعادة المحاولة عند RetryAfter"""
+        while True:
+            await self._wait_turn(chat_id)
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=message_text)
+                self._last_sent[chat_id] = time.monotonic()
+                return True
+            except RetryAfter as e:
+                seconds = _retry_seconds(e)
+                logger.warning("⏸️ تلغرام طلب التوقف %ss أثناء البث", seconds)
+                self.bucket.pause(seconds)
+            except Forbidden:
+                # المستخدم حظر البوت
+                return False
+            except TelegramError as e:
+                logger.error("❌ فشل إرسال البث إلى %s: %s", chat_id, e)
+                return False
+
+    # ==============================
+    # 🔁 تنفيذ المهمة
+    # ==============================
+    async def _retry_db(self, job_id, call, *args, **kwargs):
+        """استدعاء المستودع مع إعادة المحاولة عند DatabaseUnavailable (التقدم باقٍ في الذاكرة)"""
+        delay = BROADCAST_RETRY_BACKOFF
+        for attempt in range(1, BROADCAST_RETRY_ATTEMPTS + 1):
+            try:
+                return await call(*args, **kwargs)
+            except DatabaseUnavailable as e:
+                if attempt == BROADCAST_RETRY_ATTEMPTS:
+                    raise
+                logger.warning("⚠️ البث #%s: قاعدة البيانات غير متاحة، إعادة المحاولة %s بعد %.1f ث: %s",
+                               job_id, attempt, delay, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, BROADCAST_RETRY_MAX)
+
+    async def _notify(self, chat_id, text: str):
+        if not chat_id:
+            return
+        try:
+            await self.bot.send_message(chat_id=chat_id, text=text)
+        except TelegramError as e:
+            logger.error("❌ تعذر إبلاغ %s بحالة البث: %s", chat_id, e)
+
+    async def _run(self, job_id, message_text, last_user_id, sent, failed, notify_chat_id):
+        started = time.monotonic()
+        since_checkpoint = 0
+        try:
+            while True:
+                recipients = await self._retry_db(job_id, repository.fetch_recipients, last_user_id, BROADCAST_BATCH_SIZE)
+                if not recipients:
+                    break
+
+                for chat_id in recipients:
+                    if await self._send(chat_id, message_text):
+                        sent += 1
+                    else:
+                        failed += 1
+                    last_user_id = chat_id
+                    since_checkpoint += 1
+                    if since_checkpoint >= BROADCAST_CHECKPOINT_EVERY:
+                        await self._retry_db(job_id, repository.checkpoint_broadcast, job_id, last_user_id, sent, failed)
+                        since_checkpoint = 0
+
+                self._last_sent.clear()
+
+            await self._retry_db(job_id, repository.checkpoint_broadcast, job_id, last_user_id, sent, failed,
+                                 status='done')
+            elapsed = time.monotonic() - started
+            logger.info("📣 اكتمل البث #%s: %s ناجح، %s فاشل خلال %.0fs", job_id, sent, failed, elapsed)
+            await self._notify(
+                notify_chat_id,
+                f"✅ اكتمل البث #{job_id}\n📨 تم الإرسال: {sent}\n⚠️ فشل: {failed}"
+            )
+
+        except asyncio.CancelledError:
+            # حفظ آخر نقطة حتى يُستأنف البث من حيث توقف
+            await repository.checkpoint_broadcast(job_id, last_user_id, sent, failed)
+            raise
+        except DatabaseUnavailable as e:
+            # تبقى المهمة بحالة running فتُستأنف عند إعادة التشغيل من آخر نقطة محفوظة
+            logger.error("❌ توقف البث #%s بعد المستخدم %s: قاعدة البيانات غير متاحة: %s", job_id, last_user_id, e)
+            await self._notify(
+                notify_chat_id,
+                f"⚠️ توقف البث #{job_id} لتعذر الوصول لقاعدة البيانات\n"
+                f"📨 تم الإرسال: {sent}\n🔄 سيُستأنف تلقائياً عند إعادة تشغيل البوت"
+            )
+        except Exception as e:
+            logger.error("❌ فشل البث #%s: %s", job_id, e)
+            try:
+                await repository.checkpoint_broadcast(job_id, last_user_id, sent, failed, status='failed')
+            except Exception as checkpoint_error:
+                logger.error("❌ تعذر تعليم البث #%s كفاشل: %s", job_id, checkpoint_error)
+            await self._notify(
+                notify_chat_id,
+                f"❌ فشل البث #{job_id}: {e}\n📨 تم الإرسال: {sent}\n⚠️ فشل: {failed}"
+            )
@@ -0,0 +1,211 @@
+# ==============================
+# 📥 استيراد تسجيلات موجودة مسبقاً: قراءة على دفعات، تحقق جماعي، ثم دمج واحد لكل دفعة
+# ==============================
+#
+# التشغيل:  python main.py import users.csv --rejects rejects.ndjson
+# الملف CSV بعناوين أعمدة أو NDJSON (سطر JSON لكل مستخدم، ويمكن ضغطه .gz)، والأعمدة:
+# user_id, full_name, country, gender, birth_year, phone_number, email,
+# و telegram_username و invited_by (كود الدعوة) اختياريان. المُحيل يجب أن يكون مسجلاً
+# أو أن يسبق المدعو في الملف.
+
+import os
+import csv
+import gzip
+import json
+import time
+import logging
+from collections import Counter
+
+from storage import repository
+from dedup import contact_registry, normalize_email
+from referrals import referral_aggregator, resolve_referral_code
+from referral_codes import decode_referral_code
+from stats import registration_stats
+from rendering import invalidate_user
+
+logger = logging.getLogger(__name__)
+
+IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', '5000'))
+
+
+# ==============================
+# 📄 قراءة الملف
+# ==============================
+def read_rows(path: str):
+    """بث (رقم السطر، الصف) من ملف CSV أو NDJSON دون تحميله كاملاً في الذاكرة"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8-sig', newline='') as f:
+        if path.endswith(('.ndjson', '.ndjson.gz', '.jsonl', '.jsonl.gz')):
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    row = None
+                yield line_number, row if isinstance(row, dict) else {'_raw': line.rstrip('\n')}
+        else:
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+
+
+def read_chunks(path: str, chunk_size: int):
+    """تجميع الصفوف في قوائم بحجم chunk_size"""
+    chunk = []
+    for item in read_rows(path):
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# ==============================
+# 📥 الاستيراد
+# ==============================
+class BulkImporter:
+    """تحقق كل دفعة وتحميلها بأمر import_users واحد، وكتابة المرفوض في ملف
+
+    بعد الإدراج تُحدَّث نفس الهياكل التي يحدّثها save_user_data: مرشحات
+    التكرار، ومجاميع /stats، وزيادات المُحيلين وشجرة الإحالات، ونصوص
+    /profile المخزنة.
+    """
+
+    def __init__(self, validate, rejects_file):
+        self.validate = validate
+        self.rejects_file = rejects_file
+        self._phones = set()
+        self._emails = set()
+        self._user_ids = set()
+        # المُدرجون فعلاً (في هذا الاستيراد)، والمقبولون في الدفعة الحالية قبل إدراجها
+        self._imported = set()
+        self._chunk_ids = set()
+        self._registered = {}
+        self.rows = 0
+        self.imported = 0
+        self.reasons = Counter()
+
+    def reject(self, line_number: int, row: dict, reason: str):
+        self.reasons[reason] += 1
+        self.rejects_file.write(json.dumps(
+            {'line': line_number, 'reason': reason, 'row': row}, ensure_ascii=False, default=str
+        ))
+        self.rejects_file.write('\n')
+
+    async def _is_registered(self, user_id: int) -> bool:
+        # المُحيل أُدرج في دفعة سابقة، أو سبق المدعو في هذه الدفعة (يُدرج قبله ويُتحقق
+        # من ذلك في import_chunk)، أو مسجل في قاعدة البيانات (استعلام واحد لكل مُحيل)
+        if user_id in self._imported or user_id in self._chunk_ids:
+            return True
+        if user_id not in self._registered:
+            self._registered[user_id] = await repository.is_user_registered(user_id)
+        return self._registered[user_id]
+
+    async def _check(self, record: dict) -> str:
+        """فحوص تعتمد على ما سبق: التكرار داخل الملف وفي قاعدة البيانات، وكود الدعوة"""
+        email = normalize_email(record['email'])
+        if record['user_id'] in self._user_ids:
+            return 'duplicate_user_in_file'
+        if record['phone_number'] in self._phones:
+            return 'duplicate_phone_in_file'
+        if email in self._emails:
+            return 'duplicate_email_in_file'
+        if await contact_registry.phone_taken(record['phone_number']):
+            return 'phone_taken'
+        if await contact_registry.email_taken(record['email']):
+            return 'email_taken'
+        if record['invited_by']:
+            record['invited_by'] = await resolve_referral_code(record['invited_by'], self._is_registered)
+            if record['invited_by'] is None:
+                return 'unknown_referral_code'
+        return None
+
+    async def import_chunk(self, chunk: list):
+        self.rows += len(chunk)
+        self._chunk_ids = set()
+        records, lines = [], {}
+        for (line_number, row), (record, reason) in zip(chunk, self.validate([row for _, row in chunk])):
+            if record is not None:
+                reason = await self._check(record)
+            if reason:
+                self.reject(line_number, row, reason)
+                continue
+            records.append(record)
+            lines[record['user_id']] = (line_number, row)
+            self._user_ids.add(record['user_id'])
+            self._chunk_ids.add(record['user_id'])
+            self._phones.add(record['phone_number'])
+            self._emails.add(normalize_email(record['email']))
+
+        # من مُحيله في نفس الدفعة يُدرج في جولة تالية بعد إدراج المُحيل فعلاً، ومن رُفض
+        # مُحيله (تعارض عند الإدراج) يُرفض بدلاً من ربطه بمستخدم غير موجود
+        waiting = records
+        while waiting:
+            ready, deferred = [], []
+            for record in waiting:
+                inviter_id = decode_referral_code(record['invited_by']) if record['invited_by'] else None
+                if inviter_id in self._chunk_ids:
+                    deferred.append(record)
+                elif inviter_id in lines and inviter_id not in self._imported and not self._registered.get(inviter_id):
+                    self._chunk_ids.discard(record['user_id'])
+                    self.reject(*lines[record['user_id']], 'inviter_rejected')
+                else:
+                    ready.append(record)
+            if not ready:
+                # حلقة إحالات داخل الملف (مثل مستخدم يدعو نفسه)
+                for record in deferred:
+                    self._chunk_ids.discard(record['user_id'])
+                    self.reject(*lines[record['user_id']], 'inviter_rejected')
+                break
+            await self._insert(ready, lines)
+            waiting = deferred
+
+    async def _insert(self, records: list, lines: dict):
+        inserted = {user_id for user_id, _ in await repository.import_users(records)}
+        for record in records:
+            user_id = record['user_id']
+            self._chunk_ids.discard(user_id)
+            if user_id not in inserted:
+                # user_id مسجل مسبقاً، أو سجل مستخدم آخر الهاتف/البريد بعد الفحص؛ في
+                # الحالة الثانية لا يُقبل مدعووه في الملف
+                self._registered[user_id] = await repository.is_user_registered(user_id)
+                self.reject(*lines[user_id], 'conflict')
+                continue
+            self._imported.add(user_id)
+            contact_registry.add(record['phone_number'], record['email'])
+            registration_stats.record(record)
+            if record['invited_by']:
+                referral_aggregator.link(user_id, record['invited_by'])
+            invalidate_user(user_id)
+        self.imported += len(inserted)
+
+
+async def run_import(path: str, validate, rejects_path: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> dict:
+    """استيراد الملف كاملاً وإرجاع تقرير بعدد الصفوف والمرفوض وسرعة الاستيراد"""
+    await contact_registry.load()
+    started = time.perf_counter()
+    with open(rejects_path, 'w', encoding='utf-8') as rejects_file:
+        importer = BulkImporter(validate, rejects_file)
+        try:
+            for chunk in read_chunks(path, chunk_size):
+                await importer.import_chunk(chunk)
+                logger.info("📥 %s صف: استُورد %s، رُفض %s", importer.rows, importer.imported,
+                            sum(importer.reasons.values()))
+        finally:
+            # إحالات ومجاميع ما أُدرج فعلاً تُكتب حتى لو توقف الاستيراد في منتصفه
+            await referral_aggregator.flush()
+            await registration_stats.flush()
+    elapsed = time.perf_counter() - started
+    if not importer.reasons:
+        os.remove(rejects_path)
+    return {
+        'rows': importer.rows,
+        'imported': importer.imported,
+        'rejected': sum(importer.reasons.values()),
+        'reasons': dict(importer.reasons.most_common()),
+        'rejects_path': rejects_path,
+        'elapsed_s': round(elapsed, 3),
+        'rows_per_s': round(importer.rows / elapsed, 1) if elapsed else None,
+    }
@@ -0,0 +1,79 @@
+# ==============================
+# 🧠 ذاكرات تخزين مؤقت لكل مستخدم: حالة التسجيل والردود المنسقة
+# ==============================
+
+import os
+import time
+import threading
+from collections import OrderedDict
+
+REGISTRATION_CACHE_SIZE = int(os.environ.get('REGISTRATION_CACHE_SIZE', '100000'))
+REGISTRATION_CACHE_TTL = float(os.environ.get('REGISTRATION_CACHE_TTL', '3600'))
+REGISTRATION_CACHE_NEGATIVE_TTL = float(os.environ.get('REGISTRATION_CACHE_NEGATIVE_TTL', '60'))
+PROFILE_CACHE_SIZE = int(os.environ.get('PROFILE_CACHE_SIZE', '20000'))
+# حد أعلى لعمر النص المنسق إذا تغير الصف دون المرور بنقاط الإبطال
+PROFILE_CACHE_TTL = float(os.environ.get('PROFILE_CACHE_TTL', '300'))
+
+
+class RegistrationCache:
+    """ذاكرة LRU محدودة الحجم مع مدة صلاحية لحالة التسجيل
+
+    تحتفظ بالنتائج الإيجابية (مسجل) والسلبية (غير مسجل)، والسلبية لها
+    مدة صلاحية أقصر لأنها تتغير بمجرد إكمال المستخدم للتسجيل.
+    يمكن تخزين أي قيمة أخرى أيضاً: القيمة الفارغة تأخذ مدة الصلاحية السلبية.
+    """
+
+    def __init__(self, maxsize: int = REGISTRATION_CACHE_SIZE,
+                 ttl: float = REGISTRATION_CACHE_TTL,
+                 negative_ttl: float = REGISTRATION_CACHE_NEGATIVE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int):
+        """إرجاع True/False إذا كانت النتيجة مخزنة وصالحة، أو None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, user_id: int, registered: bool):
+        """تخزين حالة التسجيل مع إخراج أقدم عنصر عند امتلاء الذاكرة"""
+        expires = time.monotonic() + (self.ttl if registered else self.negative_ttl)
+        with self._lock:
+            self._entries[user_id] = (registered, expires)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int):
+        """حذف المستخدم من الذاكرة"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        """عدد الإصابات والإخفاقات وحجم الذاكرة"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+
+registration_cache = RegistrationCache()
+# نصوص /profile و /invite المنسقة لكل مستخدم، تُبطل عند تغير صفه
+profile_cache = RegistrationCache(PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL, PROFILE_CACHE_TTL)
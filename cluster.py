@@ -0,0 +1,313 @@
+# ==============================
+# 🧩 وضع العنقود: عملية أمامية خفيفة توزع التحديثات على N عملية عاملة
+# ==============================
+#
+# العملية الأمامية تستقبل التحديثات (Polling أو Webhook) دون تحليلها، وترسل كل
+# تحديث إلى العامل shard_for(user_id, N). كل عامل بوت كامل (main.py) في وضع
+# BOT_MODE=worker يستقبل التحديثات على منفذ محلي، فتبقى مراحل محادثة المستخدم
+# مرتبة داخل عامل واحد، وتتوزع معالجة المستخدمين المختلفين على الأنوية.
+
+import os
+import sys
+import signal
+import asyncio
+import logging
+import secrets
+import subprocess
+
+from aiohttp import web, ClientSession, ClientTimeout, TCPConnector
+
+from scheduler import raw_ordering_key, shard_for
+from webhook import SECRET_HEADER, get_webhook_config
+
+logger = logging.getLogger(__name__)
+
+CLUSTER_WORKERS = int(os.environ.get('CLUSTER_WORKERS', str(os.cpu_count() or 1)))
+CLUSTER_BASE_PORT = int(os.environ.get('CLUSTER_BASE_PORT', '8600'))
+# polling أو webhook: كيف تستقبل العملية الأمامية التحديثات من تلغرام
+CLUSTER_FRONT_MODE = os.environ.get('CLUSTER_FRONT_MODE', 'polling').lower()
+CLUSTER_MAX_BATCH = int(os.environ.get('CLUSTER_MAX_BATCH', '100'))
+# مهلة إعادة getUpdates بعد رد فاشل دون retry_after، تتضاعف حتى الحد الأقصى
+CLUSTER_POLL_BACKOFF = float(os.environ.get('CLUSTER_POLL_BACKOFF', '1'))
+CLUSTER_POLL_BACKOFF_MAX = float(os.environ.get('CLUSTER_POLL_BACKOFF_MAX', '60'))
+WORKER_PATH = '/updates'
+TELEGRAM_API = 'https://api.telegram.org/bot'
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+
+
+def worker_config(index: int, secret_token: str = None) -> dict:
+    """إعدادات خادم العامل المحلي (بنفس صيغة get_webhook_config)"""
+    return {
+        'listen': '127.0.0.1',
+        'port': CLUSTER_BASE_PORT + index,
+        'path': WORKER_PATH,
+        'url': None,
+        'secret_token': secret_token or os.environ.get('CLUSTER_SECRET'),
+        'cert': None,
+        'key': None,
+        'keepalive_timeout': 75.0,
+        'max_connections': 40,
+    }
+
+
+# ==============================
+# 🔀 توجيه التحديثات إلى العمال
+# ==============================
+class UpdateRouter:
+    """طابور لكل عامل ومُرسل واحد يرسل التحديثات على دفعات بالترتيب
+
+    مُرسل واحد لكل عامل يعني أن تحديثات المستخدم تصل بنفس ترتيب استلامها،
+    وإرسال كل ما تراكم في طلب HTTP واحد يعوض عدم التوازي داخل العامل الواحد.
+    """
+
+    def __init__(self, worker_urls: list, secret_token: str = None, max_batch: int = CLUSTER_MAX_BATCH):
+        self.worker_urls = worker_urls
+        self.secret_token = secret_token
+        self.max_batch = max_batch
+        self._queues = [asyncio.Queue() for _ in worker_urls]
+        self._tasks = []
+        self._session = None
+        self.routed = [0] * len(worker_urls)
+
+    @property
+    def workers(self) -> int:
+        return len(self.worker_urls)
+
+    def route(self, data: dict) -> int:
+        """إضافة تحديث خام إلى طابور العامل المسؤول عن مستخدمه"""
+        index = shard_for(raw_ordering_key(data), self.workers)
+        self._queues[index].put_nowait(data)
+        self.routed[index] += 1
+        return index
+
+    async def start(self):
+        headers = {SECRET_HEADER: self.secret_token} if self.secret_token else None
+        self._session = ClientSession(
+            connector=TCPConnector(limit_per_host=1),
+            timeout=ClientTimeout(total=30),
+            headers=headers
+        )
+        self._tasks = [asyncio.create_task(self._sender(i)) for i in range(self.workers)]
+
+    async def _sender(self, index: int):
+        queue = self._queues[index]
+        url = self.worker_urls[index]
+        while True:
+            batch = [await queue.get()]
+            while not queue.empty() and len(batch) < self.max_batch:
+                batch.append(queue.get_nowait())
+
+            delay = 0.1
+            while True:
+                try:
+                    async with self._session.post(url, json=batch) as response:
+                        if response.status < 500:
+                            if response.status != 200:
+                                logger.error("❌ العامل %s رفض %s تحديث: %s", index, len(batch), response.status)
+                            break
+                except Exception as e:
+                    logger.warning("⚠️ تعذر الوصول إلى العامل %s: %s", index, e)
+                # إعادة المحاولة بنفس الدفعة حفاظاً على الترتيب
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5.0)
+
+            for _ in batch:
+                queue.task_done()
+
+    async def join(self):
+        """انتظار إرسال كل التحديثات في الطوابير"""
+        for queue in self._queues:
+            await queue.join()
+
+    async def stop(self):
+        await self.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._session:
+            await self._session.close()
+
+
+# ==============================
+# 📥 استقبال التحديثات في العملية الأمامية
+# ==============================
+def _retry_after(payload: dict):
+    return (payload.get('parameters') or {}).get('retry_after')
+
+
+async def _call_api(session: ClientSession, url: str, params: dict = None) -> dict:
+    async with session.post(url, json=params) as response:
+        return await response.json()
+
+
+async def _setup_call(session: ClientSession, url: str, params: dict = None) -> dict:
+    """استدعاء إعداد (deleteWebhook/setWebhook) يجب أن ينجح، مع انتظار retry_after إن طُلب"""
+    while True:
+        payload = await _call_api(session, url, params)
+        if payload.get('ok'):
+            return payload
+        retry_after = _retry_after(payload)
+        if not retry_after:
+            # اسم الطريقة فقط، فالرابط يحتوي على رمز البوت
+            method = url.rsplit('/', 1)[-1]
+            raise RuntimeError(f"{method}: {payload.get('error_code')} {payload.get('description')}")
+        logger.warning("⏸️ تلغرام طلب التوقف %ss قبل %s", retry_after, url.rsplit('/', 1)[-1])
+        await asyncio.sleep(retry_after)
+
+
+async def poll_updates(router: UpdateRouter, token: str, stop_event: asyncio.Event,
+                       api_url: str = TELEGRAM_API, timeout: int = 30):
+    """getUpdates مباشرة عبر HTTP وتمرير JSON الخام دون تحليله إلى كائنات
+
+    الرد غير الناجح (409 تعارض، 401 رمز خاطئ، 429 ...) لا يحتوي result، فننتظر
+    retry_after إن أُعطي، وإلا نعيد المحاولة بمهلة تتضاعف حتى لا ندور في حلقة ساخنة.
+    """
+    base = f'{api_url}{token}'
+    offset = 0
+    delay = CLUSTER_POLL_BACKOFF
+    async with ClientSession(timeout=ClientTimeout(total=timeout + 10)) as session:
+        await _setup_call(session, f'{base}/deleteWebhook')
+        while not stop_event.is_set():
+            try:
+                payload = await _call_api(session, f'{base}/getUpdates', {'offset': offset, 'timeout': timeout})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                payload = {'ok': False, 'description': str(e)}
+
+            if payload.get('ok'):
+                delay = CLUSTER_POLL_BACKOFF
+                for data in payload.get('result', ()):
+                    offset = data['update_id'] + 1
+                    router.route(data)
+                continue
+
+            retry_after = _retry_after(payload)
+            if retry_after:
+                logger.warning("⏸️ تلغرام طلب التوقف %ss عن getUpdates", retry_after)
+                await asyncio.sleep(retry_after)
+                continue
+            logger.warning("⚠️ خطأ في getUpdates (%s)، إعادة المحاولة بعد %.1f ث: %s",
+                           payload.get('error_code'), delay, payload.get('description'))
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, CLUSTER_POLL_BACKOFF_MAX)
+
+
+def create_front_app(router: UpdateRouter, config: dict) -> web.Application:
+    """خادم Webhook للعملية الأمامية: يوجه التحديث ويرد فوراً"""
+    secret_token = config.get('secret_token')
+
+    async def handle_update(request: web.Request) -> web.Response:
+        if secret_token and request.headers.get(SECRET_HEADER) != secret_token:
+            return web.Response(status=403)
+        try:
+            router.route(await request.json())
+        except Exception as e:
+            logger.error("❌ تحديث غير صالح من Webhook: %s", e)
+            return web.Response(status=400)
+        return web.Response()
+
+    async def handle_health(request: web.Request) -> web.Response:
+        return web.json_response({'status': 'ok', 'workers': router.workers, 'routed': router.routed})
+
+    web_app = web.Application()
+    web_app.router.add_post(config['path'], handle_update)
+    web_app.router.add_get('/health', handle_health)
+    return web_app
+
+
+# ==============================
+# 🚀 تشغيل العنقود
+# ==============================
+def spawn_workers(workers: int, secret_token: str) -> list:
+    """تشغيل العمال كعمليات main.py مستقلة في وضع worker"""
+    processes = []
+    spool_path = os.environ.get('SPOOL_PATH', 'registrations.spool')
+    for index in range(workers):
+        env = dict(
+            os.environ,
+            BOT_MODE='worker',
+            WORKER_INDEX=str(index),
+            CLUSTER_WORKERS=str(workers),
+            CLUSTER_SECRET=secret_token,
+            SPOOL_PATH=f'{spool_path}.{index}',
+        )
+        processes.append(subprocess.Popen([sys.executable, MAIN_SCRIPT], env=env))
+    return processes
+
+
+async def wait_workers_ready(worker_count: int, base_port: int = CLUSTER_BASE_PORT, timeout: float = 120.0):
+    """انتظار جاهزية جميع العمال عبر /health"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    async with ClientSession(timeout=ClientTimeout(total=2)) as session:
+        for index in range(worker_count):
+            url = f"http://127.0.0.1:{base_port + index}/health"
+            while True:
+                try:
+                    async with session.get(url) as response:
+                        if (await response.json()).get('status') == 'ok':
+                            break
+                except Exception:
+                    pass
+                if loop.time() > deadline:
+                    raise RuntimeError(f"العامل {index} لم يصبح جاهزاً")
+                await asyncio.sleep(0.5)
+
+
+async def serve_cluster(token: str, workers: int = CLUSTER_WORKERS, mode: str = CLUSTER_FRONT_MODE):
+    """تشغيل العمال ثم استقبال التحديثات وتوزيعها حتى إشارة الإيقاف"""
+    secret_token = secrets.token_hex(16)
+    processes = spawn_workers(workers, secret_token)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    router = UpdateRouter(
+        [f"http://127.0.0.1:{CLUSTER_BASE_PORT + i}{WORKER_PATH}" for i in range(workers)], secret_token
+    )
+    runner = None
+    try:
+        await wait_workers_ready(workers)
+        await router.start()
+        logger.info("🧩 العنقود جاهز: %s عامل، الاستقبال عبر %s", workers, mode)
+
+        if mode == 'webhook':
+            config = get_webhook_config()
+            runner = web.AppRunner(create_front_app(router, config), access_log=None)
+            await runner.setup()
+            await web.TCPSite(runner, config['listen'], config['port']).start()
+            if config.get('url'):
+                async with ClientSession() as session:
+                    await _setup_call(session, f'{TELEGRAM_API}{token}/setWebhook', {
+                        'url': config['url'].rstrip('/') + config['path'],
+                        'secret_token': config.get('secret_token'),
+                        'max_connections': config['max_connections'],
+                    })
+            await stop_event.wait()
+        else:
+            poller = asyncio.create_task(poll_updates(router, token, stop_event))
+            # فشل deleteWebhook (رمز خاطئ مثلاً) يوقف العنقود بدل الانتظار دون استقبال
+            poller.add_done_callback(lambda _: stop_event.set())
+            await stop_event.wait()
+            poller.cancel()
+            await asyncio.gather(poller, return_exceptions=True)
+            if not poller.cancelled() and poller.exception():
+                raise poller.exception()
+
+        await router.stop()
+    finally:
+        if runner:
+            await runner.cleanup()
+        # SIGTERM يوقف كل عامل بسلاسة (حفظ المحادثات والإحالات قبل الإغلاق)
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            await loop.run_in_executor(None, process.wait)
+
+
+def run_cluster(token: str, workers: int = CLUSTER_WORKERS):
+    """نقطة الدخول المتزامنة لوضع العنقود"""
+    asyncio.run(serve_cluster(token, workers))
@@ -0,0 +1,323 @@
+# ==============================
+# 🗄️ طبقة قاعدة البيانات: مجمع اتصالات مشترك غير حاجب
+# ==============================
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+from metrics import DB_ACQUIRE_SECONDS, DB_QUERY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# ==============================
+# 🔧 إعدادات المجمع
+# ==============================
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', '10'))
+# عدد الاتصالات التي تُفتح مسبقاً عند الإقلاع حتى لا يدفع أول المستخدمين زمن الاتصال
+DB_POOL_WARM = int(os.environ.get('DB_POOL_WARM', '4'))
+DB_ACQUIRE_TIMEOUT = float(os.environ.get('DB_ACQUIRE_TIMEOUT', '10'))
+DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', '5'))
+DB_BREAKER_FAILURES = int(os.environ.get('DB_BREAKER_FAILURES', '3'))
+DB_BREAKER_RESET = float(os.environ.get('DB_BREAKER_RESET', '15'))
+
+
+class DatabaseUnavailable(Exception):
+    """قاعدة البيانات غير متاحة (فشل الاتصال، أو المجمع ممتلئ، أو القاطع مفتوح)"""
+
+
+class PoolTimeout(DatabaseUnavailable):
+    """انتهت مهلة انتظار اتصال متاح في المجمع"""
+
+
+class CircuitOpen(DatabaseUnavailable):
+    """القاطع مفتوح: يُرفض الطلب فوراً دون محاولة الاتصال"""
+
+
+class DuplicateRecord(Exception):
+    """انتهاك قيد فريد عند الإدراج؛ constraint اسم القيد أو رسالة قاعدة البيانات"""
+
+    def __init__(self, constraint: str):
+        super().__init__(constraint)
+        self.constraint = constraint
+
+
+# ==============================
+# ⚡ قاطع الدائرة
+# ==============================
+class CircuitBreaker:
+    """قاطع دائرة لطبقة قاعدة البيانات
+
+    بعد عدد من الإخفاقات المتتالية يُفتح القاطع فتفشل الطلبات فوراً بدلاً من
+    انتظار مهلة الاتصال في كل مرة. بعد reset_timeout يُسمح بطلب تجريبي واحد
+    (half-open): نجاحه يغلق القاطع، وفشله يعيد فتحه.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold: int = DB_BREAKER_FAILURES, reset_timeout: float = DB_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """يرفع CircuitOpen إذا كان يجب رفض الطلب فوراً"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+            raise CircuitOpen("قاعدة البيانات غير متاحة حالياً")
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("✅ عادت قاعدة البيانات للعمل، تم إغلاق القاطع")
+            self.state = self.CLOSED
+            self._failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.error("⚡ تم فتح قاطع قاعدة البيانات بعد %s إخفاق", self._failures)
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    @property
+    def is_closed(self) -> bool:
+        return self.state == self.CLOSED
+
+
+class DatabasePool:
+    """مجمع اتصالات محدود الحجم مع مجمع خيوط مخصص للاستعلامات
+
+    كل استعلام يُنفَّذ داخل خيط من مجمع الخيوط حتى لا تُحجب حلقة الأحداث،
+    وعدد الخيوط يساوي الحد الأقصى للاتصالات فلا ينتظر خيط على اتصال أبداً.
+    """
+
+    def __init__(self, config: dict, minconn: int = DB_POOL_MIN, maxconn: int = DB_POOL_MAX):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self._pool = ThreadedConnectionPool(
+            minconn,
+            maxconn,
+            dbname=config['dbname'],
+            user=config['user'],
+            password=config['password'],
+            host=config['host'],
+            port=config['port'],
+            connect_timeout=DB_CONNECT_TIMEOUT
+        )
+        self.breaker = CircuitBreaker()
+        self._executor = ThreadPoolExecutor(max_workers=maxconn, thread_name_prefix='db')
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+
+        # إحصائيات المجمع
+        self._in_use = 0
+        self._waiters = 0
+        self._acquired = 0
+        self._queries = 0
+        self._acquire_total = 0.0
+        self._acquire_max = 0.0
+
+    # ==============================
+    # 🔌 حجز الاتصالات وإرجاعها
+    # ==============================
+    def _acquire(self):
+        """حجز اتصال من المجمع مع قياس زمن الانتظار"""
+        started = time.perf_counter()
+        with self._lock:
+            self._waiters += 1
+        try:
+            if not self._slots.acquire(timeout=DB_ACQUIRE_TIMEOUT):
+                raise PoolTimeout("لا يوجد اتصال متاح في المجمع")
+        finally:
+            with self._lock:
+                self._waiters -= 1
+
+        try:
+            conn = self._pool.getconn()
+        except psycopg2.OperationalError as e:
+            self._slots.release()
+            raise DatabaseUnavailable(str(e)) from e
+        except Exception:
+            self._slots.release()
+            raise
+
+        elapsed = time.perf_counter() - started
+        DB_ACQUIRE_SECONDS.observe(elapsed)
+        with self._lock:
+            self._in_use += 1
+            self._acquired += 1
+            self._acquire_total += elapsed
+            self._acquire_max = max(self._acquire_max, elapsed)
+        return conn
+
+    def _release(self, conn, broken: bool = False):
+        """إرجاع الاتصال إلى المجمع (أو إغلاقه إذا كان معطوباً)"""
+        try:
+            self._pool.putconn(conn, close=broken or bool(conn.closed))
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    def _call(self, func, args, operation):
+        """تنفيذ دالة متزامنة على اتصال محجوز ضمن معاملة واحدة"""
+        try:
+            conn = self._acquire()
+        except DatabaseUnavailable:
+            self.breaker.record_failure()
+            raise
+
+        broken = False
+        try:
+            with self._lock:
+                self._queries += 1
+            with DB_QUERY_SECONDS.labels(operation).time():
+                result = func(conn, *args)
+                conn.commit()
+            self.breaker.record_success()
+            return result
+        except psycopg2.OperationalError as e:
+            broken = True
+            self.breaker.record_failure()
+            raise DatabaseUnavailable(str(e)) from e
+        except Exception:
+            # خطأ في الاستعلام نفسه: قاعدة البيانات تعمل
+            self.breaker.record_success()
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            self._release(conn, broken)
+
+    # ==============================
+    # ⚡ الواجهة غير المتزامنة
+    # ==============================
+    async def run(self, func, *args, operation: str = None):
+        """تنفيذ func(conn, *args) في مجمع الخيوط دون حجب حلقة الأحداث"""
+        # الفشل الفوري عندما يكون القاطع مفتوحاً، دون حجز خيط أو انتظار مهلة اتصال
+        self.breaker.before_call()
+        loop = asyncio.get_running_loop()
+        operation = operation or func.__name__.lstrip('_')
+        return await loop.run_in_executor(self._executor, self._call, func, args, operation)
+
+    async def fetchone(self, query: str, params=None, operation: str = 'fetchone'):
+        """تنفيذ استعلام وإرجاع صف واحد"""
+        def _fetchone(conn):
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchone()
+        return await self.run(_fetchone, operation=operation)
+
+    async def fetchall(self, query: str, params=None, operation: str = 'fetchall'):
+        """تنفيذ استعلام وإرجاع جميع الصفوف"""
+        def _fetchall(conn):
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchall()
+        return await self.run(_fetchall, operation=operation)
+
+    async def execute(self, query: str, params=None, operation: str = 'execute') -> int:
+        """تنفيذ أمر وإرجاع عدد الصفوف المتأثرة"""
+        def _execute(conn):
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                return cursor.rowcount
+        return await self.run(_execute, operation=operation)
+
+    def warm_up(self, count: int = DB_POOL_WARM) -> int:
+        """فتح عدد من الاتصالات مسبقاً (متزامن، يُستدعى من خيط خلفي عند الإقلاع)"""
+        count = min(count, self.maxconn)
+        conns = []
+        try:
+            for _ in range(count):
+                conn = self._acquire()
+                conns.append(conn)
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                conn.rollback()
+        finally:
+            for conn in conns:
+                self._release(conn)
+        return len(conns)
+
+    # ==============================
+    # 📊 الإحصائيات والإغلاق
+    # ==============================
+    def stats(self) -> dict:
+        """إحصائيات المجمع: الاتصالات المستخدمة، المنتظرون، وزمن الحجز"""
+        with self._lock:
+            return {
+                'size': self.maxconn,
+                'in_use': self._in_use,
+                'waiters': self._waiters,
+                'acquired': self._acquired,
+                'queries': self._queries,
+                'acquire_avg_ms': (self._acquire_total / self._acquired * 1000) if self._acquired else 0.0,
+                'acquire_max_ms': self._acquire_max * 1000,
+                'breaker': self.breaker.state,
+            }
+
+    def close(self):
+        """إغلاق مجمع الخيوط وجميع الاتصالات"""
+        self._executor.shutdown(wait=True)
+        self._pool.closeall()
+        logger.info("🔌 تم إغلاق مجمع اتصالات قاعدة البيانات")
+
+
+# ==============================
+# 🌐 المجمع المشترك للتطبيق
+# ==============================
+_pool = None
+
+
+def init_pool(config: dict) -> DatabasePool:
+    """إنشاء المجمع المشترك مرة واحدة عند تشغيل البوت"""
+    global _pool
+    if _pool is None:
+        _pool = DatabasePool(config)
+        logger.info("✅ تم إنشاء مجمع الاتصالات (الحد الأقصى: %s)", _pool.maxconn)
+    return _pool
+
+
+def set_pool(pool):
+    """تعيين مجمع بديل بنفس الواجهة (يُستخدم في أدوات القياس)"""
+    global _pool
+    _pool = pool
+    return _pool
+
+
+def get_pool() -> DatabasePool:
+    """الحصول على المجمع المشترك"""
+    if _pool is None:
+        raise RuntimeError("لم يتم إنشاء مجمع الاتصالات بعد، استدعِ init_pool() أولاً")
+    return _pool
+
+
+def close_pool():
+    """إغلاق المجمع المشترك"""
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
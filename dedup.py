@@ -0,0 +1,198 @@
+# ==============================
+# 🧮 كشف الهواتف والبُرد المسجلة مسبقاً: مرشح Bloom في الذاكرة ثم فهرس فريد
+# ==============================
+
+import os
+import math
+import asyncio
+import hashlib
+import logging
+import threading
+
+from storage import repository
+from database import DatabaseUnavailable
+from metrics import DEDUP_CHECKS
+
+logger = logging.getLogger(__name__)
+
+# السعة المتوقعة ونسبة الإيجابيات الكاذبة تحددان حجم كل مرشح:
+# مليون قيمة بنسبة 0.1٪ ≈ 1.8 ميغابايت لكل من الهاتف والبريد
+DEDUP_CAPACITY = int(os.environ.get('DEDUP_CAPACITY', '1000000'))
+DEDUP_FP_RATE = float(os.environ.get('DEDUP_FP_RATE', '0.001'))
+DEDUP_LOAD_CHUNK = int(os.environ.get('DEDUP_LOAD_CHUNK', '10000'))
+# إضافة تسجيلات العمليات الأخرى (وضع العنقود) إلى المرشح كل كذا ثانية، 0 للتعطيل
+DEDUP_REFRESH_INTERVAL = float(os.environ.get('DEDUP_REFRESH_INTERVAL', '60'))
+
+
+def normalize_email(email: str) -> str:
+    """الصيغة المخزنة في الفهرس الفريد (lower(email))"""
+    return email.strip().lower()
+
+
+class BloomFilter:
+    """مرشح Bloom بمصفوفة بتات bytearray ودوال تجزئة مزدوجة من blake2b
+
+    النتيجة السلبية مؤكدة (القيمة لم تُضف أبداً)، والإيجابية محتملة فقط
+    بنسبة خطأ fp_rate طالما لم يتجاوز عدد القيم السعة المحددة.
+    """
+
+    def __init__(self, capacity: int = DEDUP_CAPACITY, fp_rate: float = DEDUP_FP_RATE):
+        self.capacity = max(1, capacity)
+        self.fp_rate = fp_rate
+        self.bits = max(8, math.ceil(-self.capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / self.capacity * math.log(2)))
+        self._array = bytearray((self.bits + 7) // 8)
+        # الإضافة قراءة-تعديل-كتابة للبايت، والتحميل يجري في خيط منفصل
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, value: str):
+        positions = self._positions(value)
+        with self._lock:
+            for position in positions:
+                self._array[position >> 3] |= 1 << (position & 7)
+            self.count += 1
+
+    def update(self, values):
+        for value in values:
+            self.add(value)
+
+    def __contains__(self, value: str) -> bool:
+        array = self._array
+        return all(array[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._array)
+
+    def estimated_fp_rate(self) -> float:
+        """النسبة المتوقعة حالياً حسب عدد القيم المضافة"""
+        return (1 - math.exp(-self.hashes * self.count / self.bits)) ** self.hashes
+
+    def stats(self) -> dict:
+        return {
+            'items': self.count,
+            'capacity': self.capacity,
+            'bits': self.bits,
+            'hashes': self.hashes,
+            'bytes': self.size_bytes,
+            'target_fp_rate': self.fp_rate,
+            'estimated_fp_rate': self.estimated_fp_rate(),
+        }
+
+
+class ContactRegistry:
+    """التحقق من تكرار الهاتف والبريد دون استعلام في الحالة الشائعة
+
+    القيم الجديدة فعلاً (أغلب المدخلات) يرفضها المرشح فوراً فتُقبل دون أي
+    استعلام. فقط عندما يقول المرشح "ربما موجودة" يُسأل الفهرس الفريد، والفهرس
+    نفسه هو الضمان الأخير عند الإدراج. قبل اكتمال التحميل يُسأل الفهرس دائماً.
+    """
+
+    def __init__(self, capacity: int = DEDUP_CAPACITY, fp_rate: float = DEDUP_FP_RATE,
+                 refresh_interval: float = DEDUP_REFRESH_INTERVAL):
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.refresh_interval = refresh_interval
+        self.phones = BloomFilter(capacity, fp_rate)
+        self.emails = BloomFilter(capacity, fp_rate)
+        self.loaded = False
+        self._since = None
+        self._task = None
+
+    # ==============================
+    # ✍️ الإضافة والتحميل
+    # ==============================
+    def add(self, phone_number: str = None, email: str = None):
+        """إضافة قيم تسجيل جديد إلى المرشحين"""
+        if phone_number:
+            self.phones.add(phone_number)
+        if email:
+            self.emails.add(normalize_email(email))
+
+    def _consume(self, rows):
+        for phone_number, email in rows:
+            self.add(phone_number, email)
+
+    async def load(self):
+        """بناء المرشحين من جدول المستخدمين على دفعات"""
+        self._since, rows = await repository.scan_contacts(self._consume, chunk_size=DEDUP_LOAD_CHUNK)
+        self.loaded = True
+        for name, bloom in (('الهواتف', self.phones), ('البُرد', self.emails)):
+            stats = bloom.stats()
+            logger.info(
+                "🧮 مرشح %s: %s قيمة، %.0fKB، %s دوال تجزئة، نسبة الخطأ المتوقعة %.5f",
+                name, stats['items'], stats['bytes'] / 1024, stats['hashes'], stats['estimated_fp_rate']
+            )
+            if stats['items'] > stats['capacity']:
+                logger.warning("⚠️ مرشح %s تجاوز سعته (%s)، ارفع DEDUP_CAPACITY", name, stats['capacity'])
+        return rows
+
+    async def refresh(self) -> int:
+        """إضافة ما سجلته العمليات الأخرى منذ آخر تحميل"""
+        self._since, rows = await repository.scan_contacts(self._consume, self._since, DEDUP_LOAD_CHUNK)
+        return rows
+
+    async def _run(self):
+        try:
+            await self.load()
+        except Exception as e:
+            logger.error("❌ خطأ في بناء مرشح التكرار: %s", e)
+            return
+        while self.refresh_interval > 0:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning("⚠️ خطأ في تحديث مرشح التكرار: %s", e)
+
+    def start(self):
+        """التحميل في الخلفية (الفحوص تسأل قاعدة البيانات حتى يكتمل)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    # ==============================
+    # 🔍 الفحص
+    # ==============================
+    async def _taken(self, field: str, bloom: BloomFilter, value: str, lookup) -> bool:
+        if self.loaded and value not in bloom:
+            DEDUP_CHECKS.labels(field, 'filter_miss').inc()
+            return False
+        try:
+            taken = await lookup(value)
+        except DatabaseUnavailable:
+            # لا نوقف التسجيل: الفهرس الفريد يمنع التكرار عند الإدراج أو إعادة الإدخال
+            DEDUP_CHECKS.labels(field, 'db_unavailable').inc()
+            return False
+        if taken:
+            result = 'duplicate'
+        else:
+            result = 'false_positive' if self.loaded else 'not_loaded'
+        DEDUP_CHECKS.labels(field, result).inc()
+        return taken
+
+    async def phone_taken(self, phone_number: str) -> bool:
+        """هل رقم الهاتف (بصيغة E.164) مسجل لمستخدم آخر؟"""
+        return await self._taken('phone', self.phones, phone_number, repository.phone_registered)
+
+    async def email_taken(self, email: str) -> bool:
+        """هل البريد الإلكتروني مسجل لمستخدم آخر؟"""
+        return await self._taken('email', self.emails, normalize_email(email), repository.email_registered)
+
+    def stats(self) -> dict:
+        return {'phone': self.phones.stats(), 'email': self.emails.stats(), 'loaded': self.loaded}
+
+
+contact_registry = ContactRegistry()
@@ -0,0 +1,159 @@
+# ==============================
+# 📝 تسجيل غير حاجب: طابور في حلقة الأحداث وخيط كتابة منفصل
+# ==============================
+
+import os
+import sys
+import json
+import queue
+import atexit
+import random
+import logging
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# ==============================
+# 🔧 الإعدادات
+# ==============================
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# text (السطر المعتاد) أو json (سطر JSON لكل سجل مع حقول السياق)
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'text').lower()
+# أقصى عدد سجلات تنتظر الكتابة؛ عند امتلائه تُسقط السجلات بدلاً من حجب الحلقة
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', '10000'))
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+# حقول السياق التي تُمرر عبر extra وتظهر في سطر JSON
+CONTEXT_FIELDS = ('event', 'user_id', 'handler', 'state', 'duration_ms')
+
+
+def parse_sample_rates(spec: str) -> dict:
+    """تحويل نص مثل "update:0.01,httpx:0.1" إلى {الحدث أو اسم المسجل: نسبة الإبقاء}"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, rate = item.split(':')
+        rates[name] = float(rate)
+    return rates
+
+
+# سجل كل تحديث وسجل httpx لكل طلب Bot API هما الأعلى حجماً، فيُبقى 1٪ منهما افتراضياً
+LOG_SAMPLE_RATES = {'update': 0.01, 'httpx': 0.01, **parse_sample_rates(os.environ.get('LOG_SAMPLE_RATES', ''))}
+
+_sample_rates = LOG_SAMPLE_RATES
+# عدادات السجلات التي لم تُكتب (تُصدّر عبر register_log_gauges)
+_dropped = {'sampled': 0, 'queue_full': 0}
+
+
+# ==============================
+# 🧾 التنسيق
+# ==============================
+class JsonFormatter(logging.Formatter):
+    """سطر JSON لكل سجل: الوقت والمستوى والرسالة وحقول السياق الموجودة"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+# ==============================
+# 🎲 أخذ العينات والطابور
+# ==============================
+def keep_event(event: str) -> bool:
+    """قرار العينة قبل إنشاء السجل، فالحدث المُسقط لا يكلف حتى LogRecord"""
+    rate = _sample_rates.get(event)
+    if rate is None or rate >= 1 or random.random() < rate:
+        return True
+    _dropped['sampled'] += 1
+    return False
+
+
+class SamplingFilter(logging.Filter):
+    """إبقاء نسبة من السجلات كثيرة التكرار حسب حقل event أو اسم المسجل
+
+    التحذيرات والأخطاء لا تُسقط أبداً، ولا السجلات التي مرت بـ keep_event مسبقاً
+    (extra={'sampled': True}). الفلتر يعمل قبل دخول الطابور، فالسجل المُسقط لا
+    يكلف تنسيقاً ولا مكاناً في الطابور.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or getattr(record, 'sampled', False):
+            return True
+        event = getattr(record, 'event', None)
+        return keep_event(event if event in _sample_rates else record.name)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler لا يحجب ولا ينسق في خيط المستدعي
+
+    QueueHandler الأصلي ينسق الرسالة قبل وضعها في الطابور؛ هنا يُمرر السجل كما
+    هو فيجري دمج المعاملات (%s) في خيط المستمع، لذا تُمرر قيم لا تتغير بعد
+    الاستدعاء. عند امتلاء الطابور يُسقط السجل ويُعد بدلاً من الانتظار.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _dropped['queue_full'] += 1
+
+
+class DrainingQueueListener(QueueListener):
+    """إشارة الإيقاف تنتظر مكاناً في الطابور الممتلئ حتى تُكتب السجلات السابقة كلها"""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+# ==============================
+# 🚀 التهيئة والإيقاف
+# ==============================
+_listener = None
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, stream=None,
+                      sample_rates: dict = None) -> QueueListener:
+    """استبدال معالجات الجذر بطابور، والكتابة الفعلية في خيط QueueListener"""
+    global _listener, _sample_rates
+    stop_logging()
+    _sample_rates = LOG_SAMPLE_RATES if sample_rates is None else sample_rates
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT))
+    log_queue = queue.Queue(max(0, LOG_QUEUE_SIZE))
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+    _listener = DrainingQueueListener(log_queue, handler)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """كتابة ما تبقى في الطابور وإيقاف خيط المستمع"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def log_stats() -> dict:
+    """السجلات المُسقطة حسب السبب وعدد السجلات المنتظرة للكتابة"""
+    return {**_dropped, 'queued': _listener.queue.qsize() if _listener is not None else 0}
+
+
+atexit.register(stop_logging)
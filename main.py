@@ -5,24 +5,49 @@
 # ==============================
 
 import os
+import sys
 import logging
 import re
-import phonenumbers
+import asyncio
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton
-from telegram.ext import Application, CommandHandler, MessageHandler, filters, ConversationHandler, CallbackContext, CallbackQueryHandler
+from functools import partial
+from telegram import Update
+from telegram.ext import Application, CommandHandler, MessageHandler, filters, ConversationHandler, CallbackContext, TypeHandler, ApplicationHandlerStop
 import psycopg2
-from psycopg2.extras import RealDictCursor
-import random
-import string
+from database import init_pool, close_pool, DatabaseUnavailable, DuplicateRecord
+from storage import repository, STORAGE_BACKEND
+from migrations import apply_migrations
+from cache import registration_cache
+from rendering import (
+    COMMANDS_TEXT, SUPPORT_TEXT, GENDER_KEYBOARD, country_keyboard, render_summary, get_user_texts, invalidate_user
+)
+from phone_validation import PhoneValidator
+from referrals import referral_aggregator, resolve_referral_code, leaderboard_text
+from stats import registration_stats
+from dedup import contact_registry
+from registration_writer import registration_writer
+from broadcast import BroadcastEngine
+from ratelimit import UserRateLimiter, parse_budgets
+from spool import RegistrationSpool
+from persistence import StoragePersistence
+from referral_codes import encode_referral_code, MAX_USER_ID
+from scheduler import UserOrderedUpdateProcessor, MAX_CONCURRENT_UPDATES, shard_for
+from logging_setup import configure_logging, log_stats
+from transport import build_request
+from metrics import (
+    instrument_handler, PHONE_VALIDATION_SECONDS, FLOOD_REJECTED, UPDATES_SHED,
+    register_pool_gauges, register_processor_gauges, register_dedup_gauges, register_log_gauges,
+    start_metrics_server, METRICS_PORT, StartupTimer
+)
 
 # ==============================
 # 🔧 إعدادات التسجيل
 # ==============================
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# الكتابة الفعلية في خيط منفصل حتى لا يضيف بطء stderr إلى زمن الرد (LOG_FORMAT=json لأسطر JSON)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # ==============================
@@ -69,7 +94,7 @@ def create_connection():
         )
         return conn
     except Exception as e:
-        logger.error(f"❌ خطأ في الاتصال بقاعدة البيانات: {e}")
+        logger.error("❌ خطأ في الاتصال بقاعدة البيانات: %s", e)
         return None
 
 # ==============================
@@ -77,6 +102,64 @@ def create_connection():
 # ==============================
 BOT_TOKEN = os.environ.get('BOT_TOKEN', '8415474087:AAEDtwjvgogXfvpMzARe875svIEkSSDdNXk')
 OWNER_USER_ID = 5425405664
+# ميزانيات الطلبات لكل مستخدم: الأمر -> (رموز/ثانية، السعة القصوى)
+FLOOD_BUDGETS = {
+    'start': (0.2, 3), 'profile': (0.1, 3), 'invite': (0.1, 3), 'support': (0.1, 3),
+    'network': (0.1, 3), 'leaderboard': (0.1, 3),
+    'message': (2, 10),
+    **parse_budgets(os.environ.get('FLOOD_BUDGETS', ''))
+}
+FLOOD_DEFAULT_BUDGET = (0.5, 5)
+# عند تجاوز عدد التحديثات المنتظرة هذا الحد يُرد برسالة "مشغول" دون أي عمل على قاعدة البيانات
+SHED_QUEUE_THRESHOLD = int(os.environ.get('SHED_QUEUE_THRESHOLD', '500'))
+BUSY_TEXT = "⏳ البوت مشغول حالياً، الرجاء المحاولة بعد قليل"
+# عدد مستويات الشبكة المعروضة في /network (لا يتجاوز REFERRAL_MAX_DEPTH)
+NETWORK_LEVELS = min(int(os.environ.get('NETWORK_LEVELS', '3')), repository.REFERRAL_MAX_DEPTH)
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '5000'))
+EXPORT_MAX_BYTES = 50 * 1024 * 1024  # حد رفع الملفات في Bot API
+# وضع التشغيل: polling (افتراضي) أو webhook أو cluster (عملية أمامية + عمال worker)
+BOT_MODE = os.environ.get('BOT_MODE', 'polling').lower()
+# في وضع العنقود: رقم هذا العامل وعدد العمال (يعينهما cluster.py)
+WORKER_INDEX = int(os.environ.get('WORKER_INDEX', '0'))
+CLUSTER_WORKERS = int(os.environ.get('CLUSTER_WORKERS', '1'))
+# البث الجماعي يعمل في عامل المالك فقط حتى لا يتكرر الإرسال
+IS_OWNER_SHARD = shard_for(OWNER_USER_ID, CLUSTER_WORKERS) == WORKER_INDEX
+
+flood_limiter = UserRateLimiter(FLOOD_BUDGETS, FLOOD_DEFAULT_BUDGET)
+startup_timer = StartupTimer()
+_warmup_futures = []
+
+def _credit_replayed(records):
+    """احتساب إحالات وإحصائيات التسجيلات التي أُعيد إدخالها من الملف الاحتياطي"""
+    for record in records:
+        invalidate_user(record['user_id'])
+        registration_stats.record(record)
+        if record.get('invited_by'):
+            referral_aggregator.link(record['user_id'], record['invited_by'])
+
+async def _notify_dropped(bot, records):
+    """إبلاغ أصحاب التسجيلات المحفوظة المرفوضة عند إعادة الإدخال، والمالك بقائمتهم"""
+    for record in records:
+        registration_cache.invalidate(record['user_id'])
+        invalidate_user(record['user_id'])
+        try:
+            await bot.send_message(
+                record['user_id'],
+                "⚠️ تعذر إكمال تسجيلك: رقم الهاتف أو البريد الإلكتروني مسجل لحساب آخر.\n\n"
+                "🔄 الرجاء التسجيل من جديد باستخدام /start"
+            )
+        except Exception as e:
+            logger.error("❌ تعذر إبلاغ المستخدم %s برفض تسجيله: %s", record['user_id'], e)
+    try:
+        await bot.send_message(
+            OWNER_USER_ID,
+            f"⚠️ {len(records)} تسجيل محفوظ لم يُدخل بسبب هاتف أو بريد مكرر: "
+            + ', '.join(str(record['user_id']) for record in records)
+        )
+    except Exception as e:
+        logger.error("❌ تعذر إبلاغ المالك بالتسجيلات المرفوضة: %s", e)
+
+registration_spool = RegistrationSpool(on_replayed=_credit_replayed)
 
 # ==============================
 # 🎯 تعريف مراحل المحادثة
@@ -91,91 +174,46 @@ COUNTRIES = {
     "الإمارات": "+971", "الكويت": "+965", "قطر": "+974", "عمان": "+968"
 }
 
+GENDERS = ('ذكر', 'أنثى')
+# الاسم الثلاثي: ثلاث كلمات على الأقل، ولا يتجاوز 50 حرفاً
+FULL_NAME_MIN_PARTS = 3
+FULL_NAME_MAX_LENGTH = 50
+# عمود email في user_profiles من نوع VARCHAR(255)
+EMAIL_MAX_LENGTH = 255
+
+# لا تُحمَّل بيانات الهواتف إلا لدول هذه القائمة
+phone_validator = PhoneValidator(COUNTRIES.values())
+COUNTRY_KEYBOARD = country_keyboard(COUNTRIES)
+
 # ==============================
 # 🗃️ دوال قاعدة البيانات
 # ==============================
-def setup_database():
-    """إنشاء الجداول المطلوبة في قاعدة البيانات"""
+def setup_database(conn):
+    """تطبيق ترحيلات المخطط الناقصة على اتصال الإقلاع"""
     try:
-        conn = create_connection()
-        if not conn:
-            return False
-            
-        cursor = conn.cursor()
-        
-        # جدول المستخدمين
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_profiles (
-                user_id BIGINT PRIMARY KEY,
-                telegram_username VARCHAR(100),
-                email VARCHAR(255),
-                referral_code VARCHAR(20) UNIQUE,
-                invited_by VARCHAR(20),
-                full_name VARCHAR(200),
-                country VARCHAR(100),
-                gender VARCHAR(10),
-                birth_year INTEGER,
-                phone_number VARCHAR(20),
-                registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                total_referrals INTEGER DEFAULT 0,
-                status VARCHAR(20) DEFAULT 'active'
-            )
-        ''')
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        logger.info("✅ تم إعداد قاعدة البيانات بنجاح!")
+        applied = apply_migrations(conn)
+        if applied:
+            logger.info("✅ تم إعداد قاعدة البيانات بنجاح! (ترحيلات مطبقة: %s)", applied)
+        else:
+            logger.info("✅ مخطط قاعدة البيانات محدث")
         return True
         
     except Exception as e:
-        logger.error(f"❌ خطأ في إعداد قاعدة البيانات: {e}")
-        return False
-
-def generate_referral_code():
-    """إنشاء كود إحالة فريد"""
-    while True:
-        code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
-        if check_referral_code_unique(code):
-            return code
-
-def check_referral_code_unique(code):
-    """التحقق من أن كود الإحالة فريد"""
-    try:
-        conn = create_connection()
-        if not conn:
-            return False
-            
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM user_profiles WHERE referral_code = %s", (code,))
-        count = cursor.fetchone()[0]
-        
-        cursor.close()
-        conn.close()
-        return count == 0
-        
-    except Exception as e:
-        logger.error(f"❌ خطأ في التحقق من كود الإحالة: {e}")
+        logger.error("❌ خطأ في إعداد قاعدة البيانات: %s", e)
         return False
 
 async def check_user_registration(user_id: int) -> bool:
     """التحقق من تسجيل المستخدم مسبقاً"""
+    cached = registration_cache.get(user_id)
+    if cached is not None:
+        return cached
+    
     try:
-        conn = create_connection()
-        if not conn:
-            return False
-            
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM user_profiles WHERE user_id = %s", (user_id,))
-        count = cursor.fetchone()[0]
-        
-        cursor.close()
-        conn.close()
-        return count > 0
-        
+        registered = await repository.is_user_registered(user_id)
+        registration_cache.set(user_id, registered)
+        return registered
     except Exception as e:
-        logger.error(f"❌ خطأ في التحقق من تسجيل المستخدم: {e}")
+        logger.error("❌ خطأ في التحقق من تسجيل المستخدم: %s", e)
         return False
 
 # ==============================
@@ -183,25 +221,12 @@ async def check_user_registration(user_id: int) -> bool:
 # ==============================
 def validate_phone_with_country(phone_number, country_code):
     """التحقق من رقم الهاتف مع رمز الدولة"""
-    try:
-        phone_number = re.sub(r'[\s\-\(\)]', '', phone_number)
-        
-        if not phone_number.startswith('+'):
-            phone_number = country_code + phone_number
-        
-        parsed_number = phonenumbers.parse(phone_number, None)
-        
-        if phonenumbers.is_valid_number(parsed_number):
-            formatted_number = phonenumbers.format_number(parsed_number, phonenumbers.PhoneNumberFormat.E164)
-            return True, formatted_number, "✅ رقم الهاتف صحيح"
-        else:
-            return False, phone_number, "❌ رقم الهاتف غير صحيح"
-            
-    except Exception as e:
-        return False, phone_number, f"❌ رقم الهاتف غير صحيح: {str(e)}"
+    return phone_validator.validate(phone_number, country_code)
 
 def validate_email(email: str) -> bool:
     """التحقق من صحة البريد الإلكتروني"""
+    if len(email) > EMAIL_MAX_LENGTH:
+        return False
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return re.match(pattern, email) is not None
 
@@ -216,14 +241,78 @@ def validate_birth_year(year):
     except:
         return False, None
 
+def validate_registrations(rows: list) -> list:
+    """التحقق من دفعة صفوف مستوردة بنفس قواعد خطوات المحادثة
+
+    يعيد لكل صف (السجل الجاهز للإدراج، None) أو (None، سبب الرفض). التحقق على
+    مرحلتين: الحقول الرخيصة لكل الصفوف، ثم هواتف الصفوف المقبولة فقط بأمر
+    validate_batch واحد (تحليل phonenumbers هو معظم الكلفة). تكرار الهاتف والبريد
+    وصحة كود الدعوة تُفحص لاحقاً على مستوى الدفعة في bulk_import.
+    """
+    results = []
+    for row in rows:
+        try:
+            user_id = int(row.get('user_id') or 0)
+        except (TypeError, ValueError):
+            user_id = 0
+        full_name = str(row.get('full_name') or '').strip()
+        country = str(row.get('country') or '').strip()
+        gender = str(row.get('gender') or '').strip()
+        email = str(row.get('email') or '').strip()
+
+        # المعرّف خارج مجال encode_referral_code يُفشل الدفعة كلها عند الكتابة
+        if not 0 < user_id <= MAX_USER_ID:
+            results.append((None, 'invalid_user_id'))
+            continue
+        if len(full_name.split()) < FULL_NAME_MIN_PARTS or len(full_name) > FULL_NAME_MAX_LENGTH:
+            results.append((None, 'invalid_full_name'))
+            continue
+        if country not in COUNTRIES:
+            results.append((None, 'invalid_country'))
+            continue
+        if gender not in GENDERS:
+            results.append((None, 'invalid_gender'))
+            continue
+        valid_year, birth_year = validate_birth_year(row.get('birth_year'))
+        if not valid_year:
+            results.append((None, 'invalid_birth_year'))
+            continue
+        if not validate_email(email):
+            results.append((None, 'invalid_email'))
+            continue
+
+        results.append(({
+            'user_id': user_id,
+            'telegram_username': row.get('telegram_username') or None,
+            'full_name': full_name,
+            'country': country,
+            'gender': gender,
+            'birth_year': birth_year,
+            'phone_number': str(row.get('phone_number') or ''),
+            'email': email,
+            'invited_by': str(row.get('invited_by') or '').strip() or None,
+        }, None))
+
+    accepted = [(index, record) for index, (record, _) in enumerate(results) if record is not None]
+    phones = phone_validator.validate_batch(
+        (record['phone_number'], COUNTRIES[record['country']]) for _, record in accepted
+    )
+    for (index, record), (valid_phone, phone_number, _) in zip(accepted, phones):
+        if valid_phone:
+            record['phone_number'] = phone_number
+        else:
+            results[index] = (None, 'invalid_phone')
+    return results
+
 # ==============================
 # 🚀 دوال المحادثة الرئيسية
 # ==============================
+@instrument_handler
 async def start(update: Update, context: CallbackContext) -> int:
     """بدء عملية التسجيل - نسخة مبسطة"""
     user = update.message.from_user
     
-    logger.info(f"محاولة دخول من: {user.id} - {user.first_name}")
+    logger.info("محاولة دخول من: %s - %s", user.id, user.first_name, extra={'event': 'start', 'user_id': user.id})
     
     # التحقق من التسجيل المسبق
     if await check_user_registration(user.id):
@@ -231,9 +320,7 @@ async def start(update: Update, context: CallbackContext) -> int:
             f"🎉 **مرحباً بعودتك {user.first_name}!**\n\n"
             "✅ **أنت مسجل مسبقاً في النظام**\n\n"
             "🔧 **الأوامر المتاحة:**\n"
-            "/profile - عرض ملفك الشخصي\n"
-            "/invite - عرض كود الدعوة\n"
-            "/support - الدعم الفني"
+            f"{COMMANDS_TEXT}"
         )
         return ConversationHandler.END
     
@@ -242,29 +329,39 @@ async def start(update: Update, context: CallbackContext) -> int:
     context.user_data['telegram_username'] = user.username
     context.user_data['user_id'] = user.id
     
+    # كود الدعوة من الرابط t.me/<bot>?start=CODE
+    invite_line = ""
+    if context.args:
+        invited_by = await resolve_referral_code(context.args[0], check_user_registration)
+        if invited_by:
+            context.user_data['invited_by'] = invited_by
+            invite_line = f"🤝 تمت دعوتك بالكود: {invited_by}\n\n"
+    
     await update.message.reply_text(
         f"🆕 **مرحباً {user.first_name}!** 👋\n\n"
         "🏢 **أهلاً بك في نظام التسجيل**\n\n"
+        f"{invite_line}"
         "🆔 **الآن، ما هو اسمك الثلاثي الكامل؟**\n"
         "(مثال: أحمد محمد علي)"
     )
     return FULL_NAME
 
+@instrument_handler
 async def get_full_name(update: Update, context: CallbackContext) -> int:
     """استقبال الاسم الثلاثي الكامل من المستخدم"""
     full_name = update.message.text.strip()
 
     name_parts = full_name.split()
-    if len(name_parts) < 3:
+    if len(name_parts) < FULL_NAME_MIN_PARTS:
         await update.message.reply_text(
             "❌ الرجاء إدخال الاسم الثلاثي الكامل (الاسم الأول + الأب + الكنية)\n"
             "(مثال: أحمد محمد علي)"
         )
         return FULL_NAME
 
-    if len(full_name) > 50:
+    if len(full_name) > FULL_NAME_MAX_LENGTH:
         await update.message.reply_text(
-            "❌ الاسم طويل جداً! الحد الأقصى هو 50 حرف\n\n"
+            f"❌ الاسم طويل جداً! الحد الأقصى هو {FULL_NAME_MAX_LENGTH} حرف\n\n"
             f"📏 عدد أحرف الاسم الذي أدخلته: {len(full_name)}\n"
             "✂️ الرجاء اختصار الاسم وإعادة إدخاله"
         )
@@ -272,16 +369,14 @@ async def get_full_name(update: Update, context: CallbackContext) -> int:
     
     context.user_data['full_name'] = full_name
     
-    country_buttons = [list(COUNTRIES.keys())[i:i+2] for i in range(0, len(COUNTRIES), 2)]
-    reply_markup = ReplyKeyboardMarkup(country_buttons, one_time_keyboard=True)
-    
     await update.message.reply_text(
         f"✅ تم حفظ الاسم: {full_name}\n\n"
         "🌍 **الآن، اختر بلدك من القائمة:**",
-        reply_markup=reply_markup
+        reply_markup=COUNTRY_KEYBOARD
     )
     return COUNTRY
 
+@instrument_handler
 async def get_country(update: Update, context: CallbackContext) -> int:
     """استقبال البلد المختار من المستخدم"""
     country = update.message.text
@@ -293,20 +388,18 @@ async def get_country(update: Update, context: CallbackContext) -> int:
     context.user_data['country'] = country
     context.user_data['country_code'] = COUNTRIES[country]
     
-    gender_keyboard = [['ذكر', 'أنثى']]
-    reply_markup = ReplyKeyboardMarkup(gender_keyboard, one_time_keyboard=True)
-    
     await update.message.reply_text(
         f"🌍 تم اختيار البلد: {country}\n\n"
         "🚻 **الآن، اختر جنسك:**",
-        reply_markup=reply_markup
+        reply_markup=GENDER_KEYBOARD
     )
     return GENDER
 
+@instrument_handler
 async def get_gender(update: Update, context: CallbackContext) -> int:
     """استقبال الجنس المختار من المستخدم"""
     gender = update.message.text
-    if gender not in ['ذكر', 'أنثى']:
+    if gender not in GENDERS:
         await update.message.reply_text("❌ الرجاء اختيار 'ذكر' أو 'أنثى'.")
         return GENDER
     
@@ -319,6 +412,7 @@ async def get_gender(update: Update, context: CallbackContext) -> int:
     )
     return BIRTH_YEAR
 
+@instrument_handler
 async def get_birth_year(update: Update, context: CallbackContext) -> int:
     """استقبال عام الولادة من المستخدم"""
     year = update.message.text
@@ -342,12 +436,14 @@ async def get_birth_year(update: Update, context: CallbackContext) -> int:
     )
     return PHONE
 
+@instrument_handler
 async def get_phone(update: Update, context: CallbackContext) -> int:
     """استقبال رقم الهاتف من المستخدم"""
     phone_input = update.message.text
     country_code = context.user_data.get('country_code', '+966')
     
-    is_valid, formatted_phone, message = validate_phone_with_country(phone_input, country_code)
+    with PHONE_VALIDATION_SECONDS.time():
+        is_valid, formatted_phone, message = validate_phone_with_country(phone_input, country_code)
     
     if not is_valid:
         await update.message.reply_text(
@@ -357,6 +453,13 @@ async def get_phone(update: Update, context: CallbackContext) -> int:
         )
         return PHONE
     
+    if await contact_registry.phone_taken(formatted_phone):
+        await update.message.reply_text(
+            "❌ رقم الهاتف هذا مسجل مسبقاً لحساب آخر!\n\n"
+            "📞 الرجاء إدخال رقم هاتف آخر:"
+        )
+        return PHONE
+    
     context.user_data['phone_number'] = formatted_phone
     
     await update.message.reply_text(
@@ -366,6 +469,7 @@ async def get_phone(update: Update, context: CallbackContext) -> int:
     )
     return EMAIL
 
+@instrument_handler
 async def get_email(update: Update, context: CallbackContext) -> int:
     """استقبال البريد الإلكتروني من المستخدم"""
     email = update.message.text.strip()
@@ -378,10 +482,30 @@ async def get_email(update: Update, context: CallbackContext) -> int:
         )
         return EMAIL
     
+    if await contact_registry.email_taken(email):
+        await update.message.reply_text(
+            "❌ هذا البريد الإلكتروني مسجل مسبقاً لحساب آخر!\n\n"
+            "📧 الرجاء إدخال بريد إلكتروني آخر:"
+        )
+        return EMAIL
+    
     context.user_data['email'] = email
     
     # حفظ البيانات في قاعدة البيانات
-    await save_user_data(update.effective_user.id, context.user_data)
+    if not await save_user_data(update.effective_user.id, context.user_data):
+        # سجل مستخدم آخر نفس القيمة بعد الفحص: العودة إلى الخطوة المعنية
+        duplicate = context.user_data.pop('duplicate', None)
+        if duplicate == 'phone_number':
+            await update.message.reply_text("❌ رقم الهاتف هذا مسجل مسبقاً لحساب آخر!\n\n📞 الرجاء إدخال رقم هاتف آخر:")
+            return PHONE
+        if duplicate == 'email':
+            await update.message.reply_text("❌ هذا البريد الإلكتروني مسجل مسبقاً لحساب آخر!\n\n📧 الرجاء إدخال بريد إلكتروني آخر:")
+            return EMAIL
+        await update.message.reply_text(
+            "❌ حدث خطأ في حفظ بياناتك، لم يكتمل التسجيل\n\n"
+            "🔄 الرجاء المحاولة لاحقاً باستخدام /start"
+        )
+        return ConversationHandler.END
     
     # عرض الملخص النهائي
     return await show_final_summary(update, context)
@@ -389,184 +513,235 @@ async def get_email(update: Update, context: CallbackContext) -> int:
 async def save_user_data(user_id: int, user_data: dict):
     """حفظ بيانات المستخدم في قاعدة البيانات"""
     try:
-        conn = create_connection()
-        if not conn:
-            return False
-            
-        cursor = conn.cursor()
-        
-        # إنشاء كود إحالة فريد
-        referral_code = generate_referral_code()
+        # يُكتب مع التسجيلات المكتملة في نفس اللحظة بمعاملة واحدة
+        referral_code = await registration_writer.insert(user_id, user_data)
         
-        cursor.execute('''
-            INSERT INTO user_profiles 
-            (user_id, telegram_username, email, referral_code, full_name, country, gender, birth_year, phone_number)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ''', (
-            user_id,
-            user_data.get('telegram_username'),
-            user_data.get('email'),
-            referral_code,
-            user_data.get('full_name'),
-            user_data.get('country'),
-            user_data.get('gender'),
-            user_data.get('birth_year'),
-            user_data.get('phone_number')
-        ))
+        user_data['referral_code'] = referral_code
+        registration_cache.set(user_id, True)
+        invalidate_user(user_id)
+        contact_registry.add(user_data.get('phone_number'), user_data.get('email'))
+        registration_stats.record(user_data)
+        if user_data.get('invited_by'):
+            referral_aggregator.link(user_id, user_data['invited_by'])
+        logger.info("✅ تم حفظ بيانات المستخدم %s بنجاح", user_id, extra={'event': 'registered', 'user_id': user_id})
+        return True
         
-        conn.commit()
-        cursor.close()
-        conn.close()
+    except DatabaseUnavailable as e:
+        # قاعدة البيانات متوقفة: حفظ التسجيل في الملف الاحتياطي ليُدخل لاحقاً
+        try:
+            user_data['referral_code'] = encode_referral_code(user_id)
+            await registration_spool.append(user_id, user_data)
+        except Exception as spool_error:
+            logger.error("❌ خطأ في حفظ البيانات: %s / الملف الاحتياطي: %s", e, spool_error)
+            return False
         
-        user_data['referral_code'] = referral_code
-        logger.info(f"✅ تم حفظ بيانات المستخدم {user_id} بنجاح")
+        user_data['spooled'] = True
+        registration_cache.set(user_id, True)
+        contact_registry.add(user_data.get('phone_number'), user_data.get('email'))
+        logger.warning("📼 قاعدة البيانات غير متاحة، تم حفظ تسجيل %s في الملف الاحتياطي", user_id)
         return True
         
+    except DuplicateRecord as e:
+        constraint = e.constraint
+        if 'phone' in constraint:
+            user_data['duplicate'] = 'phone_number'
+        elif 'email' in constraint:
+            user_data['duplicate'] = 'email'
+        logger.warning("⚠️ تسجيل مكرر للمستخدم %s: %s", user_id, constraint)
+        return False
+        
     except Exception as e:
-        logger.error(f"❌ خطأ في حفظ البيانات: {e}")
+        logger.error("❌ خطأ في حفظ البيانات: %s", e)
         return False
 
 async def show_final_summary(update: Update, context: CallbackContext) -> int:
     """عرض الملخص النهائي بعد اكتمال التسجيل"""
-    user_data = context.user_data
-    referral_code = user_data.get('referral_code', 'غير متوفر')
-    
-    summary = f"""
-🎉 **تم تسجيل بياناتك بنجاح!** ✅
-
-📋 **البيانات المسجلة:**
-👤 الاسم: {user_data.get('full_name')}
-🚻 الجنس: {user_data.get('gender')}
-🌍 البلد: {user_data.get('country')}
-🎂 سنة الولادة: {user_data.get('birth_year')}
-📞 الهاتف: {user_data.get('phone_number')}
-📧 البريد الإلكتروني: {user_data.get('email')}
-
-📢 **كود دعوتك الشخصي:** `{referral_code}`
-👥 شارك هذا الكود مع أصدقائك!
-
-💡 **الأوامر المتاحة:**
-/profile - عرض ملفك الشخصي  
-/invite - عرض كود الدعوة والإحصائيات
-/support - التواصل مع الدعم الفني
-"""
-
+    summary = render_summary(context.user_data)
     await update.message.reply_text(summary, parse_mode='Markdown')
     return ConversationHandler.END
 
 # ==============================
 # 🔧 الأوامر الإضافية
 # ==============================
+@instrument_handler
 async def show_profile(update: Update, context: CallbackContext):
     """عرض الملف الشخصي للمستخدم"""
     try:
         user_id = update.effective_user.id
-        if not await check_user_registration(user_id):
+        if registration_cache.get(user_id) is False:
             await update.message.reply_text("❌ لم يتم العثور على ملفك الشخصي")
             return
         
-        conn = create_connection()
-        if not conn:
-            await update.message.reply_text("❌ خطأ في الاتصال بقاعدة البيانات")
-            return
-            
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT referral_code, full_name, country, gender, birth_year, phone_number, email, total_referrals, registration_date
-            FROM user_profiles WHERE user_id = %s
-        ''', (user_id,))
-        
-        profile = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        texts = await get_user_texts(user_id, context.bot.username)
+        if texts is not None:
+            # لا نكتب False: المسجل عبر الطابور الاحتياطي لم يصل للجدول بعد لكنه مسجل
+            registration_cache.set(user_id, True)
         
-        if not profile:
+        if not texts:
             await update.message.reply_text("❌ لم يتم العثور على ملفك الشخصي!")
             return
         
-        message = f"""
-📋 **ملفك الشخصي**
-
-👤 **المعلومات الشخصية:**
-🆔 كود الدعوة: `{profile[0]}`
-📛 الاسم: {profile[1]}
-🌍 البلد: {profile[2]}
-🚻 الجنس: {profile[3]}
-🎂 سنة الولادة: {profile[4]}
-📞 الهاتف: {profile[5]}
-📧 البريد الإلكتروني: {profile[6]}
-👥 عدد المُحالين: {profile[7]}
-📅 تاريخ التسجيل: {profile[8].strftime('%Y-%m-%d')}
-"""
-        
-        await update.message.reply_text(message, parse_mode='Markdown')
+        await update.message.reply_text(texts[0], parse_mode='Markdown')
         
     except Exception as e:
         await update.message.reply_text("❌ حدث خطأ في عرض الملف الشخصي")
-        logger.error(f"Error: {e}")
+        logger.error("Error: %s", e)
 
+@instrument_handler
 async def show_invite(update: Update, context: CallbackContext):
     """عرض كود الدعوة والإحصائيات"""
     try:
         user_id = update.effective_user.id
         
-        conn = create_connection()
-        if not conn:
-            await update.message.reply_text("❌ خطأ في الاتصال بقاعدة البيانات")
+        if registration_cache.get(user_id) is False:
+            await update.message.reply_text("❌ لم يتم العثور على بياناتك!")
             return
-            
-        cursor = conn.cursor()
-        cursor.execute('SELECT referral_code, total_referrals FROM user_profiles WHERE user_id = %s', (user_id,))
-        result = cursor.fetchone()
-        cursor.close()
-        conn.close()
         
-        if not result:
+        # اسم البوت محفوظ في context.bot منذ initialize() فلا حاجة لـ get_me()
+        texts = await get_user_texts(user_id, context.bot.username)
+        if texts is not None:
+            registration_cache.set(user_id, True)
+        
+        if not texts:
             await update.message.reply_text("❌ لم يتم العثور على بياناتك!")
             return
         
-        referral_code, total_referrals = result
+        await update.message.reply_text(texts[1], parse_mode='Markdown')
         
-        message = f"""
-📢 **نظام الدعوة والإحالة**
-
-🆔 **كود دعوتك الشخصي:** `{referral_code}`
-
-👥 **عدد الأشخاص الذين دعوتهم:** {total_referrals}
+    except Exception as e:
+        await update.message.reply_text("❌ حدث خطأ في عرض معلومات الدعوة")
+        logger.error("Error: %s", e)
 
-🔗 **كيفية استخدام كود الدعوة:**
-شارك هذا الرابط مع أصدقائك:
-https://t.me/{(await context.bot.get_me()).username}?start={referral_code}
-"""
+@instrument_handler
+async def network_command(update: Update, context: CallbackContext):
+    """عدد المُحالين في كل مستوى من شبكة المستخدم (استعلام واحد من referral_levels)"""
+    try:
+        user_id = update.effective_user.id
+        if not await check_user_registration(user_id):
+            await update.message.reply_text("❌ لم يتم العثور على بياناتك!")
+            return
         
-        await update.message.reply_text(message, parse_mode='Markdown')
+        counts = await repository.get_downline_counts(user_id, NETWORK_LEVELS)
+        lines = ["🌳 **شبكة الإحالة الخاصة بك**", ""]
+        for depth in range(1, NETWORK_LEVELS + 1):
+            lines.append(f"• المستوى {depth}: {counts.get(depth, 0)}")
+        lines.append("")
+        lines.append(f"👥 **إجمالي الشبكة:** {counts.get(0, 0)}")
+        await update.message.reply_text('\n'.join(lines), parse_mode='Markdown')
         
     except Exception as e:
-        await update.message.reply_text("❌ حدث خطأ في عرض معلومات الدعوة")
-        logger.error(f"Error: {e}")
+        await update.message.reply_text("❌ حدث خطأ في عرض شبكة الإحالة")
+        logger.error("Error: %s", e)
+
+@instrument_handler
+async def leaderboard_command(update: Update, context: CallbackContext):
+    """أعلى المُحيلين حسب حجم الشبكة"""
+    try:
+        await update.message.reply_text(await leaderboard_text(), parse_mode='Markdown')
+    except Exception as e:
+        await update.message.reply_text("❌ حدث خطأ في عرض لوحة المتصدرين")
+        logger.error("Error: %s", e)
 
+@instrument_handler
 async def support_command(update: Update, context: CallbackContext):
     """عرض معلومات الدعم الفني"""
-    support_text = """
-🆘 **الدعم الفني**
+    await update.message.reply_text(SUPPORT_TEXT)
 
-📞 للاستفسارات والمشاكل التقنية:
+@instrument_handler
+async def stats_command(update: Update, context: CallbackContext):
+    """إحصائيات التسجيل (للمالك فقط): تُقرأ من المجاميع في الذاكرة دون أي استعلام"""
+    if update.effective_user.id != OWNER_USER_ID:
+        return
+    
+    if not registration_stats.loaded:
+        await update.message.reply_text("⏳ الإحصائيات قيد التحميل، الرجاء المحاولة بعد قليل")
+        return
+    
+    await update.message.reply_text(registration_stats.render(), parse_mode='Markdown')
 
-💬 **طرق التواصل:**
-• عبر البوت: اكتب رسالتك وسيتم الرد عليك
-• البريد الإلكتروني: support@example.com
+@instrument_handler
+async def export_command(update: Update, context: CallbackContext):
+    """تصدير جدول المستخدمين كملف (للمالك فقط): /export [csv|ndjson]"""
+    if update.effective_user.id != OWNER_USER_ID:
+        return
+    
+    fmt = (context.args[0].lower() if context.args else 'csv')
+    if fmt not in ('csv', 'ndjson'):
+        await update.message.reply_text("❌ الصيغة غير مدعومة. استخدم: /export csv أو /export ndjson")
+        return
+    
+    suffix = '.csv' if fmt == 'csv' else '.ndjson.gz'
+    filename = f"user_profiles_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}"
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    os.close(fd)
+    
+    try:
+        await update.message.reply_text("⏳ جاري تصدير البيانات...")
+        rows = await repository.export_users(path, fmt, EXPORT_CHUNK_SIZE)
+        
+        size = os.path.getsize(path)
+        if size > EXPORT_MAX_BYTES:
+            await update.message.reply_text(
+                f"❌ حجم الملف ({size // (1024 * 1024)} MB) يتجاوز حد تلغرام، استخدم /export ndjson"
+            )
+            return
+        
+        with open(path, 'rb') as f:
+            await update.message.reply_document(
+                document=f,
+                filename=filename,
+                caption=f"📤 تم تصدير {rows} مستخدم"
+            )
+        logger.info("📤 تم تصدير %s مستخدم (%s بايت) بصيغة %s", rows, size, fmt)
+        
+    except Exception as e:
+        await update.message.reply_text("❌ حدث خطأ أثناء التصدير")
+        logger.error("❌ خطأ في التصدير: %s", e)
+    finally:
+        os.remove(path)
 
-⏰ **أوقات العمل:**
-• الأحد - الخميس: 9:00 ص - 5:00 م
+@instrument_handler
+async def broadcast_command(update: Update, context: CallbackContext):
+    """إرسال رسالة لجميع المستخدمين المسجلين (للمالك فقط): /broadcast <النص>"""
+    if update.effective_user.id != OWNER_USER_ID:
+        return
+    
+    engine = context.bot_data.get('broadcast_engine')
+    parts = update.message.text.split(maxsplit=1)
+    if len(parts) < 2:
+        active = ', '.join(f"#{job_id}" for job_id in engine.active_jobs) if engine else ''
+        await update.message.reply_text(
+            "📣 الاستخدام: /broadcast <نص الرسالة>\n"
+            "⛔ للإلغاء: /broadcast_cancel <رقم المهمة>\n\n"
+            f"🔄 المهام الجارية: {active or 'لا يوجد'}"
+        )
+        return
+    
+    try:
+        job_id = await engine.start_broadcast(parts[1], notify_chat_id=update.effective_chat.id)
+        await update.message.reply_text(f"🚀 بدأ البث #{job_id} في الخلفية، سيتم إعلامك عند الانتهاء")
+    except Exception as e:
+        await update.message.reply_text("❌ تعذر بدء البث")
+        logger.error("❌ خطأ في بدء البث: %s", e)
 
-🔧 **نحن هنا لمساعدتك في:**
-• مشاكل التسجيل
-• استفسارات حول المكافآت
-• أي استفسارات أخرى
-"""
+@instrument_handler
+async def broadcast_cancel_command(update: Update, context: CallbackContext):
+    """إلغاء مهمة بث جارية (للمالك فقط)"""
+    if update.effective_user.id != OWNER_USER_ID:
+        return
+    
+    engine = context.bot_data.get('broadcast_engine')
+    if not context.args or not context.args[0].lstrip('#').isdigit():
+        await update.message.reply_text("⛔ الاستخدام: /broadcast_cancel <رقم المهمة>")
+        return
     
-    await update.message.reply_text(support_text)
+    job_id = int(context.args[0].lstrip('#'))
+    if await engine.cancel(job_id):
+        await update.message.reply_text(f"⛔ تم إلغاء البث #{job_id}")
+    else:
+        await update.message.reply_text(f"❌ لا توجد مهمة بث جارية بالرقم #{job_id}")
 
+@instrument_handler
 async def cancel(update: Update, context: CallbackContext) -> int:
     """إلغاء عملية التسجيل"""
     await update.message.reply_text(
@@ -577,14 +752,14 @@ async def cancel(update: Update, context: CallbackContext) -> int:
     return ConversationHandler.END
 
 def test_database_connection():
-    """اختبار الاتصال بقاعدة البيانات"""
+    """اختبار الاتصال بقاعدة البيانات، ويعيد الاتصال المفتوح أو None"""
     print("🔍 اختبار الاتصال بقاعدة البيانات...")
     
     # التحقق من وجود متغير DATABASE_URL
     db_url = os.environ.get('DATABASE_URL')
     if not db_url:
         print("❌ لم يتم العثور على DATABASE_URL في متغيرات البيئة")
-        return False
+        return None
     
     print(f"✅ تم العثور على DATABASE_URL")
     print(f"📊 تفاصيل الاتصال: {db_url.split('@')[1] if '@' in db_url else 'مخفى'}")
@@ -592,43 +767,138 @@ def test_database_connection():
     try:
         conn = create_connection()
         if conn:
+            # يبقى الاتصال مفتوحاً ليُستخدم في إعداد المخطط
             print("✅ الاتصال بقاعدة البيانات ناجح!")
-            conn.close()
-            return True
+            return conn
         else:
             print("❌ فشل الاتصال بقاعدة البيانات")
-            return False
+            return None
     except Exception as e:
         print(f"❌ خطأ في الاتصال: {e}")
-        return False
+        return None
 
-# ==============================
-# 🎪 الدالة الرئيسية
-# ==============================
-def main():
-    """الدالة الرئيسية لتشغيل البوت"""
-    
-    print("🚀 بدء إعداد البوت للتجربة على Render...")
+def _timed_warmup(name: str, func):
+    """تشغيل مرحلة إحماء في خيط خلفي وتسجيل زمنها"""
+    with startup_timer.phase(name):
+        return func()
+
+def open_storage():
+    """فتح طبقة التخزين المختارة وتجهيز مخططها، ويعيد المجمع المشترك أو None"""
+    if STORAGE_BACKEND == 'sqlite':
+        # ملف محلي: لا اتصال شبكي ولا إعدادات PostgreSQL
+        from sqlite_database import init_sqlite_pool
+        try:
+            with startup_timer.phase('pool'):
+                return init_sqlite_pool()
+        except Exception as e:
+            print(f"❌ فشل فتح قاعدة SQLite: {e}")
+            return None
     
-    # اختبر الاتصال أولاً
-    if not test_database_connection():
+    # اتصال واحد لاختبار قاعدة البيانات وإعداد المخطط
+    with startup_timer.phase('db_connect'):
+        conn = test_database_connection()
+    if not conn:
         print("❌ لا يمكن تشغيل البوت بسبب مشكلة في قاعدة البيانات")
-        return  # ⬅️ أضف هذا السطر
+        return None
     
     # التحقق من إعدادات قاعدة البيانات
-    if not setup_database():
+    try:
+        with startup_timer.phase('schema'):
+            schema_ready = setup_database(conn)
+    finally:
+        conn.close()
+    if not schema_ready:
         print("❌ لا يمكن تشغيل البوت بسبب مشكلة في قاعدة البيانات")
-        return
+        return None
     
-    # التحقق من توكن البوت
-    if not BOT_TOKEN:
-        print("❌ لم يتم تعيين BOT_TOKEN")
+    # إنشاء مجمع الاتصالات المشترك مرة واحدة
+    try:
+        with startup_timer.phase('pool'):
+            return init_pool(get_database_config())
+    except Exception as e:
+        print(f"❌ فشل إنشاء مجمع الاتصالات: {e}")
+        return None
+
+def start_warmup(pool):
+    """بدء إحماء المجمع وبيانات أرقام الهواتف في الخلفية، بالتوازي مع get_me()"""
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='warmup')
+    _warmup_futures.extend([
+        executor.submit(_timed_warmup, 'pool_warm_up', pool.warm_up),
+        executor.submit(_timed_warmup, 'phone_metadata', phone_validator.preload),
+    ])
+    executor.shutdown(wait=False)
+
+async def on_startup(application: Application):
+    """تشغيل المهام الخلفية بعد تهيئة البوت"""
+    # initialize() استدعى get_me() بينما كان الإحماء يعمل في الخلفية
+    startup_timer.end('bot_initialize')
+    results = await asyncio.gather(
+        *(asyncio.wrap_future(future) for future in _warmup_futures), return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, Exception):
+            # الإحماء تحسين فقط: الاتصالات والبيانات تُحمّل عند أول استخدام
+            logger.warning("⚠️ فشل الإحماء: %s", result)
+    _warmup_futures.clear()
+    
+    with startup_timer.phase('background_tasks'):
+        referral_aggregator.start()
+        registration_spool.on_dropped = partial(_notify_dropped, application.bot)
+        registration_spool.start()
+        try:
+            await registration_stats.load()
+        except Exception as e:
+            logger.error("❌ خطأ في تحميل الإحصائيات: %s", e)
+        registration_stats.start()
+        contact_registry.start()
+        
+        # محرك البث يتنحى لصالح ردود المحادثات عند وجود طابور تحديثات
+        engine = BroadcastEngine(application.bot, application.update_processor)
+        application.bot_data['broadcast_engine'] = engine
+        if IS_OWNER_SHARD:
+            await engine.resume_pending(notify_chat_id=OWNER_USER_ID)
+    startup_timer.log()
+
+async def on_shutdown(application: Application):
+    """تحرير الموارد عند إيقاف البوت"""
+    engine = application.bot_data.get('broadcast_engine')
+    if engine:
+        await engine.stop()
+    
+    # كتابة التسجيلات والإحالات المعلقة قبل إغلاق المجمع
+    await registration_writer.stop()
+    await registration_spool.stop()
+    await referral_aggregator.stop()
+    await registration_stats.stop()
+    await contact_registry.stop()
+    close_pool()
+
+async def flood_guard(update: Update, context: CallbackContext):
+    """حماية من الإغراق وتخفيف الحمل قبل أي معالج أو عمل على قاعدة البيانات"""
+    user = update.effective_user
+    message = update.effective_message
+    if not user or user.id == OWNER_USER_ID:
         return
     
-    application = Application.builder().token(BOT_TOKEN).build()
+    # تخفيف الحمل: رد ثابت رخيص عند تراكم التحديثات
+    processor = context.application.update_processor
+    if getattr(processor, 'pending_updates', 0) > SHED_QUEUE_THRESHOLD:
+        UPDATES_SHED.inc()
+        if message:
+            await message.reply_text(BUSY_TEXT)
+        raise ApplicationHandlerStop
+    
+    command = 'message'
+    if message and message.text and message.text.startswith('/'):
+        command = message.text[1:].split(maxsplit=1)[0].split('@')[0].lower()
     
-    # إعداد نظام المحادثات
-    conv_handler = ConversationHandler(
+    if not flood_limiter.allow(user.id, command):
+        FLOOD_REJECTED.labels(command).inc()
+        raise ApplicationHandlerStop
+
+def build_conversation_handler(persistent: bool = False) -> ConversationHandler:
+    """إعداد نظام المحادثات"""
+    return ConversationHandler(
         entry_points=[CommandHandler('start', start)],
         states={
             FULL_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_full_name)],
@@ -638,15 +908,81 @@ def main():
             PHONE: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_phone)],
             EMAIL: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_email)],
         },
-        fallbacks=[CommandHandler('cancel', cancel)]
+        fallbacks=[CommandHandler('cancel', cancel)],
+        name='registration',
+        persistent=persistent
     )
-    
-    application.add_handler(conv_handler)
+
+def register_handlers(application: Application):
+    """تسجيل نظام المحادثات والأوامر الإضافية"""
+    # المجموعة -1 تعمل قبل جميع المعالجات
+    application.add_handler(TypeHandler(Update, flood_guard), group=-1)
+    # حالة التسجيل تُحفظ في قاعدة البيانات فتنجو من إعادة التشغيل
+    application.add_handler(build_conversation_handler(persistent=application.persistence is not None))
     
     # إضافة الأوامر الإضافية
     application.add_handler(CommandHandler("profile", show_profile))
     application.add_handler(CommandHandler("invite", show_invite))
+    application.add_handler(CommandHandler("network", network_command))
+    application.add_handler(CommandHandler("leaderboard", leaderboard_command))
     application.add_handler(CommandHandler("support", support_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(CommandHandler("export", export_command))
+    application.add_handler(CommandHandler("broadcast", broadcast_command))
+    application.add_handler(CommandHandler("broadcast_cancel", broadcast_cancel_command))
+
+# ==============================
+# 🎪 الدالة الرئيسية
+# ==============================
+def main():
+    """الدالة الرئيسية لتشغيل البوت"""
+    
+    print("🚀 بدء إعداد البوت للتجربة على Render...")
+    
+    if BOT_MODE == 'cluster':
+        # العملية الأمامية لا تلمس قاعدة البيانات؛ كل عامل يجري الإقلاع الكامل
+        if not BOT_TOKEN:
+            print("❌ لم يتم تعيين BOT_TOKEN")
+            return
+        from cluster import run_cluster
+        run_cluster(BOT_TOKEN)
+        return
+    
+    # التحقق من توكن البوت
+    if not BOT_TOKEN:
+        print("❌ لم يتم تعيين BOT_TOKEN")
+        return
+    
+    pool = open_storage()
+    if pool is None:
+        return
+    
+    start_warmup(pool)
+    
+    processor = UserOrderedUpdateProcessor(MAX_CONCURRENT_UPDATES)
+    register_pool_gauges(pool.stats)
+    register_processor_gauges(processor)
+    register_dedup_gauges(contact_registry)
+    register_log_gauges(log_stats)
+    start_metrics_server(port=METRICS_PORT + WORKER_INDEX)
+    
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        # مجمعان منفصلان: الاستطلاع الطويل لا يحجز اتصالات الردود (BOT_API_* و BOT_POLL_POOL_SIZE)
+        .request(build_request('send'))
+        .get_updates_request(build_request('poll'))
+        .concurrent_updates(processor)
+        .persistence(StoragePersistence(shard=(WORKER_INDEX, CLUSTER_WORKERS)))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if BOT_MODE in ('webhook', 'worker'):
+        # التحديثات تصل عبر خادم Webhook (أو من العملية الأمامية) فلا حاجة لـ Updater
+        builder = builder.updater(None)
+    application = builder.build()
+    register_handlers(application)
+    startup_timer.begin('bot_initialize')
     
     print("🤖 البوت يعمل الآن...")
     print("📍 يمكنك تجربته في تلغرام!")
@@ -656,7 +992,46 @@ def main():
     print("   /invite - عرض كود الدعوة")
     print("   /support - الدعم الفني")
     
-    application.run_polling()
+    if BOT_MODE == 'webhook':
+        # aiohttp يُستورد فقط في وضع Webhook لتقليل زمن بدء المفسر
+        from webhook import run_webhook
+        run_webhook(application)
+    elif BOT_MODE == 'worker':
+        from webhook import run_webhook
+        from cluster import worker_config
+        run_webhook(application, worker_config(WORKER_INDEX))
+    else:
+        application.run_polling()
+
+def import_main(argv: list):
+    """استيراد تسجيلات موجودة مسبقاً: python main.py import users.csv [--rejects rejects.ndjson]"""
+    parser = argparse.ArgumentParser(prog='main.py import', description='استيراد تسجيلات من ملف CSV أو NDJSON')
+    parser.add_argument('path', help='ملف .csv أو .ndjson (أو .ndjson.gz)')
+    parser.add_argument('--rejects', help='ملف الصفوف المرفوضة (افتراضياً <الملف>.rejects.ndjson)')
+    parser.add_argument('--chunk-size', type=int, help='عدد الصفوف في كل دفعة')
+    args = parser.parse_args(argv)
+    
+    pool = open_storage()
+    if pool is None:
+        return
+    
+    from bulk_import import run_import, IMPORT_CHUNK_SIZE
+    try:
+        report = asyncio.run(run_import(
+            args.path, validate_registrations, args.rejects or f'{args.path}.rejects.ndjson',
+            args.chunk_size or IMPORT_CHUNK_SIZE
+        ))
+    finally:
+        close_pool()
+    
+    print(f"📥 تم استيراد {report['imported']} من {report['rows']} صف خلال {report['elapsed_s']}s "
+          f"({report['rows_per_s']} صف/ث)")
+    if report['rejected']:
+        reasons = '، '.join(f"{reason}: {count}" for reason, count in report['reasons'].items())
+        print(f"🚫 رُفض {report['rejected']} صف ({reasons}) → {report['rejects_path']}")
 
 if __name__ == '__main__':
-    main()
+    if sys.argv[1:2] == ['import']:
+        import_main(sys.argv[2:])
+    else:
+        main()
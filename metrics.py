@@ -0,0 +1,206 @@
+# ==============================
+# 📈 القياسات: زمن المعالجات والاستعلامات واستدعاءات Bot API بصيغة Prometheus
+# ==============================
+
+import os
+import time
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest, start_http_server
+
+from logging_setup import keep_event
+
+logger = logging.getLogger(__name__)
+
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '9108'))
+# تسجيل المعالجات البطيئة (بالمللي ثانية)، 0 لتعطيله
+SLOW_HANDLER_MS = float(os.environ.get('SLOW_HANDLER_MS', '0'))
+
+_FAST_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+# ==============================
+# 📊 تعريف المقاييس
+# ==============================
+HANDLER_SECONDS = Histogram(
+    'bot_handler_seconds', 'زمن تنفيذ معالجات المحادثة والأوامر', ['handler'], buckets=_FAST_BUCKETS
+)
+HANDLER_ERRORS = Counter(
+    'bot_handler_errors_total', 'عدد الاستثناءات في المعالجات', ['handler']
+)
+DB_QUERY_SECONDS = Histogram(
+    'bot_db_query_seconds', 'زمن تنفيذ الاستعلامات', ['operation'], buckets=_FAST_BUCKETS
+)
+DB_ACQUIRE_SECONDS = Histogram(
+    'bot_db_acquire_seconds', 'زمن انتظار اتصال من المجمع', buckets=_FAST_BUCKETS
+)
+BOT_API_SECONDS = Histogram(
+    'bot_api_request_seconds', 'زمن استدعاءات Bot API', ['endpoint'], buckets=_FAST_BUCKETS
+)
+BOT_API_ERRORS = Counter(
+    'bot_api_errors_total', 'أخطاء استدعاءات Bot API', ['endpoint', 'error']
+)
+BOT_API_RETRIES = Counter(
+    'bot_api_retries_total', 'إعادات محاولة استدعاءات Bot API التي لم تُرسل', ['endpoint', 'reason']
+)
+BOT_API_IN_FLIGHT = Gauge(
+    'bot_api_in_flight', 'استدعاءات Bot API الجارية حسب المجمع (send أو poll)', ['pool']
+)
+FLOOD_REJECTED = Counter(
+    'bot_flood_rejected_total', 'الطلبات المرفوضة بسبب تجاوز المعدل', ['command']
+)
+UPDATES_SHED = Counter(
+    'bot_updates_shed_total', 'التحديثات التي رُد عليها برسالة "مشغول" بسبب الحمل'
+)
+PHONE_VALIDATION_SECONDS = Histogram(
+    'bot_phone_validation_seconds', 'زمن التحقق من رقم الهاتف', buckets=_FAST_BUCKETS
+)
+REGISTRATION_BATCH_SIZE = Histogram(
+    'bot_registration_batch_size', 'عدد التسجيلات في كل دفعة كتابة', buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+REGISTRATION_COMMIT_SECONDS = Histogram(
+    'bot_registration_commit_seconds', 'زمن كتابة دفعة التسجيلات حتى commit', buckets=_FAST_BUCKETS
+)
+DEDUP_CHECKS = Counter(
+    'bot_dedup_checks_total', 'فحوص تكرار الهاتف والبريد حسب النتيجة', ['field', 'result']
+)
+
+
+# ==============================
+# ⏱️ تغليف المعالجات
+# ==============================
+def instrument_handler(func):
+    """قياس زمن المعالج وتسجيله إذا تجاوز حد البطء"""
+    name = func.__name__
+    histogram = HANDLER_SECONDS.labels(name)
+
+    @functools.wraps(func)
+    async def wrapper(update, context):
+        started = time.perf_counter()
+        result = None
+        try:
+            result = await func(update, context)
+            return result
+        except Exception:
+            HANDLER_ERRORS.labels(name).inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            histogram.observe(elapsed)
+            user = getattr(update, 'effective_user', None)
+            user_id = user.id if user else None
+            if SLOW_HANDLER_MS and elapsed * 1000 >= SLOW_HANDLER_MS:
+                logger.warning("🐢 معالج بطيء: %s استغرق %.1fms (المستخدم: %s)", name, elapsed * 1000, user_id or '-')
+            elif logger.isEnabledFor(logging.INFO) and keep_event('update'):
+                # سجل لكل تحديث بعينة حدث update في LOG_SAMPLE_RATES (1٪ افتراضياً)
+                logger.info(
+                    "✅ %s: %.1fms (المستخدم: %s)", name, elapsed * 1000, user_id or '-',
+                    extra={'event': 'update', 'sampled': True, 'handler': name, 'user_id': user_id,
+                           'state': result, 'duration_ms': round(elapsed * 1000, 3)}
+                )
+
+    return wrapper
+
+
+# ==============================
+# 🔌 مقاييس المجمع والمعالج
+# ==============================
+def register_pool_gauges(get_stats):
+    """ربط مقاييس مجمع الاتصالات بدالة تعيد stats()"""
+    for key, doc in (('in_use', 'الاتصالات المستخدمة'), ('waiters', 'المنتظرون على اتصال')):
+        Gauge(f'bot_db_pool_{key}', doc).set_function(lambda key=key: get_stats()[key])
+    Gauge('bot_db_breaker_open', 'قاطع قاعدة البيانات مفتوح (1) أو مغلق (0)').set_function(
+        lambda: 0 if get_stats()['breaker'] == 'closed' else 1
+    )
+
+
+def register_processor_gauges(processor):
+    """ربط مقاييس معالج التحديثات (عمق الطابور والتراكم لكل مستخدم)"""
+    for key, doc in (
+        ('queue_depth', 'التحديثات المنتظرة'),
+        ('running', 'التحديثات الجارية'),
+        ('max_user_backlog', 'أكبر تراكم لمستخدم واحد'),
+        ('users_with_backlog', 'المستخدمون الذين لديهم تحديثات متراكمة'),
+    ):
+        Gauge(f'bot_updates_{key}', doc).set_function(lambda key=key: processor.stats()[key])
+
+
+def register_log_gauges(stats):
+    """ربط مقاييس طابور التسجيل (السجلات المُسقطة والمنتظرة)"""
+    dropped = Gauge('bot_log_records_dropped', 'سجلات لم تُكتب: أُسقطت بالعينة أو لامتلاء الطابور', ['reason'])
+    for reason in ('sampled', 'queue_full'):
+        dropped.labels(reason).set_function(lambda reason=reason: stats()[reason])
+    Gauge('bot_log_queue_depth', 'سجلات تنتظر الكتابة في خيط التسجيل').set_function(lambda: stats()['queued'])
+
+
+def register_dedup_gauges(registry):
+    """ربط مقاييس مرشحات التكرار (الحجم وعدد القيم ونسبة الخطأ المتوقعة)"""
+    for key, doc in (
+        ('items', 'القيم المضافة إلى المرشح'),
+        ('bytes', 'حجم المرشح في الذاكرة'),
+        ('estimated_fp_rate', 'نسبة الإيجابيات الكاذبة المتوقعة حالياً'),
+    ):
+        gauge = Gauge(f'bot_dedup_filter_{key}', doc, ['field'])
+        for field in ('phone', 'email'):
+            gauge.labels(field).set_function(lambda key=key, field=field: registry.stats()[field][key])
+
+
+# ==============================
+# 🚦 توقيت مراحل الإقلاع
+# ==============================
+class StartupTimer:
+    """تسجيل زمن كل مرحلة من مراحل الإقلاع وطباعة ملخص واحد في النهاية
+
+    المراحل التي تعمل في خيوط خلفية تُسجل بنفس الطريقة، فيظهر في الملخص
+    زمن كل مرحلة والزمن الكلي الفعلي منذ إنشاء المؤقت.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []
+        self._begun = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def begin(self, name: str):
+        """بدء مرحلة تنتهي في موضع آخر (مثل تهيئة التطبيق حتى post_init)"""
+        self._begun[name] = time.perf_counter()
+
+    def end(self, name: str):
+        started = self._begun.pop(name, None)
+        if started is not None:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self.phases.append((name, seconds))
+
+    def summary(self) -> str:
+        with self._lock:
+            parts = [f"{name}={seconds * 1000:.0f}ms" for name, seconds in self.phases]
+        total = (time.perf_counter() - self.started) * 1000
+        return f"{', '.join(parts)} | الإجمالي={total:.0f}ms"
+
+    def log(self):
+        logger.info("🚦 مراحل الإقلاع: %s", self.summary())
+
+
+def render_metrics():
+    """نص المقاييس بصيغة Prometheus ونوع المحتوى"""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(host: str = METRICS_HOST, port: int = METRICS_PORT):
+    """تشغيل نقطة /metrics محلية في خيط منفصل"""
+    start_http_server(port, addr=host)
+    logger.info("📈 نقطة القياسات تعمل على http://%s:%s/metrics", host, port)
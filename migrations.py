@@ -0,0 +1,108 @@
+# ==============================
+# 🧱 ترحيل المخطط: جدول schema_version وترحيلات مرقمة
+# ==============================
+
+import logging
+
+import repository
+import sqlite_repository
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION_DDL = '''
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    description VARCHAR(200),
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+'''
+
+# (الإصدار، الوصف، الأوامر) — تُضاف الترحيلات الجديدة في النهاية فقط ولا تُعدل القديمة
+MIGRATIONS = [
+    (1, 'user_profiles', [repository.USER_PROFILES_DDL]),
+    (2, 'broadcast_jobs', [repository.BROADCAST_JOBS_DDL]),
+    (3, 'conversation_state', repository.CONVERSATION_STATE_DDL),
+    # يُملأ من user_profiles مرة واحدة داخل معاملة الترحيل
+    (4, 'registration_stats', repository.REGISTRATION_STATS_DDL),
+    # يُبنى من invited_by الحالية مرة واحدة (WITH RECURSIVE حتى REFERRAL_MAX_DEPTH)
+    (5, 'referral_graph', repository.REFERRAL_GRAPH_DDL),
+    # التكرارات القديمة تُعلَّم قبل إنشاء الفهارس الفريدة حتى لا يفشل الترحيل
+    (6, 'contact_unique', repository.CONTACT_UNIQUE_DDL),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn) -> int:
+    """آخر إصدار مطبق، أو 0 إذا لم يُنشأ الجدول بعد"""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+        if not cursor.fetchone()[0]:
+            return 0
+        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        return cursor.fetchone()[0]
+
+
+def apply_migrations(conn) -> int:
+    """تطبيق الترحيلات الناقصة على الاتصال المعطى، ويعيد عددها
+
+    عندما يكون المخطط محدثاً يكفي استعلامان للقراءة دون أي أمر DDL. الترحيلات
+    الناقصة تُطبق في معاملة واحدة مع تسجيل إصداراتها، وقفل استشاري يمنع نسختين
+    من البوت من تطبيقها معاً.
+    """
+    version = current_version(conn)
+    conn.commit()
+    if version >= LATEST_VERSION:
+        return 0
+
+    applied = 0
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext('schema_version'))")
+        cursor.execute(SCHEMA_VERSION_DDL)
+        version = current_version(conn)
+        for number, description, statements in MIGRATIONS:
+            if number <= version:
+                continue
+            for statement in statements:
+                cursor.execute(statement)
+                if cursor.description is not None:
+                    # صفوف غيّرها الترحيل ويجب أن يعرفها المالك (مثل التسجيلات المعلَّمة 'duplicate')
+                    affected = [row[0] for row in cursor.fetchall()]
+                    logger.warning("🧱 الترحيل %s غيّر %s صفاً: %s", number, len(affected), affected)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                (number, description)
+            )
+            logger.info("🧱 تم تطبيق الترحيل %s: %s", number, description)
+            applied += 1
+    conn.commit()
+    return applied
+
+
+# ==============================
+# 🪶 ترحيلات SQLite (رقم الإصدار في PRAGMA user_version)
+# ==============================
+SQLITE_MIGRATIONS = [
+    (1, 'initial_schema', sqlite_repository.SCHEMA_DDL),
+]
+
+
+def apply_sqlite_migrations(conn) -> int:
+    """تطبيق ترحيلات SQLite الناقصة في معاملة واحدة (الاتصال بوضع autocommit)"""
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    pending = [migration for migration in SQLITE_MIGRATIONS if migration[0] > version]
+    if not pending:
+        return 0
+
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for number, description, statements in pending:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {number}')
+            logger.info("🧱 تم تطبيق ترحيل SQLite %s: %s", number, description)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return len(pending)
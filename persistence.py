@@ -0,0 +1,194 @@
+# ==============================
+# 💾 حفظ المحادثات الجارية في قاعدة البيانات مع كتابة مؤجلة على دفعات
+# ==============================
+
+import os
+import time
+import asyncio
+import logging
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from storage import repository
+
+logger = logging.getLogger(__name__)
+
+# كل كم ثانية يسلم PTB التغييرات للحفظ (تُكتب كلها بدفعة واحدة)
+PERSISTENCE_INTERVAL = float(os.environ.get('PERSISTENCE_INTERVAL', '10'))
+# مسودة التسجيل التي لم تتقدم خلال هذه المدة تُحذف ولا تُحمّل عند الإقلاع
+CONVERSATION_TTL = float(os.environ.get('CONVERSATION_TTL', str(24 * 3600)))
+CONVERSATION_EXPIRE_EVERY = float(os.environ.get('CONVERSATION_EXPIRE_EVERY', '3600'))
+# إعادة محاولة الدفعة الفاشلة دون انتظار تحديث جديد، بمهلة تتضاعف حتى الحد الأقصى
+PERSISTENCE_RETRY_BACKOFF = float(os.environ.get('PERSISTENCE_RETRY_BACKOFF', '1'))
+PERSISTENCE_RETRY_MAX = float(os.environ.get('PERSISTENCE_RETRY_MAX', '60'))
+
+
+class StoragePersistence(BasePersistence):
+    """حفظ حالة ConversationHandler و user_data للمستخدمين في منتصف التسجيل
+
+    صف واحد لكل مستخدم في جدول conversation_state يجمع الحالة وبيانات المسودة،
+    عبر storage.repository فيعمل مع PostgreSQL و SQLite.
+    استدعاءات update_* لا تلمس قاعدة البيانات، بل تعلّم المستخدم كمتغير، ثم تُكتب
+    كل التغييرات المتراكمة بأمر INSERT ... ON CONFLICT واحد في نهاية كل دورة حفظ.
+    عند انتهاء المحادثة يُحذف الصف، فلا يبقى في الجدول إلا المسودات الجارية.
+    """
+
+    def __init__(self, update_interval: float = PERSISTENCE_INTERVAL, ttl: float = CONVERSATION_TTL,
+                 shard: tuple = None):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.ttl = ttl
+        self.shard = shard
+        self._loaded = None
+        # user_id -> (اسم المحادثة، chat_id، الحالة) للمحادثات الجارية فقط
+        self._states = {}
+        self._user_data = {}
+        # المستخدمون الذين لهم صف في الجدول (لتجنب حذف صفوف غير موجودة)
+        self._stored = set()
+        self._dirty = set()
+        self._flush_task = None
+        self._flush_lock = asyncio.Lock()
+        self._next_expiry = 0.0
+        self.writes = 0
+
+    # ==============================
+    # 📥 التحميل عند الإقلاع
+    # ==============================
+    async def _load(self) -> dict:
+        if self._loaded is None:
+            expired = await repository.expire_conversations(self.ttl)
+            self._next_expiry = time.monotonic() + CONVERSATION_EXPIRE_EVERY
+            rows = await repository.load_conversations(self.ttl, self.shard)
+            self._loaded = {}
+            for user_id, chat_id, conversation, state, user_data in rows:
+                self._states[user_id] = (conversation, chat_id, state)
+                self._user_data[user_id] = user_data
+                self._stored.add(user_id)
+                self._loaded.setdefault(conversation, {})[(chat_id, user_id)] = state
+            logger.info("💾 تم تحميل %s محادثة جارية (حُذفت %s مسودة منتهية)", len(rows), expired)
+        return self._loaded
+
+    async def get_user_data(self) -> dict:
+        await self._load()
+        return {user_id: dict(data) for user_id, data in self._user_data.items()}
+
+    async def get_conversations(self, name: str) -> dict:
+        return dict((await self._load()).get(name, {}))
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    # ==============================
+    # ✍️ تسجيل التغييرات (دون كتابة فورية)
+    # ==============================
+    async def update_conversation(self, name: str, key: tuple, new_state) -> None:
+        chat_id, user_id = key[0], key[-1]
+        if new_state is None:
+            self._states.pop(user_id, None)
+            self._user_data.pop(user_id, None)
+        else:
+            self._states[user_id] = (name, chat_id, new_state)
+        self._mark_dirty(user_id)
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        # قد تصل قبل update_conversation في نفس الدورة، فتُحفظ ويُقرر عند الكتابة
+        self._user_data[user_id] = data
+        self._mark_dirty(user_id)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._states.pop(user_id, None)
+        self._user_data.pop(user_id, None)
+        self._mark_dirty(user_id)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    # ==============================
+    # 🔁 الكتابة المجمعة
+    # ==============================
+    def _mark_dirty(self, user_id: int):
+        self._dirty.add(user_id)
+        if self._flush_task is None or self._flush_task.done():
+            # PTB يستدعي update_* لكل المتغيرين معاً؛ مهمة واحدة تكتبهم بعد انتهاء الدورة
+            self._flush_task = asyncio.create_task(self._write_batch())
+
+    async def _write_batch(self):
+        await asyncio.sleep(0)
+        delay = PERSISTENCE_RETRY_BACKOFF
+        # من تغيّر أثناء الكتابة يُكتب بعدها مباشرة، والدفعة الفاشلة تُعاد بعد مهلة
+        while self._dirty:
+            try:
+                await self._write_dirty()
+                delay = PERSISTENCE_RETRY_BACKOFF
+            except Exception as e:
+                logger.error("❌ خطأ في حفظ حالة %s محادثة، إعادة المحاولة بعد %.1f ث: %s",
+                             len(self._dirty), delay, e)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, PERSISTENCE_RETRY_MAX)
+
+    async def _write_dirty(self):
+        async with self._flush_lock:
+            dirty, self._dirty = self._dirty, set()
+            if dirty:
+                upserts, deleted = [], []
+                for user_id in dirty:
+                    current = self._states.get(user_id)
+                    if current is None:
+                        # لا محادثة جارية: لا حاجة لبيانات المستخدم هنا
+                        self._user_data.pop(user_id, None)
+                        if user_id in self._stored:
+                            deleted.append(user_id)
+                    else:
+                        name, chat_id, state = current
+                        upserts.append((user_id, chat_id, name, state, self._user_data.get(user_id, {})))
+                if upserts or deleted:
+                    try:
+                        await repository.write_conversations(upserts, deleted)
+                    except BaseException:
+                        # إعادة المستخدمين للدفعة التالية (أو لـ flush عند إلغاء المهمة)
+                        self._dirty |= dirty
+                        raise
+                    self._stored.update(row[0] for row in upserts)
+                    self._stored.difference_update(deleted)
+                    self.writes += 1
+
+            if time.monotonic() >= self._next_expiry:
+                self._next_expiry = time.monotonic() + CONVERSATION_EXPIRE_EVERY
+                await repository.expire_conversations(self.ttl)
+
+    async def flush(self) -> None:
+        """كتابة ما تبقى عند إيقاف البوت"""
+        if self._flush_task is not None:
+            # قد تكون المهمة في مهلة إعادة المحاولة؛ محاولة أخيرة واحدة هنا بدلاً من انتظارها
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        try:
+            await self._write_dirty()
+        except Exception as e:
+            logger.error("❌ تعذر حفظ %s محادثة عند الإيقاف: %s", len(self._dirty), e)
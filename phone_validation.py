@@ -0,0 +1,82 @@
+# ==============================
+# 📞 التحقق من أرقام الهواتف: مناطق محددة مسبقاً وذاكرة LRU للنتائج
+# ==============================
+
+import os
+import re
+from functools import lru_cache
+
+import phonenumbers
+from phonenumbers.phonemetadata import PhoneMetadata
+
+# إعادة إدخال نفس الرقم تحدث خلال ثوانٍ، فذاكرة صغيرة تكفي (نحو 330 بايت لكل مُدخل)
+PHONE_CACHE_SIZE = int(os.environ.get('PHONE_CACHE_SIZE', '1024'))
+
+_STRIP_RE = re.compile(r'[\s\-\(\)]')
+
+
+class PhoneValidator:
+    """التحقق من الأرقام ضمن رموز الدول المسموحة فقط
+
+    مكتبة phonenumbers تحمّل بيانات كل منطقة عند أول استخدام لها، لذلك نرفض
+    أي رمز دولة خارج القائمة قبل التحليل، فلا تُحمَّل إلا بيانات الدول المحددة.
+    النتائج تُخزن في ذاكرة LRU حسب (الرقم بعد التنظيف، رمز الدولة).
+    """
+
+    def __init__(self, country_codes, cache_size: int = PHONE_CACHE_SIZE):
+        # أطول رمز أولاً حتى لا يطابق +96 قبل +966 مثلاً
+        self.country_codes = sorted(set(country_codes), key=len, reverse=True)
+        self.regions = sorted({
+            phonenumbers.region_code_for_country_code(int(code.lstrip('+')))
+            for code in self.country_codes
+        })
+        self._validate = lru_cache(maxsize=cache_size)(self._validate_normalized)
+
+    def preload(self) -> int:
+        """تحميل بيانات المناطق المسموحة مسبقاً، ويعيد عدد المناطق المحمّلة"""
+        for region in self.regions:
+            PhoneMetadata.metadata_for_region(region)
+        return len(self.regions)
+
+    @staticmethod
+    def _normalize(phone_number: str, country_code: str) -> str:
+        normalized = _STRIP_RE.sub('', phone_number)
+        if not normalized.startswith('+'):
+            normalized = country_code + normalized
+        return normalized
+
+    def validate(self, phone_number: str, country_code: str):
+        """إرجاع (صحيح؟، الرقم المنسق، رسالة) كما في validate_phone_with_country"""
+        return self._validate(self._normalize(phone_number, country_code))
+
+    def validate_batch(self, pairs) -> list:
+        """التحقق من دفعة [(الرقم، رمز الدولة)] دون المرور بذاكرة LRU
+
+        للاستيراد الجماعي: أرقام الملف لا تتكرر غالباً فلا فائدة من الذاكرة، وتمريرها
+        عبرها يطرد إدخالات المحادثات الجارية. الأرقام المكررة داخل الدفعة تُحلل مرة واحدة.
+        """
+        results = {}
+        batch = []
+        for phone_number, country_code in pairs:
+            normalized = self._normalize(phone_number, country_code)
+            if normalized not in results:
+                results[normalized] = self._validate_normalized(normalized)
+            batch.append(results[normalized])
+        return batch
+
+    def _validate_normalized(self, phone_number: str):
+        if not any(phone_number.startswith(code) for code in self.country_codes):
+            return False, phone_number, "❌ رقم الهاتف غير صحيح"
+
+        try:
+            parsed_number = phonenumbers.parse(phone_number, None)
+            if phonenumbers.is_valid_number(parsed_number):
+                formatted_number = phonenumbers.format_number(parsed_number, phonenumbers.PhoneNumberFormat.E164)
+                return True, formatted_number, "✅ رقم الهاتف صحيح"
+            return False, phone_number, "❌ رقم الهاتف غير صحيح"
+        except Exception as e:
+            return False, phone_number, f"❌ رقم الهاتف غير صحيح: {str(e)}"
+
+    def cache_info(self):
+        """إحصائيات ذاكرة LRU"""
+        return self._validate.cache_info()
@@ -0,0 +1,114 @@
+# ==============================
+# 🪣 دلو الرموز (Token Bucket) لتحديد المعدل
+# ==============================
+
+import time
+
+
+class TokenBucket:
+    """دلو رموز بسيط: يمتلئ بمعدل rate رمز/ثانية حتى capacity
+
+    الكائن صغير (__slots__) لأنه قد يُنشأ لكل مستخدم أو محادثة.
+    """
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate: float, capacity: float = None, now: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def consume(self, tokens: float = 1.0, now: float = None) -> bool:
+        """استهلاك رموز إن توفرت، ويعيد False دون انتظار إذا لم تتوفر"""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def wait_time(self, tokens: float = 1.0, now: float = None) -> float:
+        """الزمن اللازم (بالثواني) حتى تتوفر الرموز المطلوبة"""
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if now < self.updated:
+            # الدلو موقوف حتى updated (بعد RetryAfter مثلاً)
+            return self.updated - now + max(0.0, tokens - self.tokens) / self.rate
+        return max(0.0, tokens - self.tokens) / self.rate
+
+    def pause(self, seconds: float, now: float = None):
+        """إيقاف الدلو مؤقتاً وتفريغه (مثلاً عند استلام RetryAfter)"""
+        now = time.monotonic() if now is None else now
+        self.tokens = 0.0
+        self.updated = max(self.updated, now + seconds)
+
+
+# ==============================
+# 🚧 تحديد معدل الطلبات لكل مستخدم
+# ==============================
+def parse_budgets(spec: str) -> dict:
+    """تحويل نص مثل "start:0.2:3,profile:0.1:2" إلى {الأمر: (المعدل، السعة)}"""
+    budgets = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, rate, burst = item.split(':')
+        budgets[name] = (float(rate), float(burst))
+    return budgets
+
+
+class UserRateLimiter:
+    """دلو رموز لكل (مستخدم، أمر) مع ميزانية مستقلة لكل أمر
+
+    الدلاء محفوظة في قاموس منفصل لكل أمر، وتُحذف الدلاء الخاملة دورياً:
+    الدلو الممتلئ مطابق لدلو جديد، فحذفه لا يغير السلوك ويبقي الذاكرة محدودة.
+    """
+
+    def __init__(self, budgets: dict, default: tuple, sweep_interval: float = 60.0):
+        self.budgets = budgets
+        self.default = default
+        self.sweep_interval = sweep_interval
+        self._buckets = {}
+        self._next_sweep = time.monotonic() + sweep_interval
+        self.rejected = 0
+
+    def allow(self, user_id: int, command: str) -> bool:
+        """هل يُسمح للمستخدم بتنفيذ الأمر الآن؟"""
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self.sweep(now)
+
+        rate, burst = self.budgets.get(command, self.default)
+        buckets = self._buckets.get(command)
+        if buckets is None:
+            buckets = self._buckets[command] = {}
+        bucket = buckets.get(user_id)
+        if bucket is None:
+            bucket = buckets[user_id] = TokenBucket(rate, burst, now)
+
+        if bucket.consume(now=now):
+            return True
+        self.rejected += 1
+        return False
+
+    def sweep(self, now: float = None) -> int:
+        """حذف الدلاء التي امتلأت من جديد (مستخدمون خاملون)"""
+        now = time.monotonic() if now is None else now
+        removed = 0
+        for buckets in self._buckets.values():
+            idle = [
+                user_id for user_id, bucket in buckets.items()
+                if bucket.tokens + (now - bucket.updated) * bucket.rate >= bucket.capacity
+            ]
+            for user_id in idle:
+                del buckets[user_id]
+            removed += len(idle)
+        self._next_sweep = now + self.sweep_interval
+        return removed
+
+    def __len__(self) -> int:
+        return sum(len(buckets) for buckets in self._buckets.values())
@@ -0,0 +1,43 @@
+# ==============================
+# 🔑 أكواد الإحالة المشتقة من معرّف المستخدم
+# ==============================
+#
+# الكود ناتج عن تحويل تقابلي (bijective) لمعرّف المستخدم ثم ترميزه بـ Base32،
+# لذلك كل مستخدم له كود واحد فقط ولا يتكرر أي كود دون الحاجة لأي استعلام.
+
+_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'  # Crockford Base32 (بدون I L O U)
+_INDEX = {char: i for i, char in enumerate(_ALPHABET)}
+
+_BITS = 60                      # معرّفات تلغرام أقل من 2^52 بكثير
+_MASK = (1 << _BITS) - 1
+_MULTIPLIER = 0x5DEECE66D1B3A5F  # عدد فردي ⇐ الضرب قابل للعكس بترديد 2^60
+_INVERSE = pow(_MULTIPLIER, -1, 1 << _BITS)
+_XOR = 0x2A5F3C9E1B7D48
+CODE_LENGTH = _BITS // 5        # 12 حرفاً
+MAX_USER_ID = _MASK             # أكبر معرّف له كود مشتق
+
+
+def encode_referral_code(user_id: int) -> str:
+    """تحويل معرّف المستخدم إلى كود إحالة فريد"""
+    if not 0 <= user_id <= _MASK:
+        raise ValueError(f"معرّف المستخدم خارج النطاق: {user_id}")
+    value = ((user_id * _MULTIPLIER) & _MASK) ^ _XOR
+    chars = []
+    for _ in range(CODE_LENGTH):
+        chars.append(_ALPHABET[value & 31])
+        value >>= 5
+    return ''.join(reversed(chars))
+
+
+def decode_referral_code(code: str):
+    """استخراج معرّف المستخدم من الكود، أو None إذا لم يكن كوداً مشتقاً"""
+    code = code.strip().upper()
+    if len(code) != CODE_LENGTH:
+        return None
+    value = 0
+    for char in code:
+        digit = _INDEX.get(char)
+        if digit is None:
+            return None
+        value = (value << 5) | digit
+    return ((value ^ _XOR) * _INVERSE) & _MASK
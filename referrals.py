@@ -0,0 +1,176 @@
+# ==============================
+# 📢 احتساب الإحالات: تجميع الزيادات في الذاكرة وكتابتها على دفعات
+# ==============================
+
+import os
+import time
+import asyncio
+import logging
+from collections import Counter, OrderedDict
+
+from storage import repository
+from referral_codes import decode_referral_code
+from rendering import invalidate_user
+
+logger = logging.getLogger(__name__)
+
+REFERRAL_FLUSH_INTERVAL = float(os.environ.get('REFERRAL_FLUSH_INTERVAL', '5'))
+LEADERBOARD_SIZE = int(os.environ.get('LEADERBOARD_SIZE', '10'))
+LEADERBOARD_TTL = float(os.environ.get('LEADERBOARD_TTL', '60'))
+# الكود المخزن لكل مُحيل (لا يتغير أبداً)؛ المُحيلون النشطون قلة فتكفي ذاكرة صغيرة
+INVITER_CODE_CACHE_SIZE = int(os.environ.get('INVITER_CODE_CACHE_SIZE', '10000'))
+
+_inviter_codes = OrderedDict()
+
+
+async def _stored_code(user_id: int, derived_code: str) -> str:
+    """كود الإحالة المخزن لصاحب الكود المشتق
+
+    المستخدمون القدامى يحتفظون بكودهم العشوائي، و credit_referrals وشجرة الإحالات
+    تطابقان الكود المخزن، فيُعاد هو بدلاً من الكود المشتق. إذا لم يكن للمستخدم صف
+    بعد (تسجيل في الملف الاحتياطي أو في دفعة الاستيراد الحالية) فسيُخزن له الكود المشتق.
+    """
+    code = _inviter_codes.get(user_id)
+    if code is not None:
+        _inviter_codes.move_to_end(user_id)
+        return code
+    row = await repository.get_invite_info(user_id)
+    if row is None:
+        return derived_code
+    _inviter_codes[user_id] = row[0]
+    if len(_inviter_codes) > INVITER_CODE_CACHE_SIZE:
+        _inviter_codes.popitem(last=False)
+    return row[0]
+
+
+async def resolve_referral_code(code: str, is_registered):
+    """التحقق من كود الدعوة وإرجاعه بصيغته القياسية، أو None إذا لم يكن لمستخدم مسجل
+
+    الأكواد المشتقة من user_id تُفك محلياً ويُتحقق من صاحبها عبر is_registered
+    (المدعومة بذاكرة التسجيل) ثم يُعاد كوده المخزن، أما الأكواد القديمة العشوائية
+    فتحتاج استعلاماً.
+    """
+    code = code.strip().upper()
+    if not code or len(code) > 20:
+        return None
+
+    inviter_id = decode_referral_code(code)
+    if inviter_id is not None:
+        if not await is_registered(inviter_id):
+            return None
+        return await _stored_code(inviter_id, code)
+
+    inviter_id = await repository.find_user_by_referral_code(code)
+    return code if inviter_id is not None else None
+
+
+class ReferralAggregator:
+    """تجميع زيادات total_referrals وكتابتها دورياً بأمر UPDATE واحد
+
+    عند انتشار كود دعوة واحد، تتحول مئات التسجيلات إلى زيادة واحدة لكل دفعة
+    بدلاً من أن يصبح صف صاحب الكود نقطة قفل ساخنة. بنفس الطريقة تُضاف
+    روابط المستخدمين الجدد إلى شجرة الإحالات، وتُجمع زيادات عدد الأحفاد لكل
+    مستوى في أمر واحد لكل دفعة.
+    """
+
+    def __init__(self, interval: float = REFERRAL_FLUSH_INTERVAL):
+        self.interval = interval
+        self._pending = Counter()
+        self._links = []
+        self._task = None
+        self._flush_lock = asyncio.Lock()
+        self.flushed = 0
+
+    def add(self, referral_code: str, count: int = 1):
+        """تسجيل إحالة جديدة لصاحب الكود"""
+        self._pending[referral_code] += count
+
+    def link(self, user_id: int, referral_code: str):
+        """تسجيل مستخدم جديد دُعي بالكود: زيادة المُحيل وإضافته إلى الشجرة"""
+        self.add(referral_code)
+        self._links.append((user_id, referral_code))
+
+    @property
+    def pending(self) -> int:
+        return sum(self._pending.values())
+
+    async def flush(self) -> int:
+        """كتابة الزيادات المعلقة في قاعدة البيانات"""
+        async with self._flush_lock:
+            await self._flush_links()
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, Counter()
+            # ترتيب ثابت للأكواد يمنع الأقفال المتبادلة بين المعاملات
+            increments = sorted(batch.items())
+            try:
+                await repository.credit_referrals(increments)
+            except Exception as e:
+                # إعادة الزيادات لتُكتب في الدفعة التالية
+                self._pending.update(batch)
+                logger.error("❌ خطأ في كتابة الإحالات: %s", e)
+                return 0
+            self.flushed += sum(batch.values())
+            # عدد المُحالين تغير، فتُبطل نصوص /profile و /invite لأصحاب الأكواد
+            for referral_code, _ in increments:
+                inviter_id = decode_referral_code(referral_code)
+                if inviter_id is not None:
+                    invalidate_user(inviter_id)
+            return len(increments)
+
+    async def _flush_links(self):
+        if not self._links:
+            return
+        links, self._links = self._links, []
+        try:
+            await repository.link_referrals(links)
+        except Exception as e:
+            # الإعادة في المقدمة حفاظاً على ترتيب الروابط
+            self._links[:0] = links
+            logger.error("❌ خطأ في تحديث شجرة الإحالات: %s", e)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        """بدء الكتابة الدورية في الخلفية"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """إيقاف الكتابة الدورية وكتابة ما تبقى"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        if self._pending or self._links:
+            logger.error("❌ تعذرت كتابة %s إحالة و %s رابط عند الإيقاف", self.pending, len(self._links))
+
+
+referral_aggregator = ReferralAggregator()
+
+
+# ==============================
+# 🏆 لوحة المتصدرين
+# ==============================
+_leaderboard = {'text': None, 'expires': 0.0}
+
+
+async def leaderboard_text() -> str:
+    """نص لوحة المتصدرين، يُعاد بناؤه باستعلام واحد كل LEADERBOARD_TTL ثانية على الأكثر"""
+    now = time.monotonic()
+    if _leaderboard['text'] is None or now >= _leaderboard['expires']:
+        rows = await repository.get_referral_leaderboard(LEADERBOARD_SIZE)
+        lines = ["🏆 **أعلى المُحيلين (كامل الشبكة)**", ""]
+        lines.extend(f"{rank}. `{code}`: {count}" for rank, (_, code, count) in enumerate(rows, 1))
+        if not rows:
+            lines.append("لا توجد إحالات بعد")
+        _leaderboard['text'] = '\n'.join(lines)
+        _leaderboard['expires'] = now + LEADERBOARD_TTL
+    return _leaderboard['text']
@@ -0,0 +1,123 @@
+# ==============================
+# 📦 كتابة التسجيلات المكتملة على دفعات (Group Commit)
+# ==============================
+
+import os
+import time
+import asyncio
+import logging
+
+from storage import repository
+from database import DatabaseUnavailable
+from referral_codes import encode_referral_code
+from metrics import REGISTRATION_BATCH_SIZE, REGISTRATION_COMMIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# أقصى انتظار لتجميع الدفعة، وأقصى عدد صفوف فيها (تُكتب فوراً عند اكتمالها)
+REGISTRATION_BATCH_WINDOW_MS = float(os.environ.get('REGISTRATION_BATCH_WINDOW_MS', '5'))
+REGISTRATION_BATCH_MAX = int(os.environ.get('REGISTRATION_BATCH_MAX', '100'))
+
+
+class RegistrationWriter:
+    """تجميع التسجيلات المكتملة وكتابتها بأمر INSERT متعدد الصفوف في معاملة واحدة
+
+    كل معالج ينتظر Future خاصاً به يُحل بكود الإحالة بعد commit الدفعة، فعند
+    موجة تسجيلات تتحول مئات المعاملات (ومئات عمليات fsync) إلى معاملة لكل دفعة،
+    بينما لا يزيد زمن التسجيل المنفرد إلا بمدة النافذة. الصف المرفوض بقيد فريد
+    (هاتف أو بريد مكرر) يُعاد إدراجه وحده ليحصل معالجه على DuplicateRecord
+    الدقيق دون أن تفشل بقية الدفعة، وكذلك عند أي خطأ آخر في الدفعة، أما تعطل
+    قاعدة البيانات (DatabaseUnavailable) فيصل لكل المعالجات.
+    """
+
+    def __init__(self, window_ms: float = REGISTRATION_BATCH_WINDOW_MS, max_batch: int = REGISTRATION_BATCH_MAX):
+        self.window = window_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._pending = []
+        self._timer = None
+        self._flushes = set()
+        self.batches = 0
+        self.rows = 0
+
+    async def insert(self, user_id: int, user_data: dict) -> str:
+        """إضافة التسجيل إلى الدفعة الحالية وانتظار كود الإحالة بعد كتابتها"""
+        future = asyncio.get_running_loop().create_future()
+        record = dict(user_data, user_id=user_id)
+        self._pending.append((record, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush_now()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+        return await future
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.window)
+        self._timer = None
+        self._flush_now()
+
+    def _flush_now(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.create_task(self._write(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _write(self, batch: list):
+        records = [record for record, _ in batch]
+        started = time.perf_counter()
+        try:
+            inserted = await repository.insert_users_bulk(records)
+        except DatabaseUnavailable as e:
+            # كل المعالجات تتلقى الخطأ فتحفظ تسجيلاتها في الطابور الاحتياطي
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        except Exception as e:
+            # صف واحد معيب (قيمة غير صالحة مثلاً) لا يُفشل الدفعة: كل صف يُدرج وحده
+            logger.warning("⚠️ فشلت دفعة من %s تسجيل، إعادة إدراجها صفاً صفاً: %s", len(batch), e)
+            for record, future in batch:
+                await self._insert_single(record, future)
+            return
+        REGISTRATION_COMMIT_SECONDS.observe(time.perf_counter() - started)
+        REGISTRATION_BATCH_SIZE.observe(len(batch))
+        self.batches += 1
+        self.rows += len(inserted)
+
+        inserted_ids = {row[0] for row in inserted}
+        for record, future in batch:
+            user_id = record['user_id']
+            if user_id in inserted_ids:
+                if not future.done():
+                    future.set_result(encode_referral_code(user_id))
+            else:
+                # تعارض مع قيد فريد: الإدراج المنفرد يحدد أي قيد ليُبلَّغ معالجه
+                await self._insert_single(record, future)
+
+    async def _insert_single(self, record: dict, future):
+        try:
+            result = await repository.insert_user(record['user_id'], record)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+
+    async def flush(self):
+        """كتابة الدفعة الحالية وانتظار كل الدفعات الجارية"""
+        self._flush_now()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    async def stop(self):
+        await self.flush()
+        if self.batches:
+            logger.info("📦 كُتب %s تسجيل في %s دفعة (متوسط %.1f)", self.rows, self.batches, self.rows / self.batches)
+
+
+registration_writer = RegistrationWriter()
@@ -0,0 +1,145 @@
+# ==============================
+# 🎨 طبقة الردود: لوحات ونصوص ثابتة تُبنى مرة واحدة ونصوص مخزنة لكل مستخدم
+# ==============================
+
+from telegram import ReplyKeyboardMarkup
+
+from storage import repository
+from cache import profile_cache
+
+# ==============================
+# 📌 النصوص الثابتة
+# ==============================
+COMMANDS_TEXT = (
+    "/profile - عرض ملفك الشخصي\n"
+    "/invite - عرض كود الدعوة\n"
+    "/network - شبكة الإحالة\n"
+    "/support - الدعم الفني"
+)
+
+SUPPORT_TEXT = """
+🆘 **الدعم الفني**
+
+📞 للاستفسارات والمشاكل التقنية:
+
+💬 **طرق التواصل:**
+• عبر البوت: اكتب رسالتك وسيتم الرد عليك
+• البريد الإلكتروني: support@example.com
+
+⏰ **أوقات العمل:**
+• الأحد - الخميس: 9:00 ص - 5:00 م
+
+🔧 **نحن هنا لمساعدتك في:**
+• مشاكل التسجيل
+• استفسارات حول المكافآت
+• أي استفسارات أخرى
+"""
+
+SUMMARY_TEMPLATE = """
+🎉 **تم تسجيل بياناتك بنجاح!** ✅
+
+📋 **البيانات المسجلة:**
+👤 الاسم: {full_name}
+🚻 الجنس: {gender}
+🌍 البلد: {country}
+🎂 سنة الولادة: {birth_year}
+📞 الهاتف: {phone_number}
+📧 البريد الإلكتروني: {email}
+
+📢 **كود دعوتك الشخصي:** `{referral_code}`
+👥 شارك هذا الكود مع أصدقائك!
+{pending_note}
+💡 **الأوامر المتاحة:**
+/profile - عرض ملفك الشخصي
+/invite - عرض كود الدعوة والإحصائيات
+/network - شبكة الإحالة بكل مستوياتها
+/support - التواصل مع الدعم الفني
+"""
+
+PENDING_NOTE = "\n⏳ سيظهر ملفك الشخصي خلال دقائق بعد اكتمال المعالجة\n"
+
+PROFILE_TEMPLATE = """
+📋 **ملفك الشخصي**
+
+👤 **المعلومات الشخصية:**
+🆔 كود الدعوة: `{0}`
+📛 الاسم: {1}
+🌍 البلد: {2}
+🚻 الجنس: {3}
+🎂 سنة الولادة: {4}
+📞 الهاتف: {5}
+📧 البريد الإلكتروني: {6}
+👥 عدد المُحالين: {7}
+📅 تاريخ التسجيل: {8:%Y-%m-%d}
+"""
+
+INVITE_TEMPLATE = """
+📢 **نظام الدعوة والإحالة**
+
+🆔 **كود دعوتك الشخصي:** `{referral_code}`
+
+👥 **عدد الأشخاص الذين دعوتهم:** {total_referrals}
+
+🔗 **كيفية استخدام كود الدعوة:**
+شارك هذا الرابط مع أصدقائك:
+https://t.me/{bot_username}?start={referral_code}
+"""
+
+
+# ==============================
+# ⌨️ لوحات المفاتيح الثابتة
+# ==============================
+def country_keyboard(countries) -> ReplyKeyboardMarkup:
+    """لوحة البلدان بعمودين (تُبنى مرة واحدة عند التحميل)"""
+    names = list(countries)
+    return ReplyKeyboardMarkup([names[i:i + 2] for i in range(0, len(names), 2)], one_time_keyboard=True)
+
+
+GENDER_KEYBOARD = ReplyKeyboardMarkup([['ذكر', 'أنثى']], one_time_keyboard=True)
+
+
+# ==============================
+# 👤 نصوص المستخدم المخزنة
+# ==============================
+def render_summary(user_data: dict) -> str:
+    """ملخص التسجيل النهائي من بيانات المحادثة"""
+    return SUMMARY_TEMPLATE.format(
+        full_name=user_data.get('full_name'),
+        gender=user_data.get('gender'),
+        country=user_data.get('country'),
+        birth_year=user_data.get('birth_year'),
+        phone_number=user_data.get('phone_number'),
+        email=user_data.get('email'),
+        referral_code=user_data.get('referral_code', 'غير متوفر'),
+        pending_note=PENDING_NOTE if user_data.get('spooled') else "",
+    )
+
+
+def _render_user(profile, bot_username: str) -> tuple:
+    return (
+        PROFILE_TEMPLATE.format(*profile),
+        INVITE_TEMPLATE.format(referral_code=profile[0], total_referrals=profile[7], bot_username=bot_username),
+    )
+
+
+async def get_user_texts(user_id: int, bot_username: str):
+    """(نص /profile، نص /invite) من الذاكرة، أو باستعلام واحد عند عدم وجودهما
+
+    يعيد None إذا لم يكن المستخدم مسجلاً (ولا تُخزن النتيجة السلبية هنا،
+    فذاكرة حالة التسجيل تتكفل بها).
+    """
+    texts = profile_cache.get(user_id)
+    if texts is not None:
+        return texts
+
+    profile = await repository.get_profile(user_id)
+    if profile is None:
+        return None
+    texts = _render_user(profile, bot_username)
+    profile_cache.set(user_id, texts)
+    return texts
+
+
+def invalidate_user(user_id: int):
+    """إبطال نصوص المستخدم بعد تغير صفه"""
+    profile_cache.invalidate(user_id)
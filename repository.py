@@ -0,0 +1,607 @@
+# ==============================
+# 📚 مستودع الاستعلامات (PostgreSQL): كل أوامر SQL الخاصة بالمستخدمين
+# ==============================
+
+import io
+import csv
+import gzip
+import json
+from collections import Counter
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+from database import get_pool, DuplicateRecord
+from referral_codes import encode_referral_code
+from storage_schema import REFERRAL_MAX_DEPTH, EXPORT_COLUMNS
+
+
+# ==============================
+# 🧱 مخطط الجداول
+# ==============================
+USER_PROFILES_DDL = '''
+CREATE TABLE IF NOT EXISTS user_profiles (
+    user_id BIGINT PRIMARY KEY,
+    telegram_username VARCHAR(100),
+    email VARCHAR(255),
+    referral_code VARCHAR(20) UNIQUE,
+    invited_by VARCHAR(20),
+    full_name VARCHAR(200),
+    country VARCHAR(100),
+    gender VARCHAR(10),
+    birth_year INTEGER,
+    phone_number VARCHAR(20),
+    registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    total_referrals INTEGER DEFAULT 0,
+    status VARCHAR(20) DEFAULT 'active'
+)
+'''
+BROADCAST_JOBS_DDL = '''
+CREATE TABLE IF NOT EXISTS broadcast_jobs (
+    id SERIAL PRIMARY KEY,
+    message_text TEXT NOT NULL,
+    last_user_id BIGINT DEFAULT 0,
+    sent INTEGER DEFAULT 0,
+    failed INTEGER DEFAULT 0,
+    status VARCHAR(20) DEFAULT 'running',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+)
+'''
+REGISTRATION_STATS_DDL = ['''
+CREATE TABLE IF NOT EXISTS registration_stats (
+    dimension VARCHAR(16) NOT NULL,
+    bucket VARCHAR(32) NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (dimension, bucket)
+)
+''', '''
+INSERT INTO registration_stats (dimension, bucket, count)
+SELECT 'total', 'all', COUNT(*) FROM user_profiles
+UNION ALL
+SELECT 'day', to_char(registration_date AT TIME ZONE current_setting('TimeZone') AT TIME ZONE 'UTC', 'YYYY-MM-DD'),
+       COUNT(*) FROM user_profiles
+WHERE registration_date IS NOT NULL GROUP BY 2
+UNION ALL
+SELECT 'country', country, COUNT(*) FROM user_profiles WHERE country IS NOT NULL GROUP BY 2
+UNION ALL
+SELECT 'gender', gender, COUNT(*) FROM user_profiles WHERE gender IS NOT NULL GROUP BY 2
+UNION ALL
+SELECT 'birth_year', birth_year::text, COUNT(*) FROM user_profiles WHERE birth_year IS NOT NULL GROUP BY 2
+UNION ALL
+SELECT 'referrer', invited_by, COUNT(*) FROM user_profiles WHERE invited_by IS NOT NULL GROUP BY 2
+ON CONFLICT (dimension, bucket) DO NOTHING
+''']
+# جدول السلالة: صف لكل (جد، حفيد، المسافة بينهما)، و referral_levels عدد الأحفاد
+# لكل مستوى (المستوى 0 = الإجمالي)، فأسئلة الشجرة كلها قراءة فهرس مباشرة
+REFERRAL_GRAPH_DDL = ['''
+CREATE TABLE IF NOT EXISTS referral_closure (
+    ancestor BIGINT NOT NULL,
+    descendant BIGINT NOT NULL,
+    depth SMALLINT NOT NULL,
+    PRIMARY KEY (ancestor, depth, descendant)
+)
+''', '''
+CREATE INDEX IF NOT EXISTS referral_closure_descendant ON referral_closure (descendant, depth)
+''', '''
+CREATE TABLE IF NOT EXISTS referral_levels (
+    ancestor BIGINT NOT NULL,
+    depth SMALLINT NOT NULL,
+    count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (ancestor, depth)
+)
+''', '''
+CREATE INDEX IF NOT EXISTS referral_levels_leaderboard ON referral_levels (depth, count DESC)
+''', f'''
+INSERT INTO referral_closure (ancestor, descendant, depth)
+WITH RECURSIVE edges AS (
+    SELECT c.user_id AS descendant, p.user_id AS parent
+    FROM user_profiles c JOIN user_profiles p ON p.referral_code = c.invited_by
+), chain AS (
+    SELECT parent AS ancestor, descendant, 1 AS depth FROM edges
+    UNION ALL
+    SELECT e.parent, chain.descendant, chain.depth + 1
+    FROM chain JOIN edges e ON e.descendant = chain.ancestor
+    WHERE chain.depth < {REFERRAL_MAX_DEPTH}
+)
+SELECT ancestor, descendant, depth FROM chain
+ON CONFLICT DO NOTHING
+''', '''
+INSERT INTO referral_levels (ancestor, depth, count)
+SELECT ancestor, depth, COUNT(*) FROM referral_closure GROUP BY ancestor, depth
+UNION ALL
+SELECT ancestor, 0, COUNT(*) FROM referral_closure GROUP BY ancestor
+ON CONFLICT DO NOTHING
+''']
+# الهاتف مخزن بصيغة E.164 أصلاً، والبريد يُقارن بصيغته الصغيرة. التسجيلات القديمة
+# المكررة تُعلَّم 'duplicate' (دون حذف) ليبقى الأقدم فقط تحت القيد الفريد، وتبقى
+# مسجلة وتستلم البث، وتُكتب معرّفاتها في سجل الترحيل
+CONTACT_UNIQUE_DDL = ['''
+UPDATE user_profiles SET status = 'duplicate' WHERE user_id IN (
+    SELECT user_id FROM (
+        SELECT user_id, phone_number, email,
+               ROW_NUMBER() OVER (PARTITION BY phone_number ORDER BY registration_date, user_id) AS phone_rank,
+               ROW_NUMBER() OVER (PARTITION BY lower(email) ORDER BY registration_date, user_id) AS email_rank
+        FROM user_profiles
+    ) ranked
+    WHERE (phone_number IS NOT NULL AND phone_rank > 1) OR (email IS NOT NULL AND email_rank > 1)
+)
+RETURNING user_id
+''', '''
+CREATE UNIQUE INDEX IF NOT EXISTS user_profiles_phone_unique ON user_profiles (phone_number)
+WHERE status IS DISTINCT FROM 'duplicate'
+''', '''
+CREATE UNIQUE INDEX IF NOT EXISTS user_profiles_email_unique ON user_profiles (lower(email))
+WHERE status IS DISTINCT FROM 'duplicate'
+''']
+CONVERSATION_STATE_DDL = ['''
+CREATE TABLE IF NOT EXISTS conversation_state (
+    user_id BIGINT PRIMARY KEY,
+    chat_id BIGINT NOT NULL,
+    conversation VARCHAR(32) NOT NULL,
+    state SMALLINT NOT NULL,
+    user_data JSONB NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+''', '''
+CREATE INDEX IF NOT EXISTS conversation_state_updated_at ON conversation_state (updated_at)
+''']
+
+
+# ==============================
+# 👤 المستخدمون
+# ==============================
+async def is_user_registered(user_id: int) -> bool:
+    """التحقق من وجود المستخدم في جدول المستخدمين"""
+    row = await get_pool().fetchone(
+        "SELECT COUNT(*) FROM user_profiles WHERE user_id = %s", (user_id,), operation='is_user_registered'
+    )
+    return row[0] > 0
+
+
+def _insert_user(conn, user_id: int, user_data: dict) -> str:
+    # الكود مشتق من user_id فلا حاجة لفحص التفرد، وقيد UNIQUE يحمي من التكرار
+    with conn.cursor() as cursor:
+        try:
+            cursor.execute('''
+                INSERT INTO user_profiles
+                (user_id, telegram_username, email, referral_code, invited_by, full_name, country, gender, birth_year, phone_number)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                RETURNING referral_code
+            ''', (
+                user_id,
+                user_data.get('telegram_username'),
+                user_data.get('email'),
+                encode_referral_code(user_id),
+                user_data.get('invited_by'),
+                user_data.get('full_name'),
+                user_data.get('country'),
+                user_data.get('gender'),
+                user_data.get('birth_year'),
+                user_data.get('phone_number')
+            ))
+        except psycopg2.errors.UniqueViolation as e:
+            raise DuplicateRecord(e.diag.constraint_name or '') from e
+        return cursor.fetchone()[0]
+
+
+async def insert_user(user_id: int, user_data: dict) -> str:
+    """إدراج مستخدم جديد وإرجاع كود الإحالة الخاص به"""
+    return await get_pool().run(_insert_user, user_id, user_data)
+
+
+def _insert_users_bulk(conn, records: list) -> list:
+    with conn.cursor() as cursor:
+        rows = execute_values(cursor, '''
+            INSERT INTO user_profiles
+            (user_id, telegram_username, email, referral_code, invited_by, full_name, country, gender, birth_year, phone_number)
+            VALUES %s
+            ON CONFLICT DO NOTHING
+            RETURNING user_id, invited_by
+        ''', [(
+            record['user_id'],
+            record.get('telegram_username'),
+            record.get('email'),
+            encode_referral_code(record['user_id']),
+            record.get('invited_by'),
+            record.get('full_name'),
+            record.get('country'),
+            record.get('gender'),
+            record.get('birth_year'),
+            record.get('phone_number')
+        ) for record in records], page_size=len(records), fetch=True)
+        return rows
+
+
+async def insert_users_bulk(records: list) -> list:
+    """إدراج عدة مستخدمين بأمر واحد متعدد الصفوف، ويعيد [(user_id, invited_by)] للمُدرجين فقط
+
+    الصفوف المتعارضة مع أي قيد فريد (user_id أو الهاتف أو البريد) تُتخطى دون إفشال البقية.
+    """
+    if not records:
+        return []
+    return await get_pool().run(_insert_users_bulk, records)
+
+
+# جدول مؤقت لكل اتصال، يُفرغ تلقائياً عند commit كل دفعة استيراد
+IMPORT_STAGING_DDL = '''
+CREATE TEMP TABLE IF NOT EXISTS user_profiles_import (
+    user_id BIGINT,
+    telegram_username VARCHAR(100),
+    email VARCHAR(255),
+    referral_code VARCHAR(20),
+    invited_by VARCHAR(20),
+    full_name VARCHAR(200),
+    country VARCHAR(100),
+    gender VARCHAR(10),
+    birth_year INTEGER,
+    phone_number VARCHAR(20)
+) ON COMMIT DELETE ROWS
+'''
+_IMPORT_COLUMNS = (
+    'user_id, telegram_username, email, referral_code, invited_by, full_name, country, gender, birth_year, phone_number'
+)
+
+
+def _import_users(conn, records: list) -> list:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for record in records:
+        writer.writerow((
+            record['user_id'],
+            record.get('telegram_username'),
+            record.get('email'),
+            encode_referral_code(record['user_id']),
+            record.get('invited_by'),
+            record.get('full_name'),
+            record.get('country'),
+            record.get('gender'),
+            record.get('birth_year'),
+            record.get('phone_number')
+        ))
+    buffer.seek(0)
+    with conn.cursor() as cursor:
+        cursor.execute(IMPORT_STAGING_DDL)
+        # القيم الفارغة غير المقتبسة في CSV تُقرأ NULL كما كانت None
+        cursor.copy_expert(f'COPY user_profiles_import ({_IMPORT_COLUMNS}) FROM STDIN WITH (FORMAT csv)', buffer)
+        cursor.execute(f'''
+            INSERT INTO user_profiles ({_IMPORT_COLUMNS})
+            SELECT {_IMPORT_COLUMNS} FROM user_profiles_import
+            ON CONFLICT DO NOTHING
+            RETURNING user_id, invited_by
+        ''')
+        return cursor.fetchall()
+
+
+async def import_users(records: list) -> list:
+    """تحميل دفعة استيراد كبيرة عبر COPY إلى جدول مؤقت ثم دمجها بأمر INSERT ... ON CONFLICT واحد
+
+    يعيد [(user_id, invited_by)] للمُدرجين فقط كما في insert_users_bulk؛ الصفوف المتعارضة
+    مع أي قيد فريد (مستخدم مسجل، هاتف أو بريد مستخدم) تُتخطى.
+    """
+    if not records:
+        return []
+    return await get_pool().run(_import_users, records)
+
+
+async def phone_registered(phone_number: str) -> bool:
+    """هل الهاتف مسجل؟ (قراءة من الفهرس الفريد الجزئي)"""
+    row = await get_pool().fetchone(
+        "SELECT 1 FROM user_profiles WHERE phone_number = %s AND status IS DISTINCT FROM 'duplicate' LIMIT 1",
+        (phone_number,), operation='phone_registered'
+    )
+    return row is not None
+
+
+async def email_registered(email: str) -> bool:
+    """هل البريد (بصيغته الصغيرة) مسجل؟"""
+    row = await get_pool().fetchone(
+        "SELECT 1 FROM user_profiles WHERE lower(email) = %s AND status IS DISTINCT FROM 'duplicate' LIMIT 1",
+        (email,), operation='email_registered'
+    )
+    return row is not None
+
+
+def _scan_contacts(conn, consume, since, chunk_size: int):
+    with conn.cursor() as cursor:
+        cursor.execute('SELECT CURRENT_TIMESTAMP')
+        started = cursor.fetchone()[0]
+    query = 'SELECT phone_number, lower(email) FROM user_profiles'
+    params = None
+    if since is not None:
+        # هامش يغطي المعاملات التي بدأت قبل الفحص السابق ولم تكتمل إلا بعده
+        query += " WHERE registration_date >= %s - INTERVAL '5 minutes'"
+        params = (since,)
+    rows = 0
+    with conn.cursor(name='scan_contacts') as cursor:
+        cursor.itersize = chunk_size
+        cursor.execute(query, params)
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            consume(chunk)
+            rows += len(chunk)
+    return started, rows
+
+
+async def scan_contacts(consume, since=None, chunk_size: int = 10000):
+    """تمرير (الهاتف، البريد) لكل المستخدمين أو المسجلين منذ since إلى consume على دفعات
+
+    يعيد (وقت بداية الفحص في قاعدة البيانات، عدد الصفوف) ليُمرر كـ since في المرة التالية.
+    """
+    return await get_pool().run(_scan_contacts, consume, since, chunk_size)
+
+
+async def get_profile(user_id: int):
+    """جلب بيانات الملف الشخصي للمستخدم"""
+    return await get_pool().fetchone('''
+        SELECT referral_code, full_name, country, gender, birth_year, phone_number, email, total_referrals, registration_date
+        FROM user_profiles WHERE user_id = %s
+    ''', (user_id,), operation='get_profile')
+
+
+async def get_invite_info(user_id: int):
+    """جلب كود الإحالة وعدد المُحالين"""
+    return await get_pool().fetchone(
+        'SELECT referral_code, total_referrals FROM user_profiles WHERE user_id = %s', (user_id,),
+        operation='get_invite_info'
+    )
+
+
+# ==============================
+# 📢 الإحالات
+# ==============================
+async def find_user_by_referral_code(code: str):
+    """إرجاع معرّف صاحب كود الإحالة أو None"""
+    row = await get_pool().fetchone(
+        'SELECT user_id FROM user_profiles WHERE referral_code = %s', (code,),
+        operation='find_user_by_referral_code'
+    )
+    return row[0] if row else None
+
+
+def _credit_referrals(conn, increments: list) -> int:
+    with conn.cursor() as cursor:
+        execute_values(cursor, '''
+            UPDATE user_profiles AS u
+            SET total_referrals = u.total_referrals + v.delta
+            FROM (VALUES %s) AS v(referral_code, delta)
+            WHERE u.referral_code = v.referral_code
+        ''', increments, page_size=len(increments))
+        return cursor.rowcount
+
+
+async def credit_referrals(increments: list) -> int:
+    """إضافة الزيادات [(كود الإحالة، الزيادة)] إلى total_referrals في أمر واحد"""
+    return await get_pool().run(_credit_referrals, increments)
+
+
+# ==============================
+# 📊 إحصائيات التسجيل المجمعة
+# ==============================
+async def load_stats(days: int, top_referrers: int) -> list:
+    """صفوف الإحصائيات المجمعة [(البعد، الفئة، العدد)]: آخر days يوماً وأعلى المُحيلين فقط"""
+    return await get_pool().fetchall('''
+        SELECT dimension, bucket, count FROM registration_stats
+        WHERE dimension NOT IN ('day', 'referrer')
+        UNION ALL
+        (SELECT dimension, bucket, count FROM registration_stats
+         WHERE dimension = 'day' ORDER BY bucket DESC LIMIT %s)
+        UNION ALL
+        (SELECT dimension, bucket, count FROM registration_stats
+         WHERE dimension = 'referrer' ORDER BY count DESC, bucket LIMIT %s)
+    ''', (days, top_referrers), operation='load_stats')
+
+
+def _add_stats(conn, deltas: list):
+    with conn.cursor() as cursor:
+        execute_values(cursor, '''
+            INSERT INTO registration_stats (dimension, bucket, count) VALUES %s
+            ON CONFLICT (dimension, bucket) DO UPDATE SET count = registration_stats.count + EXCLUDED.count
+        ''', deltas)
+
+
+async def add_stats(deltas: list):
+    """إضافة الزيادات [(البعد، الفئة، الزيادة)] إلى جدول التجميع بأمر واحد"""
+    await get_pool().run(_add_stats, deltas)
+
+
+# ==============================
+# 💬 حالة المحادثات الجارية
+# ==============================
+async def load_conversations(ttl_seconds: float, shard: tuple = None) -> list:
+    """المحادثات الجارية التي لم تنتهِ صلاحيتها: [(user_id, chat_id, conversation, state, user_data)]
+
+    shard=(رقم العامل، عدد العمال) يقصر النتيجة على مستخدمي عامل واحد في وضع العنقود.
+    """
+    query = '''
+        SELECT user_id, chat_id, conversation, state, user_data FROM conversation_state
+        WHERE updated_at > CURRENT_TIMESTAMP - make_interval(secs => %s)
+    '''
+    params = (ttl_seconds,)
+    if shard and shard[1] > 1:
+        query += ' AND MOD(user_id, %s) = %s'
+        params += (shard[1], shard[0])
+    return await get_pool().fetchall(query, params, operation='load_conversations')
+
+
+def _write_conversations(conn, upserts: list, deleted: list):
+    with conn.cursor() as cursor:
+        if upserts:
+            execute_values(cursor, '''
+                INSERT INTO conversation_state (user_id, chat_id, conversation, state, user_data)
+                VALUES %s
+                ON CONFLICT (user_id) DO UPDATE SET
+                    chat_id = EXCLUDED.chat_id, conversation = EXCLUDED.conversation,
+                    state = EXCLUDED.state, user_data = EXCLUDED.user_data, updated_at = CURRENT_TIMESTAMP
+            ''', [
+                (user_id, chat_id, conversation, state, json.dumps(user_data, ensure_ascii=False, default=str))
+                for user_id, chat_id, conversation, state, user_data in upserts
+            ])
+        if deleted:
+            cursor.execute('DELETE FROM conversation_state WHERE user_id = ANY(%s)', (deleted,))
+
+
+async def write_conversations(upserts: list, deleted: list):
+    """كتابة دفعة من حالات المحادثات وحذف المنتهية في معاملة واحدة"""
+    await get_pool().run(_write_conversations, upserts, deleted, operation='write_conversations')
+
+
+async def expire_conversations(ttl_seconds: float) -> int:
+    """حذف مسودات التسجيل التي لم تُحدّث منذ ttl_seconds"""
+    return await get_pool().execute(
+        'DELETE FROM conversation_state WHERE updated_at < CURRENT_TIMESTAMP - make_interval(secs => %s)',
+        (ttl_seconds,), operation='expire_conversations'
+    )
+
+
+# ==============================
+# 🌳 شجرة الإحالات
+# ==============================
+def _link_referrals(conn, links: list) -> int:
+    levels = Counter()
+    with conn.cursor() as cursor:
+        # بالترتيب: المستخدم قد يكون دُعي بكود مستخدم آخر في نفس الدفعة
+        for user_id, referral_code in links:
+            cursor.execute('''
+                INSERT INTO referral_closure (ancestor, descendant, depth)
+                SELECT p.user_id, %(user_id)s, 1 FROM user_profiles p WHERE p.referral_code = %(code)s
+                UNION ALL
+                SELECT c.ancestor, %(user_id)s, c.depth + 1
+                FROM referral_closure c JOIN user_profiles p ON c.descendant = p.user_id
+                WHERE p.referral_code = %(code)s AND c.depth < %(max_depth)s
+                ON CONFLICT DO NOTHING
+                RETURNING ancestor, depth
+            ''', {'user_id': user_id, 'code': referral_code, 'max_depth': REFERRAL_MAX_DEPTH})
+            for ancestor, depth in cursor.fetchall():
+                levels[ancestor, depth] += 1
+                levels[ancestor, 0] += 1
+        if levels:
+            execute_values(cursor, '''
+                INSERT INTO referral_levels (ancestor, depth, count) VALUES %s
+                ON CONFLICT (ancestor, depth) DO UPDATE SET count = referral_levels.count + EXCLUDED.count
+            ''', sorted((ancestor, depth, count) for (ancestor, depth), count in levels.items()))
+    return len(levels)
+
+
+async def link_referrals(links: list) -> int:
+    """إضافة المستخدمين الجدد [(user_id، كود المُحيل)] إلى شجرة الإحالات في معاملة واحدة"""
+    return await get_pool().run(_link_referrals, links)
+
+
+async def get_downline_counts(user_id: int, max_depth: int = REFERRAL_MAX_DEPTH) -> dict:
+    """عدد الأحفاد لكل مستوى {المستوى: العدد}، والمفتاح 0 للإجمالي"""
+    rows = await get_pool().fetchall(
+        'SELECT depth, count FROM referral_levels WHERE ancestor = %s AND depth <= %s',
+        (user_id, max_depth), operation='get_downline_counts'
+    )
+    return dict(rows)
+
+
+async def get_upline(user_id: int) -> list:
+    """سلسلة من أحضر المستخدم: [(المستوى، user_id، كود الإحالة)] من الأقرب إلى الأبعد"""
+    return await get_pool().fetchall('''
+        SELECT c.depth, p.user_id, p.referral_code
+        FROM referral_closure c JOIN user_profiles p ON p.user_id = c.ancestor
+        WHERE c.descendant = %s ORDER BY c.depth
+    ''', (user_id,), operation='get_upline')
+
+
+async def get_referral_leaderboard(limit: int = 10, depth: int = 0) -> list:
+    """أعلى المُحيلين [(user_id، الكود، العدد)]: depth=1 للمباشرين، 0 لكامل الشبكة"""
+    return await get_pool().fetchall('''
+        SELECT l.ancestor, p.referral_code, l.count
+        FROM referral_levels l JOIN user_profiles p ON p.user_id = l.ancestor
+        WHERE l.depth = %s ORDER BY l.count DESC LIMIT %s
+    ''', (depth, limit), operation='get_referral_leaderboard')
+
+
+# ==============================
+# 📤 التصدير
+# ==============================
+def _export_users_csv(conn, path: str) -> int:
+    # COPY يبث الصفوف مباشرة من الخادم إلى الملف دون تحميلها في الذاكرة
+    with conn.cursor() as cursor, open(path, 'w', encoding='utf-8', newline='') as f:
+        cursor.copy_expert(
+            f"COPY (SELECT {', '.join(EXPORT_COLUMNS)} FROM user_profiles ORDER BY user_id) "
+            "TO STDOUT WITH (FORMAT csv, HEADER true)",
+            f
+        )
+        return cursor.rowcount
+
+
+def _export_users_ndjson(conn, path: str, chunk_size: int) -> int:
+    # مؤشر مسمى على الخادم: تُجلب الصفوف على دفعات بحجم chunk_size فقط
+    rows = 0
+    with conn.cursor(name='export_user_profiles') as cursor, gzip.open(path, 'wt', encoding='utf-8') as f:
+        cursor.itersize = chunk_size
+        cursor.execute(f"SELECT {', '.join(EXPORT_COLUMNS)} FROM user_profiles ORDER BY user_id")
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            for row in chunk:
+                f.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False, default=str))
+                f.write('\n')
+            rows += len(chunk)
+    return rows
+
+
+async def export_users(path: str, fmt: str, chunk_size: int) -> int:
+    """بث جدول المستخدمين إلى ملف (csv أو ndjson مضغوط) وإرجاع عدد الصفوف"""
+    if fmt == 'csv':
+        return await get_pool().run(_export_users_csv, path)
+    return await get_pool().run(_export_users_ndjson, path, chunk_size)
+
+
+# ==============================
+# 📣 البث الجماعي
+# ==============================
+async def create_broadcast(message_text: str) -> int:
+    """إنشاء مهمة بث جديدة وإرجاع رقمها"""
+    row = await get_pool().fetchone(
+        'INSERT INTO broadcast_jobs (message_text) VALUES (%s) RETURNING id', (message_text,),
+        operation='create_broadcast'
+    )
+    return row[0]
+
+
+async def get_running_broadcasts() -> list:
+    """مهام البث غير المكتملة: [(id, message_text, last_user_id, sent, failed)]"""
+    return await get_pool().fetchall(
+        "SELECT id, message_text, last_user_id, sent, failed FROM broadcast_jobs "
+        "WHERE status = 'running' ORDER BY id",
+        operation='get_running_broadcasts'
+    )
+
+
+async def fetch_recipients(after_user_id: int, limit: int) -> list:
+    """دفعة المستلمين التالية بترقيم المفتاح (keyset) بدلاً من OFFSET"""
+    rows = await get_pool().fetchall(
+        "SELECT user_id FROM user_profiles WHERE user_id > %s AND status IN ('active', 'duplicate') "
+        "ORDER BY user_id LIMIT %s",
+        (after_user_id, limit),
+        operation='fetch_recipients'
+    )
+    return [row[0] for row in rows]
+
+
+async def checkpoint_broadcast(job_id: int, last_user_id: int, sent: int, failed: int, status: str = 'running'):
+    """حفظ تقدم مهمة البث لاستئنافها بعد الانقطاع"""
+    await get_pool().execute(
+        "UPDATE broadcast_jobs SET last_user_id = %s, sent = %s, failed = %s, status = %s, "
+        "finished_at = CASE WHEN %s = 'running' THEN NULL ELSE CURRENT_TIMESTAMP END "
+        "WHERE id = %s",
+        (last_user_id, sent, failed, status, status, job_id),
+        operation='checkpoint_broadcast'
+    )
+
+
+async def set_broadcast_status(job_id: int, status: str):
+    """تغيير حالة مهمة البث (مثلاً إلى cancelled)"""
+    await get_pool().execute(
+        'UPDATE broadcast_jobs SET status = %s, finished_at = CURRENT_TIMESTAMP WHERE id = %s',
+        (status, job_id),
+        operation='set_broadcast_status'
+    )
@@ -0,0 +1,142 @@
+# ==============================
+# 🚦 معالج التحديثات: ترتيب لكل مستخدم وتوازٍ بين المستخدمين
+# ==============================
+
+import os
+import asyncio
+import logging
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_UPDATES = int(os.environ.get('MAX_CONCURRENT_UPDATES', '64'))
+_UNBOUNDED = 2 ** 31 - 1
+
+
+class UserOrderedUpdateProcessor(BaseUpdateProcessor):
+    """تشغيل تحديثات المستخدمين المختلفين بالتوازي مع الحفاظ على ترتيب تحديثات كل مستخدم
+
+    كل مستخدم له قفل خاص، فلا تتسابق مراحل المحادثة (FULL_NAME ← COUNTRY ← ... ← EMAIL)
+    لنفس المستخدم. الحد الأقصى للتوازي يُطبق بعد الحصول على قفل المستخدم، حتى لا
+    تحجز تحديثات مستخدم واحد متراكمة جميع المقاعد وتعطل الآخرين.
+    """
+
+    __slots__ = ('_limiter', '_users', '_pending', '_running', '_processed')
+
+    def __init__(self, max_concurrent_updates: int = MAX_CONCURRENT_UPDATES):
+        super().__init__(max_concurrent_updates)
+        # نستبدل سيمافور الفئة الأساسية بآخر غير محدود ونطبق الحد بأنفسنا
+        self._semaphore = asyncio.BoundedSemaphore(_UNBOUNDED)
+        self._limiter = asyncio.Semaphore(max_concurrent_updates)
+        self._users = {}  # user_id -> [قفل المستخدم، عدد التحديثات المنتظرة أو الجارية]
+        self._pending = 0
+        self._running = 0
+        self._processed = 0
+
+    @property
+    def current_concurrent_updates(self) -> int:
+        return self._running
+
+    @property
+    def pending_updates(self) -> int:
+        """عدد التحديثات التي تنتظر دورها (عمق الطابور)"""
+        return self._pending
+
+    @staticmethod
+    def ordering_key(update: object):
+        """مفتاح الترتيب: معرّف المستخدم، أو المحادثة إذا لم يوجد مستخدم"""
+        if isinstance(update, Update):
+            if update.effective_user:
+                return update.effective_user.id
+            if update.effective_chat:
+                return update.effective_chat.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        key = self.ordering_key(update)
+        entry = None
+        if key is not None:
+            entry = self._users.get(key)
+            if entry is None:
+                entry = self._users[key] = [asyncio.Lock(), 0]
+            entry[1] += 1
+
+        self._pending += 1
+        started = False
+        try:
+            if entry is not None:
+                await entry[0].acquire()
+            try:
+                async with self._limiter:
+                    self._pending -= 1
+                    self._running += 1
+                    started = True
+                    try:
+                        await coroutine
+                    finally:
+                        self._running -= 1
+                        self._processed += 1
+            finally:
+                if entry is not None and entry[0].locked():
+                    entry[0].release()
+        finally:
+            if not started:
+                self._pending -= 1
+                coroutine.close()
+            if entry is not None:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._users[key]
+
+    def user_backlog(self, user_id: int) -> int:
+        """عدد تحديثات المستخدم المنتظرة أو الجارية"""
+        entry = self._users.get(user_id)
+        return entry[1] if entry else 0
+
+    def stats(self) -> dict:
+        """مقاييس المعالج: عمق الطابور والتراكم لكل مستخدم"""
+        backlogs = [entry[1] for entry in self._users.values()]
+        return {
+            'max_concurrent': self.max_concurrent_updates,
+            'running': self._running,
+            'queue_depth': self._pending,
+            'processed': self._processed,
+            'users_with_backlog': sum(1 for count in backlogs if count > 1),
+            'max_user_backlog': max(backlogs, default=0),
+        }
+
+    async def initialize(self) -> None:
+        logger.info("🚦 معالج التحديثات يعمل بحد أقصى %s تحديث متزامن", self.max_concurrent_updates)
+
+    async def shutdown(self) -> None:
+        pass
+
+
+# ==============================
+# 🧩 توزيع التحديثات على عمليات متعددة
+# ==============================
+def raw_ordering_key(data: dict):
+    """نفس مفتاح ordering_key لكن من JSON التحديث الخام دون بناء كائن Update"""
+    for field, payload in data.items():
+        if field == 'update_id' or not isinstance(payload, dict):
+            continue
+        user = payload.get('from') or payload.get('user')
+        if user:
+            return user['id']
+        chat = payload.get('chat') or (payload.get('message') or {}).get('chat')
+        if chat:
+            return chat['id']
+    return None
+
+
+def shard_for(key, workers: int) -> int:
+    """رقم العامل المسؤول عن المستخدم: hash(user_id) % N
+
+    hash() للأعداد الصحيحة الموجبة يساوي العدد نفسه، فالنتيجة مطابقة لـ
+    user_id % N في SQL (تُستخدم لتحميل محادثات العامل فقط).
+    """
+    if key is None or workers <= 1:
+        return 0
+    return hash(key) % workers
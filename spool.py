@@ -0,0 +1,194 @@
+# ==============================
+# 📼 ملف احتياطي للتسجيلات عند تعطل قاعدة البيانات
+# ==============================
+
+import os
+import json
+import asyncio
+import logging
+from datetime import datetime
+
+from storage import repository
+from database import DatabaseUnavailable
+
+logger = logging.getLogger(__name__)
+
+SPOOL_PATH = os.environ.get('SPOOL_PATH', 'registrations.spool')
+SPOOL_FSYNC_INTERVAL = float(os.environ.get('SPOOL_FSYNC_INTERVAL', '0.02'))
+SPOOL_REPLAY_INTERVAL = float(os.environ.get('SPOOL_REPLAY_INTERVAL', '5'))
+SPOOL_REPLAY_BATCH = int(os.environ.get('SPOOL_REPLAY_BATCH', '500'))
+
+SPOOL_FIELDS = (
+    'user_id', 'telegram_username', 'email', 'referral_code', 'invited_by',
+    'full_name', 'country', 'gender', 'birth_year', 'phone_number'
+)
+
+
+class RegistrationSpool:
+    """ملف إلحاقي (سطر JSON لكل تسجيل) مع fsync مجمّع وإعادة إدخال على دفعات
+
+    كل append ينتظر fsync الدفعة التي يقع فيها، فيُكتب عشرات التسجيلات بعملية
+    fsync واحدة. عند عودة قاعدة البيانات يُنقل الملف جانباً ويُعاد إدخاله بأوامر
+    INSERT متعددة الصفوف مع ON CONFLICT DO NOTHING، فإعادة التشغيل آمنة، ويُحفظ
+    بعد كل دفعة عدد التسجيلات المنتهية فتستأنف المحاولة التالية من بعدها.
+    """
+
+    def __init__(self, path: str = SPOOL_PATH, on_replayed=None, on_dropped=None):
+        # on_replayed(records) يُستدعى بعد كل دفعة بالتسجيلات التي أُدخلت فعلاً (دون المكررة)
+        # و on_dropped(records) (دالة async) بالتسجيلات التي رُفضت لأن الهاتف أو البريد
+        # سجله مستخدم آخر أثناء التعطل، وأصحابها قيل لهم إن تسجيلهم تم
+        self.path = path
+        self.replay_path = path + '.replaying'
+        # عدد التسجيلات المنتهية من ملف الإعادة، حتى لا تُعاد دفعات أُدخلت قبل خطأ لاحق
+        self.checkpoint_path = path + '.replayed'
+        self.on_replayed = on_replayed
+        self.on_dropped = on_dropped
+        self._file = None
+        self._waiters = []
+        self._sync_task = None
+        self._replay_task = None
+        self._replay_lock = asyncio.Lock()
+        self.pending = 0
+
+    # ==============================
+    # ✍️ الكتابة
+    # ==============================
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        return self._file
+
+    async def append(self, user_id: int, user_data: dict):
+        """إلحاق تسجيل بالملف والانتظار حتى يُحفظ على القرص"""
+        record = {field: user_data.get(field) for field in SPOOL_FIELDS}
+        record['user_id'] = user_id
+        record['spooled_at'] = datetime.now().isoformat(timespec='seconds')
+
+        self._open().write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.pending += 1
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        if self._sync_task is None or self._sync_task.done():
+            self._sync_task = asyncio.create_task(self._sync_batch())
+        await waiter
+
+    async def _sync_batch(self):
+        """fsync واحد لكل التسجيلات المتراكمة خلال SPOOL_FSYNC_INTERVAL"""
+        await asyncio.sleep(SPOOL_FSYNC_INTERVAL)
+        waiters, self._waiters = self._waiters, []
+        try:
+            self._file.flush()
+            await asyncio.get_running_loop().run_in_executor(None, os.fsync, self._file.fileno())
+        except Exception as e:
+            for waiter in waiters:
+                waiter.done() or waiter.set_exception(e)
+            return
+        for waiter in waiters:
+            waiter.done() or waiter.set_result(None)
+        if self._waiters:
+            self._sync_task = asyncio.create_task(self._sync_batch())
+
+    # ==============================
+    # 🔁 إعادة الإدخال
+    # ==============================
+    def _read(self, path: str) -> list:
+        records = []
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # سطر مبتور بسبب توقف مفاجئ أثناء الكتابة
+                    logger.warning("⚠️ تم تجاهل سطر تالف في %s", path)
+        return records
+
+    async def replay(self) -> int:
+        """إعادة إدخال التسجيلات المحفوظة في قاعدة البيانات، ويعيد عدد المُدخلة"""
+        async with self._replay_lock:
+            if not os.path.exists(self.replay_path):
+                if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+                    return 0
+                # نقل الملف جانباً حتى تستمر الكتابة الجديدة في ملف جديد
+                while self._sync_task and not self._sync_task.done():
+                    await self._sync_task
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                os.replace(self.path, self.replay_path)
+                self.pending = 0
+
+            records = self._read(self.replay_path)
+            done = self._read_checkpoint()
+            inserted = 0
+            for i in range(done, len(records), SPOOL_REPLAY_BATCH):
+                batch = records[i:i + SPOOL_REPLAY_BATCH]
+                inserted += await self._replay_batch(batch)
+                self._write_checkpoint(i + len(batch))
+
+            # نقطة الاستئناف أولاً: بقاؤها مع ملف إعادة جديد قد يتخطى تسجيلات لم تُدخل
+            if os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)
+            os.remove(self.replay_path)
+            logger.info("📼 تمت إعادة إدخال %s من %s تسجيل محفوظ", inserted, len(records) - done)
+            return inserted
+
+    async def _replay_batch(self, batch: list) -> int:
+        """إدخال دفعة واحتساب ما أُدخل منها فوراً، والإبلاغ عما رُفض بسبب الهاتف أو البريد"""
+        inserted_ids = {user_id for user_id, _ in await repository.insert_users_bulk(batch)}
+        inserted = [record for record in batch if record['user_id'] in inserted_ids]
+        if self.on_replayed and inserted:
+            self.on_replayed(inserted)
+
+        dropped = []
+        for record in batch:
+            # غير المُدخل إما مسجل مسبقاً (دفعة أُدخلت قبل توقف مفاجئ) أو تعارض هاتفه أو بريده
+            if record['user_id'] not in inserted_ids and not await repository.is_user_registered(record['user_id']):
+                dropped.append(record)
+                logger.warning("⚠️ تسجيل محفوظ للمستخدم %s لم يُدخل: الهاتف %s أو البريد %s مسجل لمستخدم آخر",
+                               record['user_id'], record.get('phone_number'), record.get('email'))
+        if self.on_dropped and dropped:
+            await self.on_dropped(dropped)
+        return len(inserted)
+
+    def _read_checkpoint(self) -> int:
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _write_checkpoint(self, done: int):
+        tmp_path = self.checkpoint_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(str(done))
+        os.replace(tmp_path, self.checkpoint_path)
+
+    async def _replay_loop(self):
+        while True:
+            try:
+                await self.replay()
+            except DatabaseUnavailable:
+                pass
+            except Exception as e:
+                logger.error("❌ خطأ في إعادة إدخال التسجيلات المحفوظة: %s", e)
+            await asyncio.sleep(SPOOL_REPLAY_INTERVAL)
+
+    def start(self):
+        """بدء محاولات إعادة الإدخال الدورية"""
+        if self._replay_task is None:
+            self._replay_task = asyncio.create_task(self._replay_loop())
+
+    async def stop(self):
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+            await asyncio.gather(self._replay_task, return_exceptions=True)
+            self._replay_task = None
+        if self._sync_task is not None:
+            await asyncio.gather(self._sync_task, return_exceptions=True)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
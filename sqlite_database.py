@@ -0,0 +1,198 @@
+# ==============================
+# 🪶 قاعدة SQLite مدمجة بوضع WAL: خيط كتابة واحد وقرّاء متوازون
+# ==============================
+
+import os
+import time
+import queue
+import asyncio
+import logging
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from database import DatabaseUnavailable, set_pool
+from migrations import apply_sqlite_migrations
+from metrics import DB_ACQUIRE_SECONDS, DB_QUERY_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# ==============================
+# 🔧 الإعدادات
+# ==============================
+SQLITE_PATH = os.environ.get('SQLITE_PATH', 'bot.sqlite3')
+SQLITE_READERS = int(os.environ.get('SQLITE_READERS', '4'))
+# عدد الأوامر المُحضّرة المحفوظة لكل اتصال (نصوص SQL الثابتة تُحضّر مرة واحدة)
+SQLITE_STATEMENT_CACHE = int(os.environ.get('SQLITE_STATEMENT_CACHE', '256'))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000'))
+# NORMAL في وضع WAL: لا fsync عند كل commit، بل عند نقاط الحفظ (لا فساد عند انقطاع الكهرباء)
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+
+# أخطاء تعني أن الملف غير متاح الآن (قفل من عملية أخرى، قرص ممتلئ، خطأ إدخال/إخراج)؛
+# غيرها (جدول أو عمود غير موجود، خطأ صياغة) خطأ في الكود يجب أن يظهر لا أن يُحفظ احتياطياً
+UNAVAILABLE_ERRORS = frozenset((
+    sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED, sqlite3.SQLITE_IOERR, sqlite3.SQLITE_FULL, sqlite3.SQLITE_CANTOPEN,
+))
+
+
+def is_unavailable(error: sqlite3.OperationalError) -> bool:
+    """هل الخطأ تعطل في الملف أو القرص (وليس خطأ في المخطط أو الاستعلام)؟"""
+    # الرموز الموسعة (مثل SQLITE_IOERR_WRITE) تحمل الرمز الأساسي في البايت الأدنى
+    return (getattr(error, 'sqlite_errorcode', 0) & 0xff) in UNAVAILABLE_ERRORS
+
+
+class SQLitePool:
+    """بديل DatabasePool لقاعدة SQLite في ملف واحد
+
+    SQLite يسمح بكاتب واحد فقط في أي لحظة، لذلك كل أوامر الكتابة (run/execute)
+    تمر عبر خيط مخصص باتصال واحد، فلا تتنافس المعاملات على القفل ولا تنتظر
+    busy_timeout. القراءات (fetchone/fetchall/read) تعمل على اتصالات منفصلة
+    للقراءة فقط، ووضع WAL يسمح لها بالعمل بالتوازي مع الكاتب دون أن تُحجب.
+
+    لا يوجد قاطع دائرة كما في DatabasePool: القاطع هناك يوفر انتظار مهلة الاتصال
+    الشبكي عند تعطل الخادم، أما هنا فالاتصالات مفتوحة دائماً، والقرص الممتلئ
+    وخطأ الإدخال/الإخراج يفشلان فوراً، وانتظار القفل محدود بـ busy_timeout ولا
+    يحدث إلا مع عملية أخرى على نفس الملف (مثل أمر الاستيراد).
+    """
+
+    def __init__(self, path: str = SQLITE_PATH, readers: int = SQLITE_READERS):
+        self.path = path
+        self.maxconn = readers + 1
+        self._writer = self._connect()
+        self._writer.execute('PRAGMA journal_mode=WAL')
+        self._readers = queue.Queue()
+        for _ in range(readers):
+            self._readers.put(self._connect(read_only=True))
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite-writer')
+        self._read_executor = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='sqlite-reader')
+        self._lock = threading.Lock()
+
+        # إحصائيات بنفس مفاتيح DatabasePool
+        self._in_use = 0
+        self._waiters = 0
+        self._acquired = 0
+        self._queries = 0
+        self._acquire_total = 0.0
+        self._acquire_max = 0.0
+
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        # isolation_level=None: المعاملات تُدار صراحة في _call
+        conn = sqlite3.connect(
+            self.path, isolation_level=None, check_same_thread=False,
+            cached_statements=SQLITE_STATEMENT_CACHE, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000
+        )
+        conn.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+        conn.execute(f'PRAGMA synchronous={SQLITE_SYNCHRONOUS}')
+        if read_only:
+            conn.execute('PRAGMA query_only=1')
+        return conn
+
+    # ==============================
+    # 🔌 التنفيذ
+    # ==============================
+    def _call(self, func, args, operation: str, write: bool):
+        started = time.perf_counter()
+        if write:
+            conn = self._writer
+        else:
+            with self._lock:
+                self._waiters += 1
+            try:
+                conn = self._readers.get()
+            finally:
+                with self._lock:
+                    self._waiters -= 1
+        elapsed = time.perf_counter() - started
+        DB_ACQUIRE_SECONDS.observe(elapsed)
+        with self._lock:
+            self._in_use += 1
+            self._acquired += 1
+            self._queries += 1
+            self._acquire_total += elapsed
+            self._acquire_max = max(self._acquire_max, elapsed)
+
+        try:
+            with DB_QUERY_SECONDS.labels(operation).time():
+                # IMMEDIATE: الكاتب الوحيد يأخذ القفل من البداية بدلاً من ترقيته لاحقاً
+                conn.execute('BEGIN IMMEDIATE' if write else 'BEGIN')
+                try:
+                    result = func(conn, *args)
+                    conn.execute('COMMIT')
+                except BaseException:
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+                    raise
+            return result
+        except sqlite3.OperationalError as e:
+            # قرص ممتلئ أو ملف مقفل من عملية أخرى: يُعامل كتعطل قاعدة البيانات
+            if is_unavailable(e):
+                raise DatabaseUnavailable(str(e)) from e
+            raise
+        finally:
+            if not write:
+                self._readers.put(conn)
+            with self._lock:
+                self._in_use -= 1
+
+    async def run(self, func, *args, operation: str = None):
+        """تنفيذ func(conn, *args) كمعاملة كتابة في خيط الكاتب"""
+        loop = asyncio.get_running_loop()
+        operation = operation or func.__name__.lstrip('_')
+        return await loop.run_in_executor(self._write_executor, self._call, func, args, operation, True)
+
+    async def read(self, func, *args, operation: str = None):
+        """تنفيذ func(conn, *args) على اتصال قراءة (بالتوازي مع الكاتب)"""
+        loop = asyncio.get_running_loop()
+        operation = operation or func.__name__.lstrip('_')
+        return await loop.run_in_executor(self._read_executor, self._call, func, args, operation, False)
+
+    async def fetchone(self, query: str, params=(), operation: str = 'fetchone'):
+        """تنفيذ استعلام قراءة وإرجاع صف واحد"""
+        return await self.read(lambda conn: conn.execute(query, params).fetchone(), operation=operation)
+
+    async def fetchall(self, query: str, params=(), operation: str = 'fetchall'):
+        """تنفيذ استعلام قراءة وإرجاع جميع الصفوف"""
+        return await self.read(lambda conn: conn.execute(query, params).fetchall(), operation=operation)
+
+    async def execute(self, query: str, params=(), operation: str = 'execute') -> int:
+        """تنفيذ أمر كتابة وإرجاع عدد الصفوف المتأثرة"""
+        return await self.run(lambda conn: conn.execute(query, params).rowcount, operation=operation)
+
+    def warm_up(self, count: int = 0) -> int:
+        """الاتصالات مفتوحة منذ الإنشاء؛ يكفي تحميل صفحات المخطط في ذاكرة الكاتب"""
+        self._writer.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+        return self.maxconn
+
+    # ==============================
+    # 📊 الإحصائيات والإغلاق
+    # ==============================
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': self.maxconn,
+                'in_use': self._in_use,
+                'waiters': self._waiters,
+                'acquired': self._acquired,
+                'queries': self._queries,
+                'acquire_avg_ms': (self._acquire_total / self._acquired * 1000) if self._acquired else 0.0,
+                'acquire_max_ms': self._acquire_max * 1000,
+                'breaker': 'closed',
+            }
+
+    def close(self):
+        self._write_executor.shutdown(wait=True)
+        self._read_executor.shutdown(wait=True)
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+        # نقطة حفظ أخيرة تدمج ملف WAL في قاعدة البيانات
+        self._writer.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self._writer.close()
+        logger.info("🔌 تم إغلاق قاعدة SQLite")
+
+
+def init_sqlite_pool(path: str = SQLITE_PATH, readers: int = SQLITE_READERS) -> SQLitePool:
+    """فتح قاعدة SQLite وتطبيق مخططها وتعيينها كمجمع التطبيق المشترك"""
+    pool = SQLitePool(path, readers)
+    applied = apply_sqlite_migrations(pool._writer)
+    logger.info("✅ قاعدة SQLite جاهزة: %s (ترحيلات مطبقة: %s، قرّاء: %s)", path, applied, readers)
+    return set_pool(pool)
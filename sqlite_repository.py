@@ -0,0 +1,472 @@
+# ==============================
+# 🪶 مستودع الاستعلامات لقاعدة SQLite المدمجة (نفس دوال repository.py)
+# ==============================
+#
+# الكتابة تمر عبر pool.run (خيط الكاتب الوحيد) والقراءة عبر pool.read/fetchone/fetchall
+# (اتصالات القراءة المتوازية). نصوص SQL ثابتة فتبقى مُحضّرة في ذاكرة كل اتصال.
+
+import csv
+import gzip
+import json
+import sqlite3
+from datetime import datetime
+from collections import Counter
+
+from database import get_pool, DuplicateRecord
+from referral_codes import encode_referral_code
+from storage_schema import REFERRAL_MAX_DEPTH, EXPORT_COLUMNS
+
+# حد المتغيرات في أمر واحد: 10 أعمدة × 500 صف
+BULK_INSERT_ROWS = 500
+
+
+# ==============================
+# 🧱 مخطط الجداول
+# ==============================
+SCHEMA_DDL = ['''
+CREATE TABLE IF NOT EXISTS user_profiles (
+    user_id INTEGER PRIMARY KEY,
+    telegram_username TEXT,
+    email TEXT,
+    referral_code TEXT UNIQUE,
+    invited_by TEXT,
+    full_name TEXT,
+    country TEXT,
+    gender TEXT,
+    birth_year INTEGER,
+    phone_number TEXT,
+    registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    total_referrals INTEGER DEFAULT 0,
+    status TEXT DEFAULT 'active'
+)
+''', '''
+CREATE UNIQUE INDEX IF NOT EXISTS user_profiles_phone_unique ON user_profiles (phone_number)
+WHERE status IS NOT 'duplicate'
+''', '''
+CREATE UNIQUE INDEX IF NOT EXISTS user_profiles_email_unique ON user_profiles (lower(email))
+WHERE status IS NOT 'duplicate'
+''', '''
+CREATE INDEX IF NOT EXISTS user_profiles_registration_date ON user_profiles (registration_date)
+''', '''
+CREATE TABLE IF NOT EXISTS broadcast_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    message_text TEXT NOT NULL,
+    last_user_id INTEGER DEFAULT 0,
+    sent INTEGER DEFAULT 0,
+    failed INTEGER DEFAULT 0,
+    status TEXT DEFAULT 'running',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP
+)
+''', '''
+CREATE TABLE IF NOT EXISTS conversation_state (
+    user_id INTEGER PRIMARY KEY,
+    chat_id INTEGER NOT NULL,
+    conversation TEXT NOT NULL,
+    state INTEGER NOT NULL,
+    user_data TEXT NOT NULL DEFAULT '{}',
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+''', '''
+CREATE INDEX IF NOT EXISTS conversation_state_updated_at ON conversation_state (updated_at)
+''', '''
+CREATE TABLE IF NOT EXISTS registration_stats (
+    dimension TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dimension, bucket)
+) WITHOUT ROWID
+''', '''
+CREATE TABLE IF NOT EXISTS referral_closure (
+    ancestor INTEGER NOT NULL,
+    descendant INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    PRIMARY KEY (ancestor, depth, descendant)
+) WITHOUT ROWID
+''', '''
+CREATE INDEX IF NOT EXISTS referral_closure_descendant ON referral_closure (descendant, depth)
+''', '''
+CREATE TABLE IF NOT EXISTS referral_levels (
+    ancestor INTEGER NOT NULL,
+    depth INTEGER NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (ancestor, depth)
+) WITHOUT ROWID
+''', '''
+CREATE INDEX IF NOT EXISTS referral_levels_leaderboard ON referral_levels (depth, count DESC)
+''']
+
+_USER_COLUMNS = (
+    'user_id, telegram_username, email, referral_code, invited_by, full_name, country, gender, birth_year, phone_number'
+)
+
+
+def _user_row(user_id: int, data: dict) -> tuple:
+    return (
+        user_id,
+        data.get('telegram_username'),
+        data.get('email'),
+        encode_referral_code(user_id),
+        data.get('invited_by'),
+        data.get('full_name'),
+        data.get('country'),
+        data.get('gender'),
+        data.get('birth_year'),
+        data.get('phone_number'),
+    )
+
+
+# ==============================
+# 👤 المستخدمون
+# ==============================
+async def is_user_registered(user_id: int) -> bool:
+    """التحقق من وجود المستخدم في جدول المستخدمين"""
+    row = await get_pool().fetchone(
+        'SELECT 1 FROM user_profiles WHERE user_id = ?', (user_id,), operation='is_user_registered'
+    )
+    return row is not None
+
+
+def _insert_user(conn, user_id: int, user_data: dict) -> str:
+    try:
+        return conn.execute(
+            f'INSERT INTO user_profiles ({_USER_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) RETURNING referral_code',
+            _user_row(user_id, user_data)
+        ).fetchone()[0]
+    except sqlite3.IntegrityError as e:
+        # رسالة SQLite تذكر العمود أو اسم الفهرس (phone/email/user_id)
+        raise DuplicateRecord(str(e)) from e
+
+
+async def insert_user(user_id: int, user_data: dict) -> str:
+    """إدراج مستخدم جديد وإرجاع كود الإحالة الخاص به"""
+    return await get_pool().run(_insert_user, user_id, user_data)
+
+
+def _insert_users_bulk(conn, records: list) -> list:
+    inserted = []
+    for start in range(0, len(records), BULK_INSERT_ROWS):
+        chunk = records[start:start + BULK_INSERT_ROWS]
+        placeholders = ', '.join(['(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'] * len(chunk))
+        params = [value for record in chunk for value in _user_row(record['user_id'], record)]
+        inserted.extend(conn.execute(
+            f'INSERT INTO user_profiles ({_USER_COLUMNS}) VALUES {placeholders} '
+            'ON CONFLICT DO NOTHING RETURNING user_id, invited_by',
+            params
+        ).fetchall())
+    return inserted
+
+
+async def insert_users_bulk(records: list) -> list:
+    """إدراج عدة مستخدمين بأوامر متعددة الصفوف، ويعيد [(user_id, invited_by)] للمُدرجين فقط"""
+    if not records:
+        return []
+    return await get_pool().run(_insert_users_bulk, records)
+
+
+async def import_users(records: list) -> list:
+    """دفعة استيراد كبيرة: SQLite لا يدعم COPY، فتُكتب بأوامر insert_users_bulk متعددة الصفوف في معاملة واحدة"""
+    return await insert_users_bulk(records)
+
+
+async def phone_registered(phone_number: str) -> bool:
+    """هل الهاتف مسجل؟ (قراءة من الفهرس الفريد الجزئي)"""
+    row = await get_pool().fetchone(
+        "SELECT 1 FROM user_profiles WHERE phone_number = ? AND status IS NOT 'duplicate' LIMIT 1",
+        (phone_number,), operation='phone_registered'
+    )
+    return row is not None
+
+
+async def email_registered(email: str) -> bool:
+    """هل البريد (بصيغته الصغيرة) مسجل؟"""
+    row = await get_pool().fetchone(
+        "SELECT 1 FROM user_profiles WHERE lower(email) = ? AND status IS NOT 'duplicate' LIMIT 1",
+        (email,), operation='email_registered'
+    )
+    return row is not None
+
+
+def _scan_contacts(conn, consume, since, chunk_size: int):
+    started = conn.execute('SELECT CURRENT_TIMESTAMP').fetchone()[0]
+    if since is None:
+        cursor = conn.execute('SELECT phone_number, lower(email) FROM user_profiles')
+    else:
+        cursor = conn.execute(
+            "SELECT phone_number, lower(email) FROM user_profiles WHERE registration_date >= datetime(?, '-5 minutes')",
+            (since,)
+        )
+    rows = 0
+    while True:
+        chunk = cursor.fetchmany(chunk_size)
+        if not chunk:
+            break
+        consume(chunk)
+        rows += len(chunk)
+    return started, rows
+
+
+async def scan_contacts(consume, since=None, chunk_size: int = 10000):
+    """تمرير (الهاتف، البريد) لكل المستخدمين أو المسجلين منذ since إلى consume على دفعات"""
+    return await get_pool().read(_scan_contacts, consume, since, chunk_size)
+
+
+async def get_profile(user_id: int):
+    """جلب بيانات الملف الشخصي للمستخدم"""
+    row = await get_pool().fetchone('''
+        SELECT referral_code, full_name, country, gender, birth_year, phone_number, email, total_referrals, registration_date
+        FROM user_profiles WHERE user_id = ?
+    ''', (user_id,), operation='get_profile')
+    if row is None:
+        return None
+    # SQLite يخزن الوقت نصاً، والقوالب تنتظر datetime كما في PostgreSQL
+    return row[:8] + (datetime.fromisoformat(row[8]),)
+
+
+async def get_invite_info(user_id: int):
+    """جلب كود الإحالة وعدد المُحالين"""
+    return await get_pool().fetchone(
+        'SELECT referral_code, total_referrals FROM user_profiles WHERE user_id = ?', (user_id,),
+        operation='get_invite_info'
+    )
+
+
+# ==============================
+# 📢 الإحالات
+# ==============================
+async def find_user_by_referral_code(code: str):
+    """إرجاع معرّف صاحب كود الإحالة أو None"""
+    row = await get_pool().fetchone(
+        'SELECT user_id FROM user_profiles WHERE referral_code = ?', (code,),
+        operation='find_user_by_referral_code'
+    )
+    return row[0] if row else None
+
+
+def _credit_referrals(conn, increments: list) -> int:
+    return conn.executemany(
+        'UPDATE user_profiles SET total_referrals = total_referrals + ? WHERE referral_code = ?',
+        [(delta, referral_code) for referral_code, delta in increments]
+    ).rowcount
+
+
+async def credit_referrals(increments: list) -> int:
+    """إضافة الزيادات [(كود الإحالة، الزيادة)] إلى total_referrals في معاملة واحدة"""
+    return await get_pool().run(_credit_referrals, increments)
+
+
+# ==============================
+# 📊 إحصائيات التسجيل المجمعة
+# ==============================
+async def load_stats(days: int, top_referrers: int) -> list:
+    """صفوف الإحصائيات المجمعة [(البعد، الفئة، العدد)]: آخر days يوماً وأعلى المُحيلين فقط"""
+    return await get_pool().fetchall('''
+        SELECT dimension, bucket, count FROM registration_stats
+        WHERE dimension NOT IN ('day', 'referrer')
+        UNION ALL
+        SELECT * FROM (SELECT dimension, bucket, count FROM registration_stats
+                       WHERE dimension = 'day' ORDER BY bucket DESC LIMIT ?)
+        UNION ALL
+        SELECT * FROM (SELECT dimension, bucket, count FROM registration_stats
+                       WHERE dimension = 'referrer' ORDER BY count DESC, bucket LIMIT ?)
+    ''', (days, top_referrers), operation='load_stats')
+
+
+def _add_stats(conn, deltas: list):
+    conn.executemany('''
+        INSERT INTO registration_stats (dimension, bucket, count) VALUES (?, ?, ?)
+        ON CONFLICT (dimension, bucket) DO UPDATE SET count = count + excluded.count
+    ''', deltas)
+
+
+async def add_stats(deltas: list):
+    """إضافة الزيادات [(البعد، الفئة، الزيادة)] إلى جدول التجميع في معاملة واحدة"""
+    await get_pool().run(_add_stats, deltas)
+
+
+# ==============================
+# 💬 حالة المحادثات الجارية
+# ==============================
+async def load_conversations(ttl_seconds: float, shard: tuple = None) -> list:
+    """المحادثات الجارية التي لم تنتهِ صلاحيتها: [(user_id, chat_id, conversation, state, user_data)]"""
+    query = '''
+        SELECT user_id, chat_id, conversation, state, user_data FROM conversation_state
+        WHERE updated_at > datetime('now', ?)
+    '''
+    params = (f'-{ttl_seconds} seconds',)
+    if shard and shard[1] > 1:
+        query += ' AND user_id % ? = ?'
+        params += (shard[1], shard[0])
+    rows = await get_pool().fetchall(query, params, operation='load_conversations')
+    return [row[:4] + (json.loads(row[4]),) for row in rows]
+
+
+def _write_conversations(conn, upserts: list, deleted: list):
+    if upserts:
+        conn.executemany('''
+            INSERT INTO conversation_state (user_id, chat_id, conversation, state, user_data)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+                chat_id = excluded.chat_id, conversation = excluded.conversation,
+                state = excluded.state, user_data = excluded.user_data, updated_at = CURRENT_TIMESTAMP
+        ''', [
+            (user_id, chat_id, conversation, state, json.dumps(user_data, ensure_ascii=False, default=str))
+            for user_id, chat_id, conversation, state, user_data in upserts
+        ])
+    if deleted:
+        conn.executemany('DELETE FROM conversation_state WHERE user_id = ?', [(user_id,) for user_id in deleted])
+
+
+async def write_conversations(upserts: list, deleted: list):
+    """كتابة دفعة من حالات المحادثات وحذف المنتهية في معاملة واحدة"""
+    await get_pool().run(_write_conversations, upserts, deleted, operation='write_conversations')
+
+
+async def expire_conversations(ttl_seconds: float) -> int:
+    """حذف مسودات التسجيل التي لم تُحدّث منذ ttl_seconds"""
+    return await get_pool().execute(
+        "DELETE FROM conversation_state WHERE updated_at < datetime('now', ?)",
+        (f'-{ttl_seconds} seconds',), operation='expire_conversations'
+    )
+
+
+# ==============================
+# 🌳 شجرة الإحالات
+# ==============================
+def _link_referrals(conn, links: list) -> int:
+    levels = Counter()
+    for user_id, referral_code in links:
+        rows = conn.execute('''
+            INSERT INTO referral_closure (ancestor, descendant, depth)
+            SELECT p.user_id, :user_id, 1 FROM user_profiles p WHERE p.referral_code = :code
+            UNION ALL
+            SELECT c.ancestor, :user_id, c.depth + 1
+            FROM referral_closure c JOIN user_profiles p ON c.descendant = p.user_id
+            WHERE p.referral_code = :code AND c.depth < :max_depth
+            ON CONFLICT DO NOTHING
+            RETURNING ancestor, depth
+        ''', {'user_id': user_id, 'code': referral_code, 'max_depth': REFERRAL_MAX_DEPTH}).fetchall()
+        for ancestor, depth in rows:
+            levels[ancestor, depth] += 1
+            levels[ancestor, 0] += 1
+    if levels:
+        conn.executemany('''
+            INSERT INTO referral_levels (ancestor, depth, count) VALUES (?, ?, ?)
+            ON CONFLICT (ancestor, depth) DO UPDATE SET count = count + excluded.count
+        ''', sorted((ancestor, depth, count) for (ancestor, depth), count in levels.items()))
+    return len(levels)
+
+
+async def link_referrals(links: list) -> int:
+    """إضافة المستخدمين الجدد [(user_id، كود المُحيل)] إلى شجرة الإحالات في معاملة واحدة"""
+    return await get_pool().run(_link_referrals, links)
+
+
+async def get_downline_counts(user_id: int, max_depth: int = REFERRAL_MAX_DEPTH) -> dict:
+    """عدد الأحفاد لكل مستوى {المستوى: العدد}، والمفتاح 0 للإجمالي"""
+    rows = await get_pool().fetchall(
+        'SELECT depth, count FROM referral_levels WHERE ancestor = ? AND depth <= ?',
+        (user_id, max_depth), operation='get_downline_counts'
+    )
+    return dict(rows)
+
+
+async def get_upline(user_id: int) -> list:
+    """سلسلة من أحضر المستخدم: [(المستوى، user_id، كود الإحالة)] من الأقرب إلى الأبعد"""
+    return await get_pool().fetchall('''
+        SELECT c.depth, p.user_id, p.referral_code
+        FROM referral_closure c JOIN user_profiles p ON p.user_id = c.ancestor
+        WHERE c.descendant = ? ORDER BY c.depth
+    ''', (user_id,), operation='get_upline')
+
+
+async def get_referral_leaderboard(limit: int = 10, depth: int = 0) -> list:
+    """أعلى المُحيلين [(user_id، الكود، العدد)]: depth=1 للمباشرين، 0 لكامل الشبكة"""
+    return await get_pool().fetchall('''
+        SELECT l.ancestor, p.referral_code, l.count
+        FROM referral_levels l JOIN user_profiles p ON p.user_id = l.ancestor
+        WHERE l.depth = ? ORDER BY l.count DESC LIMIT ?
+    ''', (depth, limit), operation='get_referral_leaderboard')
+
+
+# ==============================
+# 📤 التصدير
+# ==============================
+def _export_users(conn, path: str, fmt: str, chunk_size: int) -> int:
+    cursor = conn.execute(f"SELECT {', '.join(EXPORT_COLUMNS)} FROM user_profiles ORDER BY user_id")
+    opener = open(path, 'w', encoding='utf-8', newline='') if fmt == 'csv' else gzip.open(path, 'wt', encoding='utf-8')
+    rows = 0
+    with opener as f:
+        writer = csv.writer(f) if fmt == 'csv' else None
+        if writer:
+            writer.writerow(EXPORT_COLUMNS)
+        while True:
+            chunk = cursor.fetchmany(chunk_size)
+            if not chunk:
+                break
+            if writer:
+                writer.writerows(chunk)
+            else:
+                for row in chunk:
+                    f.write(json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False, default=str))
+                    f.write('\n')
+            rows += len(chunk)
+    return rows
+
+
+async def export_users(path: str, fmt: str, chunk_size: int) -> int:
+    """بث جدول المستخدمين إلى ملف (csv أو ndjson مضغوط) وإرجاع عدد الصفوف"""
+    return await get_pool().read(_export_users, path, fmt, chunk_size)
+
+
+# ==============================
+# 📣 البث الجماعي
+# ==============================
+async def create_broadcast(message_text: str) -> int:
+    """إنشاء مهمة بث جديدة وإرجاع رقمها"""
+    return await get_pool().run(
+        lambda conn: conn.execute(
+            'INSERT INTO broadcast_jobs (message_text) VALUES (?) RETURNING id', (message_text,)
+        ).fetchone()[0],
+        operation='create_broadcast'
+    )
+
+
+async def get_running_broadcasts() -> list:
+    """مهام البث غير المكتملة: [(id, message_text, last_user_id, sent, failed)]"""
+    return await get_pool().fetchall(
+        "SELECT id, message_text, last_user_id, sent, failed FROM broadcast_jobs "
+        "WHERE status = 'running' ORDER BY id",
+        operation='get_running_broadcasts'
+    )
+
+
+async def fetch_recipients(after_user_id: int, limit: int) -> list:
+    """دفعة المستلمين التالية بترقيم المفتاح (keyset) بدلاً من OFFSET"""
+    rows = await get_pool().fetchall(
+        "SELECT user_id FROM user_profiles WHERE user_id > ? AND status IN ('active', 'duplicate') "
+        "ORDER BY user_id LIMIT ?",
+        (after_user_id, limit),
+        operation='fetch_recipients'
+    )
+    return [row[0] for row in rows]
+
+
+async def checkpoint_broadcast(job_id: int, last_user_id: int, sent: int, failed: int, status: str = 'running'):
+    """حفظ تقدم مهمة البث لاستئنافها بعد الانقطاع"""
+    await get_pool().execute(
+        "UPDATE broadcast_jobs SET last_user_id = ?, sent = ?, failed = ?, status = ?, "
+        "finished_at = CASE WHEN ? = 'running' THEN NULL ELSE CURRENT_TIMESTAMP END "
+        "WHERE id = ?",
+        (last_user_id, sent, failed, status, status, job_id),
+        operation='checkpoint_broadcast'
+    )
+
+
+async def set_broadcast_status(job_id: int, status: str):
+    """تغيير حالة مهمة البث (مثلاً إلى cancelled)"""
+    await get_pool().execute(
+        'UPDATE broadcast_jobs SET status = ?, finished_at = CURRENT_TIMESTAMP WHERE id = ?',
+        (status, job_id),
+        operation='set_broadcast_status'
+    )
@@ -0,0 +1,172 @@
+# ==============================
+# 📊 إحصائيات المالك: مجاميع في الذاكرة تُحدّث مع كل تسجيل
+# ==============================
+
+import os
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+from collections import Counter, defaultdict
+
+from storage import repository
+
+logger = logging.getLogger(__name__)
+
+STATS_FLUSH_INTERVAL = float(os.environ.get('STATS_FLUSH_INTERVAL', '30'))
+STATS_DAYS = int(os.environ.get('STATS_DAYS', '14'))
+STATS_TOP_REFERRERS = int(os.environ.get('STATS_TOP_REFERRERS', '10'))
+
+
+def utc_today() -> date:
+    """يوم التسجيل بتوقيت UTC، كما يُحسب في ترحيل registration_stats من registration_date
+
+    التوقيت المحلي للعملية قد يختلف عن منطقة خادم قاعدة البيانات، فتقفز المجاميع
+    اليومية عند منتصف الليل لو حُسب كل جانب بمنطقته.
+    """
+    return datetime.now(timezone.utc).date()
+
+
+class RegistrationStats:
+    """مجاميع التسجيلات حسب اليوم والبلد والجنس وسنة الولادة والمُحيل
+
+    تُحمّل مرة واحدة من جدول registration_stats (المُجمَّع مسبقاً)، ثم تُحدّث
+    في الذاكرة مع كل تسجيل. الزيادات تُكتب دورياً في الجدول بأمر واحد ويُعاد
+    تحميله، فتظهر تسجيلات العمال الآخرين في وضع العنقود أيضاً. حجم المجاميع
+    محدود (آخر STATS_DAYS يوماً وأعلى STATS_TOP_REFERRERS مُحيلاً)، فزمن /stats
+    لا يعتمد على حجم جدول المستخدمين، والنص المنسق يُخزن حتى يتغير شيء.
+    """
+
+    def __init__(self, interval: float = STATS_FLUSH_INTERVAL, days: int = STATS_DAYS,
+                 top_referrers: int = STATS_TOP_REFERRERS):
+        self.interval = interval
+        self.days = days
+        self.top_referrers = top_referrers
+        self._totals = defaultdict(Counter)
+        self._pending = Counter()
+        self._text = None
+        self._task = None
+        self._flush_lock = asyncio.Lock()
+        self.loaded = False
+
+    # ==============================
+    # ✍️ التحديث
+    # ==============================
+    def record(self, user_data: dict, day: date = None):
+        """إضافة تسجيل جديد إلى المجاميع"""
+        buckets = [
+            ('total', 'all'),
+            ('day', (day or utc_today()).isoformat()),
+            ('country', user_data.get('country')),
+            ('gender', user_data.get('gender')),
+            ('birth_year', user_data.get('birth_year')),
+            ('referrer', user_data.get('invited_by')),
+        ]
+        for dimension, bucket in buckets:
+            if bucket is None:
+                continue
+            bucket = str(bucket)
+            self._totals[dimension][bucket] += 1
+            self._pending[dimension, bucket] += 1
+        self._text = None
+
+    def _apply(self, rows):
+        totals = defaultdict(Counter)
+        for dimension, bucket, count in rows:
+            totals[dimension][bucket] = count
+        # الزيادات التي لم تُكتب بعد تبقى ظاهرة
+        for (dimension, bucket), delta in self._pending.items():
+            totals[dimension][bucket] += delta
+        self._totals = totals
+        self._text = None
+
+    async def load(self):
+        """تحميل المجاميع من جدول التجميع (استعلام محدود الحجم)"""
+        self._apply(await repository.load_stats(self.days, self.top_referrers))
+        self.loaded = True
+
+    async def flush(self) -> int:
+        """كتابة الزيادات المعلقة ثم إعادة تحميل المجاميع"""
+        async with self._flush_lock:
+            if self._pending:
+                batch, self._pending = self._pending, Counter()
+                # ترتيب ثابت يمنع الأقفال المتبادلة بين العمال
+                deltas = sorted((dimension, bucket, delta) for (dimension, bucket), delta in batch.items())
+                try:
+                    await repository.add_stats(deltas)
+                except Exception as e:
+                    self._pending.update(batch)
+                    logger.error("❌ خطأ في كتابة الإحصائيات: %s", e)
+                    return 0
+            else:
+                deltas = []
+            try:
+                await self.load()
+            except Exception as e:
+                logger.error("❌ خطأ في تحميل الإحصائيات: %s", e)
+            return len(deltas)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        """بدء الكتابة وإعادة التحميل الدورية في الخلفية"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    # ==============================
+    # 🖨️ العرض
+    # ==============================
+    def render(self) -> str:
+        """نص /stats (يُعاد بناؤه فقط بعد تغير المجاميع)"""
+        if self._text is None:
+            self._text = self._render()
+        return self._text
+
+    def _render(self) -> str:
+        totals = self._totals
+        lines = ["📊 **إحصائيات التسجيل**", "", f"👥 إجمالي المسجلين: {totals['total']['all']}", ""]
+
+        lines.append(f"📅 **التسجيلات اليومية (آخر {self.days} يوماً):**")
+        today = utc_today()
+        for offset in range(self.days):
+            day = (today - timedelta(days=offset)).isoformat()
+            if totals['day'][day]:
+                lines.append(f"• {day}: {totals['day'][day]}")
+        lines.append("")
+
+        lines.append("🌍 **حسب البلد:**")
+        lines.extend(f"• {country}: {count}" for country, count in totals['country'].most_common())
+        lines.append("")
+
+        lines.append("🚻 **حسب الجنس:**")
+        lines.extend(f"• {gender}: {count}" for gender, count in totals['gender'].most_common())
+        lines.append("")
+
+        decades = Counter()
+        for year, count in totals['birth_year'].items():
+            decades[int(year) // 10 * 10] += count
+        peak = max(decades.values(), default=0)
+        lines.append("🎂 **سنوات الولادة:**")
+        for decade in sorted(decades):
+            bar = '▇' * max(1, round(decades[decade] / peak * 10))
+            lines.append(f"• {decade}s {bar} {decades[decade]}")
+        lines.append("")
+
+        lines.append("🏆 **أعلى المُحيلين:**")
+        top = totals['referrer'].most_common(self.top_referrers)
+        lines.extend(f"{rank}. `{code}`: {count}" for rank, (code, count) in enumerate(top, 1))
+        if not top:
+            lines.append("• لا يوجد بعد")
+        return '\n'.join(lines)
+
+
+registration_stats = RegistrationStats()
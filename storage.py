@@ -0,0 +1,45 @@
+# ==============================
+# 🗄️ طبقة التخزين: اختيار مستودع PostgreSQL أو SQLite المدمج بنفس الواجهة
+# ==============================
+#
+# كل وحدات البوت تستورد `from storage import repository` ولا تعرف أي قاعدة تعمل.
+# STORAGE_BACKEND=postgres (افتراضي) يستخدم repository.py ومجمع psycopg2،
+# و STORAGE_BACKEND=sqlite يستخدم sqlite_repository.py وملف SQLite بوضع WAL
+# (للنشر على خادم واحد وللتكامل المستمر دون خادم قاعدة بيانات).
+
+import os
+import importlib
+
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'postgres').lower()
+
+BACKENDS = {
+    'postgres': 'repository',
+    'sqlite': 'sqlite_repository',
+}
+
+# الدوال التي يجب أن يوفرها كل مستودع
+STORAGE_API = (
+    'REFERRAL_MAX_DEPTH',
+    'is_user_registered', 'insert_user', 'insert_users_bulk', 'import_users', 'get_profile', 'get_invite_info',
+    'phone_registered', 'email_registered', 'scan_contacts',
+    'find_user_by_referral_code', 'credit_referrals',
+    'link_referrals', 'get_downline_counts', 'get_upline', 'get_referral_leaderboard',
+    'load_stats', 'add_stats',
+    'load_conversations', 'write_conversations', 'expire_conversations',
+    'export_users',
+    'create_broadcast', 'get_running_broadcasts', 'fetch_recipients', 'checkpoint_broadcast', 'set_broadcast_status',
+)
+
+
+def load_backend(name: str):
+    """استيراد مستودع الواجهة المختارة والتحقق من اكتماله"""
+    if name not in BACKENDS:
+        raise ValueError(f"STORAGE_BACKEND غير معروف: {name} (المتاح: {', '.join(BACKENDS)})")
+    module = importlib.import_module(BACKENDS[name])
+    missing = [attr for attr in STORAGE_API if not hasattr(module, attr)]
+    if missing:
+        raise ImportError(f"المستودع {module.__name__} لا يوفر: {', '.join(missing)}")
+    return module
+
+
+repository = load_backend(STORAGE_BACKEND)
@@ -0,0 +1,17 @@
+# ==============================
+# 🧩 ثوابت المخطط المشتركة بين مستودعي PostgreSQL و SQLite
+# ==============================
+#
+# لا تستورد هذه الوحدة أي مكتبة قاعدة بيانات، فيستخدمها المستودعان دون أن يعتمد
+# أحدهما على الآخر.
+
+import os
+
+# أقصى عمق يُتتبع في شجرة الإحالات (حجم جدول السلالة ≈ عدد المُحالين × العمق)
+REFERRAL_MAX_DEPTH = int(os.environ.get('REFERRAL_MAX_DEPTH', '10'))
+
+# أعمدة /export بترتيبها في الملف
+EXPORT_COLUMNS = (
+    'user_id', 'telegram_username', 'email', 'referral_code', 'invited_by', 'full_name', 'country',
+    'gender', 'birth_year', 'phone_number', 'registration_date', 'total_referrals', 'status'
+)
@@ -0,0 +1,151 @@
+# ==============================
+# 🌐 طبقة النقل إلى Bot API: مجمعات منفصلة للاستطلاع والإرسال، مع القياس وإعادة المحاولة
+# ==============================
+
+import os
+import time
+import asyncio
+import logging
+
+import httpx
+from telegram.error import NetworkError, TimedOut
+from telegram.request import HTTPXRequest
+
+from metrics import BOT_API_SECONDS, BOT_API_ERRORS, BOT_API_RETRIES, BOT_API_IN_FLIGHT
+
+logger = logging.getLogger(__name__)
+
+# نوع القيم الافتراضية في PTB (المهلة غير محددة في الاستدعاء فتُؤخذ من إعدادات الطلب)
+_DEFAULT_VALUE = type(HTTPXRequest.DEFAULT_NONE)
+
+# ==============================
+# 🔧 الإعدادات
+# ==============================
+# الإرسال (reply_text و sendMessage والبث): اتصالات قليلة تبقى مفتوحة بين الموجات. تلغرام
+# يحد البوت بنحو 30 رسالة/ث، و16 اتصالاً تكفي لأكثر من 100 رسالة/ث بزمن ذهاب وإياب 150ms،
+# بينما كلفة مجمع httpcore لكل طلب تنمو مع مربع عدد الاتصالات المفتوحة
+BOT_API_POOL_SIZE = int(os.environ.get('BOT_API_POOL_SIZE', '16'))
+# httpx يبقي 20 اتصالاً خاملاً فقط افتراضياً، فيُغلق الباقي ويُعاد فتحه عند كل موجة
+BOT_API_KEEPALIVE = int(os.environ.get('BOT_API_KEEPALIVE', str(BOT_API_POOL_SIZE)))
+BOT_API_KEEPALIVE_EXPIRY = float(os.environ.get('BOT_API_KEEPALIVE_EXPIRY', '60'))
+BOT_API_CONNECT_TIMEOUT = float(os.environ.get('BOT_API_CONNECT_TIMEOUT', '5'))
+BOT_API_READ_TIMEOUT = float(os.environ.get('BOT_API_READ_TIMEOUT', '5'))
+BOT_API_WRITE_TIMEOUT = float(os.environ.get('BOT_API_WRITE_TIMEOUT', '5'))
+BOT_API_POOL_TIMEOUT = float(os.environ.get('BOT_API_POOL_TIMEOUT', '2'))
+# الاستطلاع (getUpdates): طلب طويل واحد في كل لحظة، في مجمع لا يشارك الإرسال
+BOT_POLL_POOL_SIZE = int(os.environ.get('BOT_POLL_POOL_SIZE', '2'))
+# HTTP/2 يتطلب الحزمة h2 (pip install "python-telegram-bot[http2]")، وبدونها يُستخدم HTTP/1.1
+BOT_API_HTTP2 = os.environ.get('BOT_API_HTTP2', '0') == '1'
+# إعادة المحاولة فقط عندما لم يُرسل الطلب أصلاً (فشل الاتصال أو امتلاء المجمع)
+BOT_API_MAX_RETRIES = int(os.environ.get('BOT_API_MAX_RETRIES', '2'))
+BOT_API_RETRY_BACKOFF = float(os.environ.get('BOT_API_RETRY_BACKOFF', '0.1'))
+
+
+def _retry_reason(error: Exception):
+    """سبب إعادة المحاولة إذا كان الطلب لم يصل إلى تلغرام، وإلا None
+
+    انتهاء مهلة القراءة أو انقطاع الاتصال بعد الإرسال قد يعني أن الرسالة أُرسلت،
+    فلا يُعاد الطلب حتى لا تصل الرسالة مرتين.
+    """
+    cause = error.__cause__
+    if isinstance(cause, httpx.PoolTimeout):
+        return 'pool_timeout'
+    if isinstance(cause, httpx.ConnectTimeout):
+        return 'connect_timeout'
+    if isinstance(cause, httpx.ConnectError):
+        return 'connect_error'
+    return None
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest يقيس زمن كل استدعاء ويعد الأخطاء وإعادات المحاولة حسب نقطة النهاية"""
+
+    def __init__(self, *args, pool: str = 'send', retries: int = BOT_API_MAX_RETRIES,
+                 retry_backoff: float = BOT_API_RETRY_BACKOFF, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = pool
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self._in_flight = BOT_API_IN_FLIGHT.labels(pool)
+        # الطلبات الزائدة عن حجم المجمع تنتظر هنا: طابور httpcore يعيد فحص كل الاتصالات
+        # لكل طلب منتظر عند كل تغيير، فتصبح كلفته تربيعية عند موجات الردود
+        self._slots = asyncio.Semaphore(kwargs.get('connection_pool_size', 256))
+
+    async def _acquire_slot(self, pool_timeout):
+        """انتظار مكان في المجمع ضمن pool_timeout
+
+        الانتظار هنا بديل عن طابور httpx (المكان المحجوز يعني اتصالاً متاحاً هناك)،
+        فيخضع لنفس المهلة ويفشل بنفس الخطأ: TimedOut سببه httpx.PoolTimeout، فيُعاد
+        الطلب لأنه لم يُرسل بعد.
+        """
+        if isinstance(pool_timeout, _DEFAULT_VALUE):
+            pool_timeout = self._client.timeout.pool
+        if pool_timeout is None:
+            await self._slots.acquire()
+            return
+        try:
+            await asyncio.wait_for(self._slots.acquire(), pool_timeout)
+        except asyncio.TimeoutError:
+            raise TimedOut(
+                "Pool timeout: all connections in the connection pool are occupied. "
+                "Request was *not* sent to Telegram."
+            ) from httpx.PoolTimeout(f"no free connection slot within {pool_timeout}s")
+
+    async def do_request(self, url, method, request_data=None, read_timeout=HTTPXRequest.DEFAULT_NONE,
+                         write_timeout=HTTPXRequest.DEFAULT_NONE, connect_timeout=HTTPXRequest.DEFAULT_NONE,
+                         pool_timeout=HTTPXRequest.DEFAULT_NONE):
+        endpoint = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        self._in_flight.inc()
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    await self._acquire_slot(pool_timeout)
+                    try:
+                        status, payload = await super().do_request(
+                            url, method, request_data=request_data, read_timeout=read_timeout,
+                            write_timeout=write_timeout, connect_timeout=connect_timeout, pool_timeout=pool_timeout
+                        )
+                    finally:
+                        self._slots.release()
+                    break
+                except (TimedOut, NetworkError) as e:
+                    reason = _retry_reason(e)
+                    if reason is None or attempt == self.retries:
+                        BOT_API_ERRORS.labels(endpoint, type(e).__name__).inc()
+                        raise
+                    BOT_API_RETRIES.labels(endpoint, reason).inc()
+                    await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+                except Exception as e:
+                    BOT_API_ERRORS.labels(endpoint, type(e).__name__).inc()
+                    raise
+        finally:
+            self._in_flight.dec()
+            BOT_API_SECONDS.labels(endpoint).observe(time.perf_counter() - started)
+
+        if status >= 400:
+            BOT_API_ERRORS.labels(endpoint, str(status)).inc()
+        return status, payload
+
+
+def build_request(pool: str = 'send') -> InstrumentedRequest:
+    """طلبات Bot API المضبوطة: pool='send' للإرسال و pool='poll' لـ getUpdates"""
+    size = BOT_POLL_POOL_SIZE if pool == 'poll' else BOT_API_POOL_SIZE
+    keepalive = BOT_POLL_POOL_SIZE if pool == 'poll' else min(BOT_API_KEEPALIVE, size)
+    options = dict(
+        connection_pool_size=size,
+        connect_timeout=BOT_API_CONNECT_TIMEOUT,
+        read_timeout=BOT_API_READ_TIMEOUT,
+        write_timeout=BOT_API_WRITE_TIMEOUT,
+        pool_timeout=BOT_API_POOL_TIMEOUT,
+        httpx_kwargs={'limits': httpx.Limits(
+            max_connections=size, max_keepalive_connections=keepalive, keepalive_expiry=BOT_API_KEEPALIVE_EXPIRY
+        )},
+        pool=pool,
+    )
+    if BOT_API_HTTP2:
+        try:
+            return InstrumentedRequest(http_version='2', **options)
+        except RuntimeError as e:
+            logger.warning("⚠️ HTTP/2 غير متاح، استخدام HTTP/1.1: %s", e)
+    return InstrumentedRequest(**options)
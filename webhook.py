@@ -0,0 +1,142 @@
+# ==============================
+# 🌐 وضع Webhook: خادم aiohttp مدمج بديل عن run_polling()
+# ==============================
+
+import os
+import ssl
+import signal
+import asyncio
+import logging
+
+from aiohttp import web
+from telegram import Update
+from telegram.ext import Application
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+def get_webhook_config():
+    """الحصول على إعدادات وضع Webhook من متغيرات البيئة"""
+    return {
+        'listen': os.environ.get('WEBHOOK_LISTEN', '0.0.0.0'),
+        # Render يمرر المنفذ في PORT
+        'port': int(os.environ.get('WEBHOOK_PORT', os.environ.get('PORT', '8443'))),
+        'path': os.environ.get('WEBHOOK_PATH', '/telegram'),
+        # العنوان العام الذي سيرسل إليه تلغرام التحديثات (مثال: https://mybot.onrender.com)
+        'url': os.environ.get('WEBHOOK_URL'),
+        'secret_token': os.environ.get('WEBHOOK_SECRET'),
+        'cert': os.environ.get('WEBHOOK_CERT'),
+        'key': os.environ.get('WEBHOOK_KEY'),
+        'keepalive_timeout': float(os.environ.get('WEBHOOK_KEEPALIVE', '75')),
+        'max_connections': int(os.environ.get('WEBHOOK_MAX_CONNECTIONS', '40')),
+    }
+
+
+def create_web_app(application: Application, config: dict) -> web.Application:
+    """إنشاء تطبيق aiohttp يستقبل التحديثات ويوفر نقطة فحص الصحة"""
+    secret_token = config.get('secret_token')
+
+    async def handle_update(request: web.Request) -> web.Response:
+        if secret_token and request.headers.get(SECRET_HEADER) != secret_token:
+            return web.Response(status=403)
+
+        try:
+            data = await request.json()
+            # العملية الأمامية في وضع العنقود ترسل قائمة تحديثات مرتبة في طلب واحد
+            batch = data if isinstance(data, list) else [data]
+            updates = [Update.de_json(item, application.bot) for item in batch]
+        except Exception as e:
+            logger.error("❌ تحديث غير صالح من Webhook: %s", e)
+            return web.Response(status=400)
+
+        # الرد فوراً ومعالجة التحديثات في الخلفية
+        for update in updates:
+            await application.update_queue.put(update)
+        return web.Response()
+
+    async def handle_health(request: web.Request) -> web.Response:
+        health = {
+            'status': 'ok' if application.running else 'starting',
+            'pending_updates': application.update_queue.qsize(),
+        }
+        processor_stats = getattr(application.update_processor, 'stats', None)
+        if processor_stats:
+            health['processor'] = processor_stats()
+        return web.json_response(health)
+
+    web_app = web.Application()
+    web_app['application'] = application
+    web_app.router.add_post(config['path'], handle_update)
+    web_app.router.add_get('/health', handle_health)
+    return web_app
+
+
+def _ssl_context(config: dict):
+    """إنشاء سياق TLS إذا تم تحديد شهادة ومفتاح"""
+    if not (config.get('cert') and config.get('key')):
+        return None
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(config['cert'], config['key'])
+    return context
+
+
+async def serve_webhook(application: Application, config: dict, stop_event: asyncio.Event = None):
+    """تشغيل البوت في وضع Webhook حتى استلام إشارة الإيقاف"""
+    if stop_event is None:
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop_event.set)
+
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+
+    runner = web.AppRunner(
+        create_web_app(application, config),
+        keepalive_timeout=config['keepalive_timeout'],
+        access_log=None
+    )
+    await runner.setup()
+
+    try:
+        site = web.TCPSite(runner, config['listen'], config['port'], ssl_context=_ssl_context(config))
+        await site.start()
+
+        if config.get('url'):
+            certificate = open(config['cert'], 'rb') if config.get('cert') else None
+            try:
+                await application.bot.set_webhook(
+                    url=config['url'].rstrip('/') + config['path'],
+                    certificate=certificate,
+                    secret_token=config.get('secret_token'),
+                    max_connections=config['max_connections'],
+                    allowed_updates=Update.ALL_TYPES
+                )
+            finally:
+                if certificate:
+                    certificate.close()
+
+        logger.info("🌐 خادم Webhook يعمل على %s:%s%s", config['listen'], config['port'], config['path'])
+        await stop_event.wait()
+
+    finally:
+        await runner.cleanup()
+        if application.running:
+            await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def run_webhook(application: Application, config: dict = None):
+    """نقطة الدخول المتزامنة لوضع Webhook"""
+    config = config or get_webhook_config()
+    if not config.get('url'):
+        logger.warning("⚠️ لم يتم تعيين WEBHOOK_URL، لن يتم تسجيل Webhook لدى تلغرام")
+    asyncio.run(serve_webhook(application, config))